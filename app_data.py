@@ -0,0 +1,50 @@
+"""
+Datos de la Aplicación
+======================
+Carpeta donde la app guarda su estado entre ejecuciones (cachés, ajustes...).
+
+- Windows: %LOCALAPPDATA%\\DescargadorMusica
+- Otros:   $XDG_DATA_HOME/DescargadorMusica (~/.local/share/...)
+
+La variable de entorno DESCARGADOR_DATA_DIR permite cambiarla (servidores).
+"""
+
+import json
+import os
+from pathlib import Path
+
+
+APP_NAME = "DescargadorMusica"
+
+
+def get_data_dir():
+    """Retorna (y crea si hace falta) la carpeta de datos de la app"""
+    override = os.environ.get("DESCARGADOR_DATA_DIR")
+    if override:
+        data_dir = Path(override)
+    elif os.name == "nt":
+        base = os.environ.get("LOCALAPPDATA") or str(Path.home() / "AppData" / "Local")
+        data_dir = Path(base) / APP_NAME
+    else:
+        base = os.environ.get("XDG_DATA_HOME") or str(Path.home() / ".local" / "share")
+        data_dir = Path(base) / APP_NAME
+
+    data_dir.mkdir(parents=True, exist_ok=True)
+    return data_dir
+
+
+def load_json(path, default=None):
+    """Lee un archivo JSON; retorna default si no existe o está dañado"""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
+
+
+def save_json(path, data):
+    """Escribe un archivo JSON de forma atómica (temporal + rename)"""
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+    os.replace(temp_path, path)
@@ -0,0 +1,329 @@
+"""
+Archivo de Descargas
+====================
+Registro persistente (SQLite) de los videos ya descargados.
+
+Cada descarga se guarda por extractor + ID del video + formato (mp3/mp4),
+con la ruta del archivo, su tamaño y su SHA-256. Antes de cualquier acceso
+a la red, el motor consulta el archivo y omite lo ya descargado.
+
+La clave se obtiene de la URL sin conexión (expresiones de los extractores
+de yt-dlp); si el extractor no da un ID desde la URL (p. ej. el genérico)
+se busca por la URL exacta.
+
+USO:
+  python -m archive                   # Muestra el número de entradas
+  python -m archive --verify          # Quita entradas cuyo archivo ya no existe
+  python -m archive --verify --hash   # Además comprueba el SHA-256
+"""
+
+import argparse
+import hashlib
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from urllib.parse import parse_qsl, urlencode, urlparse, urlunparse
+
+from app_data import get_data_dir
+
+
+ARCHIVE_FILE = "archive.sqlite3"
+
+# Parámetros de playlist que se ignoran al buscar un video individual
+PLAYLIST_PARAMS = {"list", "index", "start_radio", "pp"}
+
+# Video de YouTube (watch, shorts, live, embed, youtu.be): el caso habitual
+# se resuelve sin recorrer los ~1800 extractores de yt-dlp
+YOUTUBE_VIDEO_URL = re.compile(
+    r"^(?:https?://)?(?:(?:www\.|m\.|music\.)?youtube\.com/(?:watch\?(?:[^#]*&)?v=|shorts/|live/|embed/)"
+    r"|(?:www\.)?youtu\.be/)([0-9A-Za-z_-]{11})(?![0-9A-Za-z_-])",
+    re.IGNORECASE,
+)
+
+# URLs recientes -> clave (las consultas se repiten: archivo, caché, registro)
+KEY_CACHE_SIZE = 4096
+
+_extractor_lock = threading.Lock()
+_extractor_classes = None
+_key_cache = {}
+
+
+def extractor_classes():
+    """Clases de extractores de yt-dlp (se cargan una sola vez)"""
+    global _extractor_classes
+    with _extractor_lock:
+        if _extractor_classes is None:
+            from yt_dlp.extractor import gen_extractor_classes
+            _extractor_classes = gen_extractor_classes()
+        return _extractor_classes
+
+
+def reset_extractor_classes():
+    """Olvida las clases cargadas (tras cambiar de versión de yt-dlp)"""
+    global _extractor_classes
+    with _extractor_lock:
+        _extractor_classes = None
+        _key_cache.clear()
+
+
+def strip_playlist_params(url):
+    """Quita los parámetros de playlist de una URL (descarga de un solo video)"""
+    parts = urlparse(url)
+    query = [(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+             if k not in PLAYLIST_PARAMS]
+    return urlunparse(parts._replace(query=urlencode(query)))
+
+
+def url_archive_key(url, single_video=True):
+    """
+    Calcula (extractor, id) de una URL sin acceder a la red.
+
+    Los videos de YouTube se reconocen directamente; el resto recorre los
+    extractores (una vez por URL: el resultado queda en caché).
+
+    Returns:
+        tupla (extractor, video_id) o None si no se puede saber desde la URL
+    """
+    if single_video:
+        url = strip_playlist_params(url)
+    # Con 'list' manda el extractor de playlists (YoutubeTab), no el de videos
+    match = YOUTUBE_VIDEO_URL.match(url)
+    if match and "list=" not in url and url[:4].lower() == "http":
+        return "youtube", match.group(1)
+
+    with _extractor_lock:
+        if url in _key_cache:
+            return _key_cache[url]
+    key = _scan_extractors(url)
+    with _extractor_lock:
+        if len(_key_cache) >= KEY_CACHE_SIZE:
+            _key_cache.clear()
+        _key_cache[url] = key
+    return key
+
+
+def _scan_extractors(url):
+    """Recorre los extractores de yt-dlp hasta el primero compatible"""
+    for ie in extractor_classes():
+        if ie.suitable(url):
+            try:
+                video_id = ie.get_temp_id(url)
+            except Exception:
+                video_id = None
+            if video_id:
+                return ie.ie_key().lower(), str(video_id)
+            # El primer extractor compatible es el que usará yt-dlp
+            return None
+    return None
+
+
+def file_sha256(path, block_size=1024 * 1024):
+    """SHA-256 de un archivo leyendo en bloques"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class DownloadArchive:
+    """Archivo SQLite de descargas completadas (seguro entre hilos)"""
+
+    def __init__(self, path=None, verify_files=True):
+        """
+        Args:
+            path: ruta de la base de datos (por defecto en la carpeta de datos)
+            verify_files: al encontrar una entrada, comprobar que el archivo
+                sigue existiendo con el mismo tamaño
+        """
+        self.path = path or str(get_data_dir() / ARCHIVE_FILE)
+        self.verify_files = verify_files
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS downloads (
+                extractor     TEXT NOT NULL,
+                video_id      TEXT NOT NULL,
+                format        TEXT NOT NULL,
+                url           TEXT,
+                title         TEXT,
+                output_path   TEXT,
+                size          INTEGER,
+                sha256        TEXT,
+                downloaded_at REAL,
+                PRIMARY KEY (extractor, video_id, format)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS idx_downloads_url ON downloads (url, format);
+        """)
+        self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    # ----------------------------------------------------------
+    # Consulta
+    # ----------------------------------------------------------
+    def lookup(self, url, download_format, single_video=True):
+        """
+        Busca una URL en el archivo sin acceder a la red.
+
+        Returns:
+            dict con la entrada o None si no se ha descargado (o si su
+            archivo ya no existe y verify_files está activo)
+        """
+        key = url_archive_key(url, single_video)
+        with self._lock:
+            if key:
+                row = self._conn.execute(
+                    "SELECT * FROM downloads WHERE extractor=? AND video_id=? AND format=?",
+                    (key[0], key[1], download_format),
+                ).fetchone()
+            else:
+                row = None
+            if row is None:
+                row = self._conn.execute(
+                    "SELECT * FROM downloads WHERE url=? AND format=? LIMIT 1",
+                    (url, download_format),
+                ).fetchone()
+            if row is None:
+                return None
+            entry = self._row_to_dict(row)
+
+            if self.verify_files and not self._file_matches(entry):
+                self._delete(entry)
+                self._conn.commit()
+                return None
+            return entry
+
+    def __contains__(self, key):
+        """(extractor, video_id, format) in archive"""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT 1 FROM downloads WHERE extractor=? AND video_id=? AND format=?",
+                key,
+            ).fetchone() is not None
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM downloads").fetchone()[0]
+
+    # ----------------------------------------------------------
+    # Registro
+    # ----------------------------------------------------------
+    def record(self, extractor, video_id, url, download_format, output_path, title=None):
+        """
+        Guarda una descarga completada (calcula tamaño y SHA-256 del archivo).
+
+        Args:
+            extractor: 'extractor_key' de yt-dlp (p. ej. 'Youtube')
+            video_id: ID del video según el extractor
+            url: URL pedida (para extractores sin ID en la URL)
+            download_format: 'mp3' o 'mp4'
+            output_path: archivo final en disco
+            title: título del video (informativo)
+        """
+        if not video_id:
+            return
+        extractor = (extractor or 'generic').lower()
+        size, sha256 = None, None
+        if output_path and os.path.isfile(output_path):
+            size = os.path.getsize(output_path)
+            sha256 = file_sha256(output_path)
+
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO downloads VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (extractor, str(video_id), download_format, url, title,
+                 output_path, size, sha256, time.time()),
+            )
+            self._conn.commit()
+
+    # ----------------------------------------------------------
+    # Verificación
+    # ----------------------------------------------------------
+    def verify(self, check_hash=False, progress_callback=None):
+        """
+        Revisa todas las entradas y elimina las de archivos movidos o borrados.
+
+        Args:
+            check_hash: además comparar el SHA-256 (lee todos los archivos)
+            progress_callback: callable(checked, total)
+
+        Returns:
+            dict con 'checked', 'removed' y 'corrupted'
+        """
+        with self._lock:
+            rows = self._conn.execute("SELECT * FROM downloads").fetchall()
+
+        removed, corrupted = [], []
+        for checked, row in enumerate(rows, start=1):
+            entry = self._row_to_dict(row)
+            if not self._file_matches(entry):
+                removed.append(entry)
+            elif check_hash and entry["sha256"] and file_sha256(entry["output_path"]) != entry["sha256"]:
+                corrupted.append(entry)
+            if progress_callback and checked % 1000 == 0:
+                progress_callback(checked, len(rows))
+
+        with self._lock:
+            for entry in removed + corrupted:
+                self._delete(entry)
+            self._conn.commit()
+
+        return {"checked": len(rows), "removed": len(removed), "corrupted": len(corrupted)}
+
+    # ----------------------------------------------------------
+    # Auxiliares
+    # ----------------------------------------------------------
+    @staticmethod
+    def _row_to_dict(row):
+        keys = ["extractor", "video_id", "format", "url", "title",
+                "output_path", "size", "sha256", "downloaded_at"]
+        return dict(zip(keys, row))
+
+    @staticmethod
+    def _file_matches(entry):
+        """El archivo existe y conserva el tamaño registrado"""
+        path = entry.get("output_path")
+        if not path:
+            return True  # Entradas sin archivo conocido: solo por ID
+        try:
+            return entry["size"] is None or os.path.getsize(path) == entry["size"]
+        except OSError:
+            return False
+
+    def _delete(self, entry):
+        """Elimina una entrada (llamar con el lock tomado)"""
+        self._conn.execute(
+            "DELETE FROM downloads WHERE extractor=? AND video_id=? AND format=?",
+            (entry["extractor"], entry["video_id"], entry["format"]),
+        )
+
+
+# ============================================================
+# Ejecución directa
+# ============================================================
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="archive", description="Archivo de descargas")
+    parser.add_argument("--verify", action="store_true",
+                        help="Eliminar entradas cuyo archivo se movió o borró")
+    parser.add_argument("--hash", action="store_true",
+                        help="Con --verify, comprobar también el SHA-256")
+    args = parser.parse_args()
+
+    archive = DownloadArchive(verify_files=False)
+    if args.verify:
+        summary = archive.verify(
+            check_hash=args.hash,
+            progress_callback=lambda done, total: print(f"  {done}/{total}..."),
+        )
+        print(f"Revisadas: {summary['checked']}  |  Eliminadas: {summary['removed']}"
+              f"  |  Dañadas: {summary['corrupted']}")
+    print(f"Entradas en el archivo: {len(archive)}")
+    sys.exit(0)
@@ -0,0 +1,221 @@
+"""
+Descarga por Lotes (sin interfaz)
+=================================
+Descarga una lista de URLs sin abrir la ventana ni importar Tk.
+Pensado para servidores sin pantalla.
+
+USO:
+  python -m batch_download URL [URL ...]
+  python -m batch_download -i enlaces.txt -o /srv/musica --format mp3 -j 4
+  python -m batch_download --resume   # Retoma lo que quedó a medias
+  python -m batch_download URL --trace lenta.json --profile   # ¿En qué se va el tiempo?
+
+Códigos de salida:
+  0  todas las descargas terminaron bien
+  1  al menos una descarga falló
+  2  argumentos inválidos (sin URLs, carpeta inexistente...)
+  130 interrumpido con Ctrl+C
+"""
+
+import argparse
+import os
+import sys
+import threading
+
+from download_queue import DownloadQueue, DEFAULT_WORKERS, MAX_WORKERS, DONE, FAILED
+from archive import DownloadArchive
+from engine import DownloadEngine, DownloadJob, PLAYLIST_WORKERS
+from info_cache import InfoCache, DEFAULT_TTL
+from journal import JobJournal, BATCH_JOURNAL_FILE
+from job_store import parse_url_lines, read_url_file, unique_urls
+from app_data import get_data_dir
+from media_cache import MediaCache, DEFAULT_MAX_BYTES
+from metrics import MetricsRegistry
+from pipeline import TranscodeStage, DEVICE_PROFILES
+from tracing import TraceSession
+from tuning import AdaptiveTuner
+
+
+EXIT_OK = 0
+EXIT_FAILED = 1
+EXIT_USAGE = 2
+EXIT_INTERRUPTED = 130
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="batch_download",
+        description="Descarga audio/video de una lista de URLs sin interfaz gráfica",
+    )
+    parser.add_argument("urls", nargs="*", help="URLs a descargar")
+    parser.add_argument("-i", "--input", action="append", default=[],
+                        help="Archivo con una URL por línea o CSV ('-' para stdin)")
+    parser.add_argument("-o", "--output", default=str(os.path.join(os.path.expanduser("~"), "Downloads")),
+                        help="Carpeta de destino (por defecto: ~/Downloads)")
+    parser.add_argument("-f", "--format", choices=["mp3", "mp4"], default="mp3",
+                        help="Formato de descarga (por defecto: mp3)")
+    parser.add_argument("--no-convert", action="store_true",
+                        help="No convertir a MP3; guardar el audio en formato original")
+    parser.add_argument("--fast-audio", nargs="?", const="moderno", default=None,
+                        choices=sorted(DEVICE_PROFILES), metavar="PERFIL",
+                        help="Audio rápido: si el dispositivo reproduce el códec original "
+                             "(AAC/Opus...), solo cambiar de contenedor en lugar de "
+                             f"codificar a MP3. Perfiles: {', '.join(sorted(DEVICE_PROFILES))} "
+                             "(por defecto: moderno)")
+    parser.add_argument("--playlist", action="store_true",
+                        help="Descargar la playlist completa en lugar del video individual")
+    parser.add_argument("--playlist-jobs", type=int, default=PLAYLIST_WORKERS,
+                        help=f"Elementos de una playlist descargados a la vez "
+                             f"(1 = secuencial, por defecto: {PLAYLIST_WORKERS})")
+    parser.add_argument("-j", "--jobs", type=int, default=DEFAULT_WORKERS,
+                        help=f"Descargas simultáneas (1-{MAX_WORKERS}, por defecto: {DEFAULT_WORKERS})")
+    parser.add_argument("--transcoders", type=int, default=os.cpu_count() or 2,
+                        help="Conversiones a MP3 simultáneas (0 = convertir dentro de "
+                             "cada descarga, por defecto: núcleos de CPU)")
+    parser.add_argument("--stream", action="store_true",
+                        help="Convertir a MP3 mientras se descarga (por tubería, sin "
+                             "guardar el audio original) cuando el formato lo permita")
+    parser.add_argument("--max-fragments", type=int, default=16,
+                        help="Máximo de fragmentos simultáneos del ajuste automático "
+                             "(por defecto: 16)")
+    parser.add_argument("--no-tuning", action="store_true",
+                        help="No ajustar fragmentos ni tamaño de bloque automáticamente")
+    parser.add_argument("--resume", action="store_true",
+                        help="Retomar las descargas que quedaron sin terminar "
+                             "(cierre inesperado o Ctrl+C)")
+    parser.add_argument("--no-archive", action="store_true",
+                        help="Descargar de nuevo aunque el video ya esté en el archivo "
+                             "de descargas")
+    parser.add_argument("--cache-size", type=int, default=DEFAULT_MAX_BYTES // (1024 * 1024),
+                        help="Tamaño máximo en MB de la caché de flujos descargados "
+                             f"(0 = sin caché, por defecto: {DEFAULT_MAX_BYTES // (1024 * 1024)})")
+    parser.add_argument("--info-ttl", type=int, default=DEFAULT_TTL,
+                        help="Segundos que se reutiliza la información extraída de un "
+                             f"video (0 = no reutilizar, por defecto: {DEFAULT_TTL})")
+    parser.add_argument("--trace", nargs="?", const="traza.json", default=None,
+                        metavar="ARCHIVO",
+                        help="Guardar una traza de cada fase (formato OpenTelemetry JSON, "
+                             "por defecto: traza.json)")
+    parser.add_argument("--profile", action="store_true",
+                        help="Muestrear las pilas de todos los hilos y guardar el informe "
+                             "junto a la traza (.profile.txt y .folded; activa --trace)")
+    parser.add_argument("-v", "--verbose", action="store_true",
+                        help="Mostrar la salida de yt-dlp")
+    return parser
+
+
+def collect_urls(args):
+    """
+    Une las URLs de la línea de comandos y de los archivos indicados,
+    normalizadas y sin repetidas (en el orden en que aparecen)
+    """
+    urls = list(args.urls)
+    for path in args.input:
+        if path == "-":
+            urls.extend(parse_url_lines(sys.stdin))
+        else:
+            urls.extend(read_url_file(path))
+    urls, duplicates = unique_urls(urls, args.format, single_video=not args.playlist)
+    if duplicates:
+        print(f"ℹ️ {duplicates} URL(s) repetida(s) omitida(s)")
+    return urls
+
+
+def run_jobs(download_queue, resumed, urls, args):
+    """Encola los trabajos retomados y los nuevos, y espera a que terminen"""
+    for job in resumed:
+        download_queue.add(job)
+    for url in urls:
+        download_queue.add(DownloadJob(
+            url,
+            args.output,
+            download_format=args.format,
+            convert=not args.no_convert,
+            single_video=not args.playlist,
+            playlist_workers=max(1, args.playlist_jobs),
+            audio_profile=args.fast_audio,
+        ))
+    download_queue.wait()
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+
+    try:
+        urls = collect_urls(args)
+    except OSError as e:
+        print(f"❌ No se pudo leer la lista de URLs: {e}", file=sys.stderr)
+        return EXIT_USAGE
+
+    journal = JobJournal(str(get_data_dir() / BATCH_JOURNAL_FILE))
+    unfinished = journal.unfinished()
+    resumed = unfinished if args.resume else []
+    if resumed:
+        print(f"↻ Retomando {len(resumed)} descarga(s) sin terminar")
+    elif unfinished:
+        print(f"ℹ️ Hay {len(unfinished)} descarga(s) sin terminar de una ejecución anterior "
+              f"(usa --resume para retomarlas)")
+
+    if not urls and not resumed:
+        parser.print_usage(sys.stderr)
+        print("❌ No se indicó ninguna URL", file=sys.stderr)
+        return EXIT_USAGE
+
+    if not os.path.isdir(args.output):
+        print(f"❌ La carpeta no existe: {args.output}", file=sys.stderr)
+        return EXIT_USAGE
+
+    transcoder = TranscodeStage(workers=args.transcoders) if args.transcoders > 0 else None
+    tuner = None if args.no_tuning else AdaptiveTuner(max_fragments=max(1, args.max_fragments))
+    archive = None if args.no_archive else DownloadArchive()
+    media_cache = MediaCache(max_bytes=args.cache_size * 1024 * 1024) if args.cache_size > 0 else None
+    info_cache = InfoCache(ttl=args.info_ttl) if args.info_ttl > 0 else None
+    engine = DownloadEngine(verbose=args.verbose, transcoder=transcoder, tuner=tuner,
+                            archive=archive, media_cache=media_cache, info_cache=info_cache,
+                            stream_transcode=args.stream)
+    total = len(urls) + len(resumed)
+    print_lock = threading.Lock()
+
+    def on_update(job):
+        with print_lock:
+            report(job)
+
+    def report(job):
+        if job.status == DONE:
+            skipped = " (ya descargado)" if job.result.get("skipped") else ""
+            print(f"[{job.id}/{total}] ✅ {job.result.get('title', job.url)}{skipped}")
+        elif job.status == FAILED:
+            print(f"[{job.id}/{total}] ❌ {job.url}: {job.result.get('error', 'Error desconocido')}",
+                  file=sys.stderr)
+            # Playlists: detalle de cada elemento fallido
+            for error in job.result.get("errors", []) if job.result.get("failed_entries") else []:
+                print(f"      {error}", file=sys.stderr)
+        elif args.verbose and job.status == "running" and job.message:
+            print(f"[{job.id}/{total}]    {job.message}")
+
+    metrics = MetricsRegistry()
+    download_queue = DownloadQueue(engine, workers=args.jobs, on_update=on_update,
+                                   journal=journal, metrics=metrics)
+    trace_path = args.trace or ("traza.json" if args.profile else None)
+    try:
+        with TraceSession(trace_path, profile=args.profile):
+            run_jobs(download_queue, resumed, urls, args)
+    except KeyboardInterrupt:
+        print("\n⏹ Interrumpido", file=sys.stderr)
+        return EXIT_INTERRUPTED
+
+    failed = sum(1 for job in download_queue.jobs if job.status == FAILED)
+    skipped = sum(1 for job in download_queue.jobs
+                  if job.status == DONE and job.result.get("skipped"))
+    print(f"\nCompletadas: {total - failed}  |  Fallidas: {failed}  |  Omitidas: {skipped}")
+    if args.verbose:
+        print(metrics.summary())
+        for stage in download_queue.report():
+            print(f"  {stage['stage']}: ocupado {stage['busy']:.1f}s, "
+                  f"sin trabajo {stage['starved']:.1f}s, bloqueado {stage['blocked']:.1f}s")
+    return EXIT_FAILED if failed else EXIT_OK
+
+
+if __name__ == "__main__":
+    sys.exit(main())
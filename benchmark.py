@@ -0,0 +1,464 @@
+"""
+Banco de Pruebas sin Conexión
+=============================
+Mide el motor de descarga de punta a punta sin salir a Internet.
+
+Genera con FFmpeg archivos de audio y video sintéticos y una página con una
+playlist (<audio>/<video>), los sirve desde un servidor HTTP local con
+soporte de rangos (como un CDN) y hace que el extractor genérico de yt-dlp
+los descargue con la cola y el motor reales.
+
+Por escenario (video suelto / playlist, MP3 / MP4) se mide:
+- wall_seconds: duración total
+- ttfb_seconds: desde que empieza un trabajo hasta su primer byte (mediana)
+- conversion_seconds: tiempo de conversión y unión con FFmpeg (suma)
+- throughput_bytes_per_second: bytes transferidos / tiempo transfiriendo
+- peak_rss_bytes: pico de memoria del proceso durante el escenario
+
+Los resultados se guardan como JSON; con --baseline se comparan con una
+ejecución anterior y el código de salida es 1 si algo empeoró más que el
+umbral.
+
+USO:
+  python -m benchmark                                  # Todos los escenarios
+  python -m benchmark -o base.json                     # Guardar como referencia
+  python -m benchmark --baseline base.json --repeat 3  # Comparar con la referencia
+  python -m benchmark --scenarios mp3-single --rate 2048   # Limitar a 2 MB/s
+"""
+
+import argparse
+import json
+import mimetypes
+import os
+import platform
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from statistics import median
+from urllib.parse import unquote, urlparse
+
+
+EXIT_OK = 0
+EXIT_REGRESSION = 1
+EXIT_USAGE = 2
+
+# Duración de los medios sintéticos (segundos) y elementos por playlist
+AUDIO_SECONDS = 120
+VIDEO_SECONDS = 20
+PLAYLIST_SIZE = 4
+
+# Escenario -> (formato, archivos o página, es playlist)
+SCENARIOS = {
+    "mp3-single": ("mp3", ["audio1.m4a"], False),
+    "mp3-batch": ("mp3", [f"audio{i}.m4a" for i in range(1, PLAYLIST_SIZE + 1)], False),
+    "mp3-playlist": ("mp3", ["audios.html"], True),
+    "mp4-single": ("mp4", ["video1.mp4"], False),
+    "mp4-playlist": ("mp4", ["videos.html"], True),
+}
+
+# Métrica -> (mayor es mejor, umbral relativo, diferencia mínima que cuenta)
+METRICS = {
+    "wall_seconds": (False, 0.20, 0.10),
+    "ttfb_seconds": (False, 0.30, 0.05),
+    "conversion_seconds": (False, 0.20, 0.10),
+    "throughput_bytes_per_second": (True, 0.20, 256 * 1024),
+    "peak_rss_bytes": (False, 0.15, 8 * 1024 * 1024),
+}
+
+SERVER_BLOCK_SIZE = 64 * 1024
+
+
+# ==============================================================
+# Servidor de medios local
+# ==============================================================
+class _MediaHandler(BaseHTTPRequestHandler):
+    """Sirve los archivos de una carpeta con soporte de 'Range' y límite de velocidad"""
+
+    root = None
+    rate = None  # bytes/s por conexión (None = sin límite)
+
+    def do_HEAD(self):
+        self._serve(head=True)
+
+    def do_GET(self):
+        self._serve()
+
+    def log_message(self, format, *args):
+        pass  # Sin una línea por petición
+
+    def _serve(self, head=False):
+        name = os.path.basename(unquote(urlparse(self.path).path))
+        path = os.path.join(self.root, name)
+        if not name or not os.path.isfile(path):
+            self.send_error(404)
+            return
+
+        size = os.path.getsize(path)
+        start, end, status = 0, size - 1, 200
+        match = re.match(r'bytes=(\d*)-(\d*)$', self.headers.get('Range', ''))
+        if match and (match.group(1) or match.group(2)):
+            if match.group(1):
+                start = int(match.group(1))
+                end = min(int(match.group(2)), size - 1) if match.group(2) else size - 1
+            else:
+                start = max(0, size - int(match.group(2)))
+            if start > end:
+                self.send_response(416)
+                self.send_header('Content-Range', f'bytes */{size}')
+                self.end_headers()
+                return
+            status = 206
+
+        self.send_response(status)
+        self.send_header('Content-Type', mimetypes.guess_type(name)[0] or 'application/octet-stream')
+        self.send_header('Content-Length', str(end - start + 1))
+        self.send_header('Accept-Ranges', 'bytes')
+        if status == 206:
+            self.send_header('Content-Range', f'bytes {start}-{end}/{size}')
+        self.end_headers()
+        if head:
+            return
+
+        remaining = end - start + 1
+        try:
+            with open(path, 'rb') as f:
+                f.seek(start)
+                while remaining > 0:
+                    block = f.read(min(SERVER_BLOCK_SIZE, remaining))
+                    if not block:
+                        break
+                    self.wfile.write(block)
+                    remaining -= len(block)
+                    if self.rate:
+                        time.sleep(len(block) / self.rate)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # El cliente cortó (p. ej. tras leer solo el inicio)
+
+
+class MediaServer:
+    """Servidor HTTP local en un puerto libre, en un hilo aparte"""
+
+    def __init__(self, root, rate=None):
+        handler = type("MediaHandler", (_MediaHandler,), {"root": root, "rate": rate})
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        self._server.daemon_threads = True
+        self.base_url = f"http://127.0.0.1:{self._server.server_address[1]}/"
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._server.shutdown()
+        self._server.server_close()
+        return False
+
+
+# ==============================================================
+# Medios sintéticos
+# ==============================================================
+def generate_media(ffmpeg, folder):
+    """Crea los audios, videos y páginas de playlist que usan los escenarios"""
+    encoders = _encoders(ffmpeg)
+    video_codec = ["-c:v", "libx264", "-preset", "ultrafast"] if "libx264" in encoders \
+        else ["-c:v", "mpeg4"]
+
+    for i in range(1, PLAYLIST_SIZE + 1):
+        # Ruido en lugar de un tono: se comprime como música real, no a casi nada
+        _ffmpeg(ffmpeg, [
+            "-f", "lavfi", "-i", f"anoisesrc=color=pink:duration={AUDIO_SECONDS}:seed={i}",
+            "-c:a", "aac", "-b:a", "192k", "-metadata", f"title=Audio {i}",
+            os.path.join(folder, f"audio{i}.m4a"),
+        ])
+    for i in range(1, PLAYLIST_SIZE + 1):
+        _ffmpeg(ffmpeg, [
+            "-f", "lavfi", "-i", f"testsrc2=size=854x480:rate=30:duration={VIDEO_SECONDS}",
+            "-f", "lavfi", "-i", f"anoisesrc=duration={VIDEO_SECONDS}:seed={i}",
+            *video_codec, "-b:v", "2M", "-c:a", "aac", "-b:a", "128k",
+            "-shortest", "-movflags", "+faststart", "-metadata", f"title=Video {i}",
+            os.path.join(folder, f"video{i}.mp4"),
+        ])
+
+    for page, tag, prefix, ext in (("audios.html", "audio", "audio", "m4a"),
+                                   ("videos.html", "video", "video", "mp4")):
+        items = "\n".join(f'<{tag} src="{prefix}{i}.{ext}"></{tag}>'
+                          for i in range(1, PLAYLIST_SIZE + 1))
+        with open(os.path.join(folder, page), "w", encoding="utf-8") as f:
+            f.write(f"<html><head><title>Lista de {prefix}s</title></head>"
+                    f"<body>\n{items}\n</body></html>\n")
+
+
+def _encoders(ffmpeg):
+    result = subprocess.run([ffmpeg, "-hide_banner", "-encoders"],
+                            capture_output=True, text=True)
+    return result.stdout
+
+
+def _ffmpeg(ffmpeg, args):
+    result = subprocess.run([ffmpeg, "-hide_banner", "-loglevel", "error", "-y"] + args,
+                            capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"FFmpeg no pudo generar el archivo de prueba: {result.stderr[-300:]}")
+
+
+# ==============================================================
+# Memoria
+# ==============================================================
+def reset_peak_rss():
+    """Reinicia el pico de memoria del proceso (solo Linux)"""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def peak_rss():
+    """Pico de memoria residente del proceso en bytes (None si no se sabe)"""
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+    except (ImportError, OSError):
+        return None
+
+
+# ==============================================================
+# Escenarios
+# ==============================================================
+def run_scenario(name, base_url, output_dir, stream=False):
+    """
+    Ejecuta un escenario con un motor y una cola nuevos.
+
+    Returns:
+        dict con las medidas del escenario
+    """
+    from download_queue import DownloadQueue, DEFAULT_WORKERS, RUNNING
+    from engine import DownloadEngine, DownloadJob
+    from pipeline import TranscodeStage
+
+    download_format, paths, playlist = SCENARIOS[name]
+    engine = DownloadEngine(transcoder=TranscodeStage(), stream_transcode=stream)
+    started = {}
+    first_byte = {}
+    lock = threading.Lock()
+
+    def on_update(job):
+        now = time.monotonic()
+        with lock:
+            if job.status == RUNNING:
+                started.setdefault(job.id, now)
+            if job.downloaded_bytes and job.id not in first_byte:
+                first_byte[job.id] = now
+
+    download_queue = DownloadQueue(engine, workers=DEFAULT_WORKERS, on_update=on_update)
+    reset_peak_rss()
+    start = time.monotonic()
+    for path in paths:
+        download_queue.add(DownloadJob(base_url + path, output_dir, download_format,
+                                       single_video=not playlist))
+    download_queue.wait()
+    wall = time.monotonic() - start
+
+    results = []
+    for job in download_queue.jobs:
+        results.extend(job.result.get("entries") or [job.result])
+    failures = [r.get("error") for r in results if not r["success"]]
+    measures = [r.get("metrics") or {} for r in results]
+    transferred = sum(m.get("bytes") or 0 for m in measures)
+    transfer_time = sum(m.get("download_seconds") or 0 for m in measures)
+    ttfbs = [first_byte[job_id] - started[job_id] for job_id in first_byte if job_id in started]
+
+    return {
+        "jobs": len(results),
+        "failures": len(failures),
+        "errors": failures[:3],
+        "bytes": transferred,
+        "wall_seconds": round(wall, 3),
+        "ttfb_seconds": round(median(ttfbs), 3) if ttfbs else None,
+        "conversion_seconds": round(sum(m.get("postprocess_seconds") or 0 for m in measures), 3),
+        "throughput_bytes_per_second": round(transferred / transfer_time) if transfer_time else None,
+        "peak_rss_bytes": peak_rss(),
+    }
+
+
+def combine_runs(runs):
+    """Une las repeticiones: mediana de cada medida y pico máximo de memoria"""
+    combined = dict(runs[-1])
+    for metric in METRICS:
+        values = [run[metric] for run in runs if run.get(metric) is not None]
+        if not values:
+            continue
+        combined[metric] = max(values) if metric == "peak_rss_bytes" else median(values)
+    combined["failures"] = sum(run["failures"] for run in runs)
+    combined["repeat"] = len(runs)
+    return combined
+
+
+# ==============================================================
+# Comparación con la referencia
+# ==============================================================
+def compare(results, baseline, threshold=None):
+    """
+    Compara cada medida con la referencia.
+
+    Args:
+        threshold: umbral relativo para todas las medidas (None = el de METRICS)
+
+    Returns:
+        lista de (escenario, medida, referencia, actual, cambio, es_regresion)
+    """
+    rows = []
+    for name, current in results["scenarios"].items():
+        reference = baseline.get("scenarios", {}).get(name)
+        if not reference:
+            continue
+        for metric, (higher_is_better, default_threshold, min_delta) in METRICS.items():
+            old, new = reference.get(metric), current.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            worse = -change if higher_is_better else change
+            limit = default_threshold if threshold is None else threshold
+            regression = worse > limit and abs(new - old) >= min_delta
+            rows.append((name, metric, old, new, change, regression))
+    return rows
+
+
+def _format_value(metric, value):
+    if value is None:
+        return "-"
+    if metric.endswith("_seconds"):
+        return f"{value:.2f}s"
+    if metric == "throughput_bytes_per_second":
+        return f"{value / (1024 * 1024):.1f} MB/s"
+    if metric.endswith("_bytes"):
+        return f"{value / (1024 * 1024):.0f} MB"
+    return str(value)
+
+
+def print_results(results):
+    for name, scenario in results["scenarios"].items():
+        line = "  ".join(f"{metric.split('_')[0]} {_format_value(metric, scenario.get(metric))}"
+                         for metric in METRICS)
+        failures = f"  ❌ {scenario['failures']} fallos" if scenario["failures"] else ""
+        print(f"{name:14s} {line}{failures}")
+        for error in scenario.get("errors") or []:
+            print(f"               {error}")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="benchmark",
+                                     description="Banco de pruebas del motor sin conexión")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS),
+                        help=f"Escenarios separados por comas ({', '.join(SCENARIOS)})")
+    parser.add_argument("--repeat", type=int, default=1,
+                        help="Repeticiones de cada escenario (se usa la mediana)")
+    parser.add_argument("--rate", type=int, default=0,
+                        help="Límite de velocidad del servidor en KB/s por conexión "
+                             "(0 = sin límite)")
+    parser.add_argument("--stream", action="store_true",
+                        help="Convertir a MP3 mientras se descarga (como batch_download --stream)")
+    parser.add_argument("-o", "--output", default="benchmark.json",
+                        help="Archivo JSON de resultados (por defecto: benchmark.json)")
+    parser.add_argument("--baseline", help="Resultados de referencia para comparar")
+    parser.add_argument("--threshold", type=float, default=None,
+                        help="Empeoramiento relativo tolerado en todas las medidas "
+                             "(p. ej. 0.1 = 10%%; por defecto, uno por medida)")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    names = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        print(f"❌ Escenarios desconocidos: {', '.join(unknown)}", file=sys.stderr)
+        return EXIT_USAGE
+
+    baseline = None
+    if args.baseline:
+        try:
+            with open(args.baseline, "r", encoding="utf-8") as f:
+                baseline = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"❌ No se pudo leer la referencia: {e}", file=sys.stderr)
+            return EXIT_USAGE
+
+    work_dir = tempfile.mkdtemp(prefix="descargador-bench-")
+    # Estado (cachés, ajustes) aparte del de la app para no mezclarlos
+    os.environ["DESCARGADOR_DATA_DIR"] = os.path.join(work_dir, "datos")
+    try:
+        from ffmpeg_utils import find_ffmpeg
+        import yt_dlp
+
+        ffmpeg = find_ffmpeg()
+        if not ffmpeg:
+            print("❌ FFmpeg no encontrado (hace falta para generar los medios)", file=sys.stderr)
+            return EXIT_USAGE
+
+        media_dir = os.path.join(work_dir, "medios")
+        os.makedirs(media_dir)
+        print("Generando medios de prueba...")
+        generate_media(ffmpeg, media_dir)
+
+        results = {
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "ytdlp": yt_dlp.version.__version__,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "rate_kbps": args.rate or None,
+            "stream": args.stream,
+            "scenarios": {},
+        }
+        with MediaServer(media_dir, rate=args.rate * 1024 or None) as server:
+            # Primera descarga sin medir: carga de yt-dlp, extractores y FFmpeg
+            warmup_dir = tempfile.mkdtemp(prefix="calentamiento-", dir=work_dir)
+            run_scenario("mp4-single", server.base_url, warmup_dir)
+            for name in names:
+                runs = []
+                for _ in range(max(1, args.repeat)):
+                    output_dir = tempfile.mkdtemp(prefix=f"{name}-", dir=work_dir)
+                    runs.append(run_scenario(name, server.base_url, output_dir, args.stream))
+                    shutil.rmtree(output_dir, ignore_errors=True)
+                results["scenarios"][name] = combine_runs(runs)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    print_results(results)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+    print(f"Resultados guardados en {args.output}")
+
+    failed = any(s["failures"] for s in results["scenarios"].values())
+    if baseline is None:
+        return EXIT_REGRESSION if failed else EXIT_OK
+
+    rows = compare(results, baseline, args.threshold)
+    print(f"\nComparación con {args.baseline} (yt-dlp {baseline.get('ytdlp', '?')} → "
+          f"{results['ytdlp']}):")
+    for name, metric, old, new, change, regression in rows:
+        mark = "❌" if regression else "  "
+        print(f"{mark} {name:14s} {metric:28s} {_format_value(metric, old):>10s} → "
+              f"{_format_value(metric, new):>10s}  ({change:+.0%})")
+    regressions = [row for row in rows if row[5]]
+    if regressions:
+        print(f"\n❌ {len(regressions)} medida(s) empeoraron más que el umbral")
+    return EXIT_REGRESSION if regressions or failed else EXIT_OK
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,260 @@
+"""
+Parches Binarios
+================
+Actualizaciones del ejecutable por diferencias: en lugar de descargar el
+.exe completo (decenas de MB, con los binarios de FFmpeg dentro), se
+descarga un parche que reconstruye el nuevo a partir del que está en uso.
+
+El formato es por bloques al estilo rsync: el ejecutable nuevo se describe
+como copias de trozos del anterior (encontrados en cualquier posición con
+una suma de comprobación rodante) más los bytes nuevos. En un ejecutable de
+PyInstaller las partes que no cambian (Python, FFmpeg, librerías) quedan
+idénticas aunque se desplacen, así que el parche ocupa lo que ocupa el
+código que cambió.
+
+Formato del archivo:
+  DMDELTA1\\n
+  {"source_sha256": ..., "target_sha256": ..., "target_size": ...}\\n
+  operaciones comprimidas con LZMA:
+    b"C" + origen (8 bytes) + longitud (8 bytes)   copiar del anterior
+    b"D" + longitud (8 bytes) + datos               bytes nuevos
+
+USO (al publicar una versión):
+  python -m delta make Anterior.exe Nuevo.exe DescargadorMusica-from-1.0.delta
+  python -m delta apply Anterior.exe parche.delta Reconstruido.exe
+"""
+
+import argparse
+import hashlib
+import json
+import lzma
+import struct
+import sys
+from itertools import accumulate
+
+
+MAGIC = b"DMDELTA1\n"
+
+# Tamaño de bloque para buscar coincidencias (más pequeño = parche más
+# ajustado pero índice más grande)
+BLOCK_SIZE = 2048
+
+# Trozo de lectura al copiar y al calcular hashes
+COPY_CHUNK = 1024 * 1024
+
+_MASK = 0xFFFF
+_COPY = struct.Struct(">QQ")
+_LENGTH = struct.Struct(">Q")
+
+
+class DeltaError(ValueError):
+    """El parche no corresponde al ejecutable o el resultado no es el esperado"""
+
+
+def file_sha256(path):
+    """SHA-256 hexadecimal de un archivo"""
+    hasher = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(COPY_CHUNK), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def _checksum(block):
+    """Suma rodante (a, b) de un bloque: se desliza un byte en tiempo constante"""
+    return sum(block) & _MASK, sum(accumulate(block)) & _MASK
+
+
+# ==============================================================
+# Creación
+# ==============================================================
+def make_delta(source_path, target_path, patch_path, block_size=BLOCK_SIZE):
+    """
+    Crea el parche que convierte source_path en target_path.
+
+    Returns:
+        dict con 'patch_size', 'target_size', 'copied' y 'literal' (bytes)
+    """
+    with open(source_path, "rb") as f:
+        source = f.read()
+    with open(target_path, "rb") as f:
+        target = f.read()
+
+    # Índice de los bloques alineados del anterior por su suma rodante
+    index = {}
+    for offset in range(0, len(source) - block_size + 1, block_size):
+        a, b = _checksum(source[offset:offset + block_size])
+        index.setdefault(a | (b << 16), []).append(offset)
+
+    ops = []  # ("C", origen, longitud) o ("D", inicio, fin) sobre target
+    copied = 0
+    pos = literal_start = 0
+    size = len(target)
+    a = b = None
+
+    def add_copy(offset):
+        if ops and ops[-1][0] == "C" and ops[-1][1] + ops[-1][2] == offset:
+            ops[-1] = ("C", ops[-1][1], ops[-1][2] + block_size)
+        else:
+            ops.append(("C", offset, block_size))
+
+    while pos + block_size <= size:
+        if a is None:
+            a, b = _checksum(target[pos:pos + block_size])
+        candidates = index.get(a | (b << 16))
+        match = None
+        if candidates:
+            window = target[pos:pos + block_size]
+            # Preferir el bloque que sigue a la última copia: une operaciones
+            if ops and ops[-1][0] == "C":
+                expected = ops[-1][1] + ops[-1][2]
+                if expected in candidates and source[expected:expected + block_size] == window:
+                    match = expected
+            if match is None:
+                for offset in candidates:
+                    if source[offset:offset + block_size] == window:
+                        match = offset
+                        break
+
+        if match is not None:
+            if literal_start < pos:
+                ops.append(("D", literal_start, pos))
+            add_copy(match)
+            copied += block_size
+            pos += block_size
+            literal_start = pos
+            a = None
+        elif pos + block_size < size:
+            out_byte = target[pos]
+            a = (a - out_byte + target[pos + block_size]) & _MASK
+            b = (b - block_size * out_byte + a) & _MASK
+            pos += 1
+        else:
+            break
+
+    if literal_start < size:
+        ops.append(("D", literal_start, size))
+
+    header = {
+        "source_sha256": hashlib.sha256(source).hexdigest(),
+        "target_sha256": hashlib.sha256(target).hexdigest(),
+        "target_size": size,
+        "block_size": block_size,
+    }
+    with open(patch_path, "wb") as f:
+        f.write(MAGIC)
+        f.write(json.dumps(header).encode("utf-8") + b"\n")
+        with lzma.open(f, "wb", preset=9) as body:
+            for op in ops:
+                if op[0] == "C":
+                    body.write(b"C" + _COPY.pack(op[1], op[2]))
+                else:
+                    body.write(b"D" + _LENGTH.pack(op[2] - op[1]))
+                    body.write(target[op[1]:op[2]])
+        patch_size = f.tell()
+
+    return {
+        "patch_size": patch_size,
+        "target_size": size,
+        "copied": copied,
+        "literal": size - copied,
+    }
+
+
+# ==============================================================
+# Aplicación
+# ==============================================================
+def read_header(patch_path):
+    """Cabecera del parche (hashes de origen y destino, tamaño)"""
+    with open(patch_path, "rb") as f:
+        return _read_header(f)
+
+
+def _read_header(f):
+    if f.readline() != MAGIC:
+        raise DeltaError("no es un parche de actualización")
+    try:
+        return json.loads(f.readline().decode("utf-8"))
+    except ValueError:
+        raise DeltaError("cabecera del parche dañada")
+
+
+def apply_delta(source_path, patch_path, output_path):
+    """
+    Reconstruye el ejecutable nuevo aplicando el parche a source_path.
+
+    Comprueba antes el hash del origen y después el del resultado.
+
+    Raises:
+        DeltaError si el parche no es para este archivo o el resultado no
+        coincide; OSError si falla la lectura o escritura
+    """
+    with open(patch_path, "rb") as patch:
+        header = _read_header(patch)
+        if file_sha256(source_path) != header["source_sha256"]:
+            raise DeltaError("el parche no corresponde a la versión instalada")
+
+        hasher = hashlib.sha256()
+        with lzma.open(patch, "rb") as body, \
+                open(source_path, "rb") as source, open(output_path, "wb") as out:
+            while True:
+                kind = body.read(1)
+                if not kind:
+                    break
+                if kind == b"C":
+                    offset, length = _COPY.unpack(body.read(_COPY.size))
+                    source.seek(offset)
+                    reader = source
+                elif kind == b"D":
+                    (length,) = _LENGTH.unpack(body.read(_LENGTH.size))
+                    reader = body
+                else:
+                    raise DeltaError("operación desconocida en el parche")
+                while length > 0:
+                    chunk = reader.read(min(COPY_CHUNK, length))
+                    if not chunk:
+                        raise DeltaError("parche truncado")
+                    out.write(chunk)
+                    hasher.update(chunk)
+                    length -= len(chunk)
+            size = out.tell()
+
+    if size != header["target_size"] or hasher.hexdigest() != header["target_sha256"]:
+        raise DeltaError("el ejecutable reconstruido no coincide con el publicado")
+    return header
+
+
+# ==============================================================
+# Línea de comandos
+# ==============================================================
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="delta", description="Parches binarios del ejecutable")
+    commands = parser.add_subparsers(dest="command", required=True)
+    make = commands.add_parser("make", help="Crear un parche")
+    make.add_argument("source", help="Ejecutable de la versión anterior")
+    make.add_argument("target", help="Ejecutable de la versión nueva")
+    make.add_argument("patch", help="Archivo de parche a crear")
+    make.add_argument("--block-size", type=int, default=BLOCK_SIZE)
+    apply = commands.add_parser("apply", help="Aplicar un parche")
+    apply.add_argument("source", help="Ejecutable de la versión anterior")
+    apply.add_argument("patch", help="Archivo de parche")
+    apply.add_argument("output", help="Ejecutable reconstruido")
+    args = parser.parse_args(argv)
+
+    try:
+        if args.command == "make":
+            stats = make_delta(args.source, args.target, args.patch, args.block_size)
+            print(f"Parche: {stats['patch_size'] / 1024:.0f} KB para un ejecutable de "
+                  f"{stats['target_size'] / (1024 * 1024):.1f} MB "
+                  f"({stats['literal'] / 1024:.0f} KB nuevos)")
+        else:
+            apply_delta(args.source, args.patch, args.output)
+            print(f"Reconstruido: {args.output}")
+    except (OSError, DeltaError) as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
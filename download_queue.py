@@ -0,0 +1,369 @@
+"""
+Cola de Descargas
+=================
+Cola de trabajos con un grupo limitado de hilos de descarga.
+
+Se pueden agregar URLs mientras otras se están descargando; N hilos
+(configurables en caliente) toman trabajos de la cola y cada trabajo
+guarda su propio estado y progreso.
+
+Con una cola persistente (job_store.py) los trabajos esperan en disco y
+solo pasan a memoria los que los hilos pueden empezar enseguida.
+"""
+
+import itertools
+import queue
+import threading
+import time
+from collections import deque
+
+from engine_versions import engine_switch, loaded_version
+from pipeline import StageStats
+
+
+# Estados de un trabajo en la cola
+PENDING = "pending"
+RUNNING = "running"
+CONVERTING = "converting"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+DEFAULT_WORKERS = 3
+MAX_WORKERS = 8
+
+# Segundos que espera un hilo sin trabajo antes de terminar
+IDLE_TIMEOUT = 2.0
+
+# Trabajos terminados que se conservan en 'jobs' con una cola larga (ventana)
+KEEP_FINISHED = 200
+
+
+class DownloadQueue:
+    """Reparte trabajos de descarga entre un número limitado de hilos"""
+
+    def __init__(self, engine, workers=DEFAULT_WORKERS, on_update=None, on_idle=None,
+                 journal=None, metrics=None, backlog=None, keep_finished=None):
+        """
+        Args:
+            engine: DownloadEngine que ejecuta cada trabajo
+            workers: número máximo de descargas simultáneas
+            on_update: callable(job) llamado al cambiar el estado o progreso,
+                desde los hilos de trabajo (ver progress_bus.py para la GUI)
+            on_idle: callable(jobs, completed) llamado cuando la cola queda
+                vacía, con los trabajos terminados desde la última vez (con
+                keep_finished, solo los fallidos y los últimos correctos) y
+                el número de descargas correctas
+            journal: JobJournal opcional donde se registran las fases de cada
+                trabajo para retomarlo tras un cierre inesperado
+            metrics: MetricsRegistry opcional donde se registran las medidas
+                de cada trabajo terminado (ver metrics.py)
+            backlog: JobStore opcional del que se toman trabajos, por
+                prioridad, a medida que quedan hilos libres (ver refill)
+            keep_finished: máximo de trabajos terminados que se conservan en
+                'jobs' (None = todos); los totales siguen en done_count y
+                failed_count, así la memoria no crece con la cola
+        """
+        self.engine = engine
+        self.on_update = on_update
+        self.on_idle = on_idle
+        self.journal = journal
+        self.metrics = metrics
+        self.backlog = backlog
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._refill_lock = threading.Lock()
+        self._all_done = threading.Condition(self._lock)
+        self._ids = itertools.count(1)
+        self._max_workers = max(1, min(MAX_WORKERS, workers))
+        self._active_workers = 0
+        self._busy = 0
+        self._converting = 0
+        # Terminados desde el último on_idle: de los correctos, con
+        # keep_finished, solo los últimos; los fallidos todos (se ofrecen
+        # reintentar)
+        self._finished_ok = deque(maxlen=keep_finished)
+        self._finished_failed = []
+        self._completed = 0  # Descargas correctas desde el último on_idle
+        self._keep_finished = keep_finished
+        self._retired = deque()  # Terminados aún en 'jobs' (si keep_finished)
+        self.jobs = []  # Trabajos en orden de llegada (ver keep_finished)
+        self.done_count = 0
+        self.failed_count = 0
+        self.stats = StageStats("descarga")
+
+    # ----------------------------------------------------------
+    # API pública
+    # ----------------------------------------------------------
+    @property
+    def workers(self):
+        return self._max_workers
+
+    def set_workers(self, count):
+        """Cambia el número de descargas simultáneas (se aplica en caliente)"""
+        with self._lock:
+            self._max_workers = max(1, min(MAX_WORKERS, int(count)))
+        self._ensure_workers()
+
+    def add(self, job):
+        """Agrega un trabajo a la cola y lo retorna con su id asignado"""
+        job.id = next(self._ids)
+        job.status = PENDING
+        job.percent = 0.0
+        job.downloaded_bytes = 0
+        job.total_bytes = 0
+        job.message = "En cola"
+        job.result = None
+        with self._lock:
+            self.jobs.append(job)
+        if self.journal is not None:
+            self.journal.add(job)
+        self._queue.put(job)
+        self._notify(job)
+        self._ensure_workers()
+        return job
+
+    def refill(self):
+        """
+        Pasa trabajos del backlog a la cola hasta tener uno esperando por
+        cada hilo de descarga.
+
+        Se quitan del backlog después de registrarlos en el diario: tras un
+        cierre entre ambos pasos un trabajo puede repetirse (el archivo de
+        descargas lo omite), pero no perderse.
+
+        Returns:
+            número de trabajos pasados a la cola
+        """
+        if self.backlog is None:
+            return 0
+        with self._refill_lock:
+            missing = self._max_workers - self._queue.qsize()
+            if missing <= 0:
+                return 0
+            try:
+                jobs = self.backlog.head(missing)
+                for job in jobs:
+                    self.add(job)
+                self.backlog.remove(jobs)
+            except Exception as e:
+                print(f"Error leyendo la cola guardada: {e}")
+                return 0
+        return len(jobs)
+
+    def cancel(self, job):
+        """Cancela un trabajo que aún no ha empezado"""
+        with self._lock:
+            if job.status != PENDING:
+                return False
+            job.status = CANCELLED
+            job.message = "Cancelado"
+            self._retire(job)
+        if self.journal is not None:
+            self.journal.update(job, "cancelled")
+        self._notify(job)
+        return True
+
+    def pending_count(self):
+        with self._lock:
+            return sum(1 for job in self.jobs if job.status == PENDING)
+
+    def running_count(self):
+        with self._lock:
+            return self._busy
+
+    def wait(self):
+        """Bloquea hasta que todos los trabajos agregados hayan terminado"""
+        self._queue.join()
+        with self._all_done:
+            self._all_done.wait_for(lambda: self._converting == 0)
+
+    def report(self):
+        """Tiempos ocupado/sin trabajo de cada etapa (descarga y conversión)"""
+        stages = [self.stats.as_dict()]
+        if self.engine.transcoder is not None:
+            stages.append(self.engine.transcoder.stats.as_dict())
+        return stages
+
+    # ----------------------------------------------------------
+    # Hilos de trabajo
+    # ----------------------------------------------------------
+    def _ensure_workers(self):
+        """Arranca hilos hasta cubrir el máximo o los trabajos pendientes"""
+        with self._lock:
+            needed = min(self._max_workers, self._queue.qsize() + self._busy)
+            to_start = needed - self._active_workers
+            self._active_workers += max(0, to_start)
+
+        for _ in range(to_start):
+            threading.Thread(target=self._worker, daemon=True).start()
+
+    def _worker(self):
+        while True:
+            with self._lock:
+                # Sobran hilos tras reducir el máximo
+                if self._active_workers > self._max_workers:
+                    self._active_workers -= 1
+                    return
+
+            wait_start = time.monotonic()
+            try:
+                job = self._queue.get(timeout=IDLE_TIMEOUT)
+            except queue.Empty:
+                self.stats.add(starved=time.monotonic() - wait_start)
+                self.refill()
+                with self._lock:
+                    if self._queue.empty():
+                        self._active_workers -= 1
+                        return
+                continue
+
+            self.stats.add(starved=time.monotonic() - wait_start)
+            try:
+                if job.status == CANCELLED:
+                    continue
+                self._run_job(job)
+            finally:
+                # Reponer antes de marcarlo hecho: wait() y on_idle no ven
+                # la cola vacía mientras quede backlog
+                self.refill()
+                self._queue.task_done()
+                self._check_idle()
+
+    def _run_job(self, job):
+        with self._lock:
+            self._busy += 1
+            job.status = RUNNING
+            job.message = "Iniciando..."
+        self._notify(job)
+
+        # Si se activó otra versión de yt-dlp, el trabajo espera a que las
+        # descargas en marcha terminen con la anterior
+        with engine_switch.job() as engine_path:
+            start = time.monotonic()
+            try:
+                result = self.engine.run(
+                    job,
+                    progress_callback=self._on_progress,
+                    status_callback=self._on_status,
+                )
+            except Exception as e:
+                result = {"success": False, "url": job.url, "error": str(e), "error_kind": "other"}
+            # Versión con la que corrió, para el registro de métricas (la
+            # conversión puede terminar después de otro cambio)
+            result.setdefault("ytdlp_version", loaded_version())
+        engine_switch.record(engine_path, result)
+
+        blocked = result.get("handoff_wait", 0.0)
+        self.stats.add(busy=time.monotonic() - start - blocked, blocked=blocked, items=1)
+
+        future = result.get("transcode_future")
+        if future is not None:
+            # La conversión sigue en otra etapa; este hilo pasa al siguiente trabajo
+            with self._lock:
+                self._busy -= 1
+                self._converting += 1
+                job.status = CONVERTING
+                job.percent = 100.0
+                job.message = "Convirtiendo a MP3..."
+            if self.journal is not None:
+                self.journal.update(job, "converting")
+            self._notify(job)
+            future.add_done_callback(lambda _: self._finish_conversion(job, result))
+            return
+
+        with self._lock:
+            self._busy -= 1
+            self._complete(job, result)
+        self._record_metrics(result)
+        self._notify(job)
+
+    def _finish_conversion(self, job, result):
+        self.engine.finish(result)
+        with self._lock:
+            self._complete(job, result)
+        self._record_metrics(result)
+        self._notify(job)
+        with self._lock:
+            self._converting -= 1
+            self._all_done.notify_all()
+        self._check_idle()
+
+    def _complete(self, job, result):
+        """Marca el trabajo como terminado (llamar con el lock tomado)"""
+        job.result = result
+        if result["success"]:
+            job.status = DONE
+            job.percent = 100.0
+            job.message = "Ya descargado" if result.get("skipped") else "Completado"
+        else:
+            job.status = FAILED
+            job.message = result.get("error", "Error desconocido")
+        if self.journal is not None:
+            self.journal.update(job, "done" if result["success"] else "failed",
+                                output_path=result.get("output_path"))
+        if result["success"]:
+            self.done_count += 1
+            self._completed += 1
+            self._finished_ok.append(job)
+        else:
+            self.failed_count += 1
+            self._finished_failed.append(job)
+        self._retire(job)
+        self._all_done.notify_all()
+
+    def _retire(self, job):
+        """Quita de 'jobs' los terminados más antiguos (llamar con el lock tomado)"""
+        if self._keep_finished is None:
+            return
+        self._retired.append(job)
+        while len(self._retired) > self._keep_finished:
+            old = self._retired.popleft()
+            try:
+                self.jobs.remove(old)
+            except ValueError:
+                pass
+
+    def _record_metrics(self, result):
+        if self.metrics is None:
+            return
+        try:
+            self.metrics.record(result)
+        except Exception as e:
+            print(f"Error registrando métricas: {e}")
+
+    def _on_progress(self, job, event):
+        if self.journal is not None:
+            self.journal.progress(job, event)
+        if event['status'] == 'downloading':
+            job.percent = event['percent']
+            job.downloaded_bytes = event.get('downloaded_bytes') or 0
+            job.total_bytes = event.get('total_bytes') or 0
+            job.message = f"Descargando {event['percent']:.0f}%"
+        elif event['status'] == 'finished':
+            job.percent = 100.0
+            job.message = "Procesando..."
+        self._notify(job)
+
+    def _on_status(self, job, message):
+        job.message = message
+        self._notify(job)
+
+    def _check_idle(self):
+        with self._lock:
+            if (self._busy or self._converting or not self._queue.empty()
+                    or not (self._completed or self._finished_failed)):
+                return
+            finished = list(self._finished_ok) + self._finished_failed
+            self._finished_ok.clear()
+            self._finished_failed = []
+            completed, self._completed = self._completed, 0
+        if self.on_idle:
+            self.on_idle(finished, completed)
+
+    def _notify(self, job):
+        if self.on_update:
+            try:
+                self.on_update(job)
+            except Exception as e:
+                print(f"Error notificando progreso: {e}")
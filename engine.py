@@ -0,0 +1,993 @@
+"""
+Motor de Descarga
+=================
+Lógica de descarga de yt-dlp separada de la interfaz gráfica.
+
+El motor no importa Tk: recibe trabajos (DownloadJob), devuelve resultados
+como diccionarios y reporta el progreso mediante callbacks. Lo usan tanto
+la ventana (main.py) como el modo por lotes (batch_download.py).
+
+yt-dlp se importa la primera vez que hace falta (tarda cientos de ms); la
+ventana lo precarga en segundo plano con preload() después de mostrarse.
+"""
+
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from archive import extractor_classes
+from engine_versions import engine_switch, load_ytdlp
+from ffmpeg_utils import get_ffmpeg_tools, get_ffmpeg_location
+from media_cache import MediaCache, link_or_copy
+from metrics import JobMeter
+from tracing import HookSpans, tracer
+from pipeline import (DEVICE_PROFILES, convert_audio, merge_streams,
+                      stream_transcode_to_mp3)
+
+
+# Límite de elementos al descargar una playlist completa
+PLAYLIST_LIMIT = 50
+
+# Descargas simultáneas de elementos de una misma playlist
+PLAYLIST_WORKERS = 4
+
+# Calidad del MP3 (kbps)
+MP3_QUALITY = '192'
+
+# Formatos que FFmpeg puede leer de una tubería a medida que llegan (los
+# .m4a normales llevan el índice al final y necesitan el archivo completo)
+STREAMABLE_CONTAINERS = {'m4a_dash', 'webm_dash', 'mp4_dash'}
+STREAMABLE_EXTS = {'webm', 'weba', 'mp3', 'ogg', 'oga', 'opus', 'aac', 'flac', 'wav', 'mka'}
+
+# Bytes leídos por vuelta al convertir en streaming
+STREAM_BLOCK_SIZE = 256 * 1024
+
+# Claves del resultado que solo valen para el hilo que generó el archivo
+# (quien espera la misma descarga no las recibe; ver _release_output)
+PRODUCER_ONLY_KEYS = ("transcode_future", "transcode_submitted", "handoff_wait", "metrics")
+
+# Palabras clave de errores típicos de yt-dlp (extractor roto, video no disponible...)
+EXTRACTION_ERROR_KEYWORDS = [
+    "unable to extract", "video unavailable", "sign in",
+    "http error", "urlopen error", "blocked",
+    "no video formats", "unsupported url",
+    "this video is not available", "private video",
+]
+
+
+def preload(engine=None):
+    """
+    Importa yt-dlp y sus extractores por adelantado y localiza FFmpeg, para
+    que la primera descarga empiece enseguida. Pensado para un hilo aparte.
+
+    Returns:
+        str con la versión de yt-dlp
+    """
+    # Como una descarga: un cambio de versión no vacía sys.modules a la vez
+    with engine_switch.job():
+        yt_dlp = load_ytdlp()
+        extractor_classes()
+    if engine is not None:
+        engine.resolve_ffmpeg()
+    return yt_dlp.version.__version__
+
+
+def classify_error(error_msg):
+    """
+    Clasifica un mensaje de error de descarga.
+
+    Returns:
+        'ffmpeg', 'extraction' u 'other'
+    """
+    error_lower = error_msg.lower()
+    if "ffmpeg" in error_lower or "ffprobe" in error_lower:
+        return "ffmpeg"
+    if any(kw in error_lower for kw in EXTRACTION_ERROR_KEYWORDS):
+        return "extraction"
+    return "other"
+
+
+class _YdlLogger:
+    """Logger para yt-dlp que guarda los errores para poder clasificarlos"""
+
+    def __init__(self, verbose=False, on_retry=None):
+        self.verbose = verbose
+        self.errors = []
+        self.on_retry = on_retry  # callable() por cada reintento de yt-dlp
+
+    def debug(self, msg):
+        self._check_retry(msg)
+        if self.verbose:
+            print(msg)
+
+    def info(self, msg):
+        self._check_retry(msg)
+        if self.verbose:
+            print(msg)
+
+    def warning(self, msg):
+        self._check_retry(msg)
+        if self.verbose:
+            print(msg)
+
+    def error(self, msg):
+        self.errors.append(msg)
+        if self.verbose:
+            print(msg)
+
+    def _check_retry(self, msg):
+        # yt-dlp avisa cada reintento con "... Retrying (n/m)..."
+        if self.on_retry and "Retrying" in msg:
+            self.on_retry()
+
+
+class DownloadJob:
+    """Describe una descarga: URL, formato y carpeta de destino"""
+
+    def __init__(self, url, output_dir, download_format='mp3', convert=True,
+                 single_video=True, playlist_workers=PLAYLIST_WORKERS,
+                 playlist_index=None, audio_profile=None):
+        self.url = url
+        self.output_dir = output_dir
+        self.download_format = download_format  # 'mp3' o 'mp4'
+        self.convert = convert  # Convertir a MP3 (solo formato mp3)
+        # "Audio rápido": perfil de pipeline.DEVICE_PROFILES; si el dispositivo
+        # reproduce el códec original se cambia de contenedor sin recodificar
+        self.audio_profile = audio_profile
+        self.single_video = single_video
+        # Playlists: elementos en paralelo (1 = una sola llamada secuencial)
+        self.playlist_workers = playlist_workers
+        # Posición dentro de la playlist cuando el trabajo es un elemento de ella
+        self.playlist_index = playlist_index
+        # Identificador estable en el diario de trabajos (ver journal.py)
+        self.journal_id = None
+
+        # Estado del trabajo (lo actualiza la cola de descargas)
+        self.id = None
+        self.status = "pending"
+        self.percent = 0.0
+        self.downloaded_bytes = 0
+        self.total_bytes = 0
+        self.message = ""
+        self.result = None
+
+    def __repr__(self):
+        return f"DownloadJob({self.url!r}, format={self.download_format!r})"
+
+
+class DownloadEngine:
+    """Ejecuta trabajos de descarga con yt-dlp sin depender de la interfaz"""
+
+    def __init__(self, verbose=False, transcoder=None, tuner=None, archive=None,
+                 media_cache=None, info_cache=None, stream_transcode=False):
+        """
+        Args:
+            verbose: mostrar la salida de yt-dlp
+            transcoder: TranscodeStage opcional; si se indica, la conversión
+                a MP3 se hace fuera del hilo de descarga (ver pipeline.py)
+            tuner: AdaptiveTuner opcional que ajusta fragmentos y tamaño de
+                bloque según la velocidad medida (ver tuning.py)
+            archive: DownloadArchive opcional; los videos ya descargados en
+                el mismo formato se omiten sin acceder a la red (ver archive.py)
+            media_cache: MediaCache opcional; los flujos ya bajados (p. ej. el
+                audio de un MP3 al pedir luego el MP4) no se vuelven a
+                descargar y los pedidos iguales en curso se unifican
+                (ver media_cache.py)
+            info_cache: InfoCache opcional; reintentos y cambios de formato
+                reutilizan la información ya extraída (ver info_cache.py)
+            stream_transcode: en MP3, pasar el audio a FFmpeg por una tubería
+                mientras se descarga (solo se escribe el MP3). Se usa si el
+                formato elegido lo permite y no está ya en la caché de medios
+        """
+        self.verbose = verbose
+        self.transcoder = transcoder
+        self.tuner = tuner
+        self.archive = archive
+        self.media_cache = media_cache
+        self.info_cache = info_cache
+        self.stream_transcode = stream_transcode
+        self._lock = threading.Lock()
+        self._producing = {}  # archivo de salida -> Future con el resultado
+        self._ffmpeg_resolved = False
+        self._ffmpeg_path = None
+        self._ffmpeg_location = None
+
+    # ----------------------------------------------------------
+    # FFmpeg
+    # ----------------------------------------------------------
+    def resolve_ffmpeg(self, refresh=False):
+        """
+        Localiza FFmpeg una sola vez por motor (usa la caché en disco de
+        ffmpeg_utils; refresh=True fuerza una nueva búsqueda).
+
+        Returns:
+            str con la ruta de FFmpeg o None si no está disponible
+        """
+        if refresh or not self._ffmpeg_resolved:
+            with tracer.span("ffmpeg.resolve", refresh=refresh):
+                tools = get_ffmpeg_tools(refresh=refresh)
+            self._ffmpeg_path = tools["ffmpeg"] if tools else None
+            self._ffmpeg_location = get_ffmpeg_location(tools) if tools else None
+            self._ffmpeg_resolved = True
+        return self._ffmpeg_path
+
+    # ----------------------------------------------------------
+    # Opciones de yt-dlp
+    # ----------------------------------------------------------
+    def build_options(self, job, progress_hook=None, postprocess=True):
+        """
+        Construye el diccionario ydl_opts para un trabajo.
+
+        Args:
+            job: DownloadJob
+            progress_hook: callable(d) con el diccionario de progreso de yt-dlp
+            postprocess: incluir la conversión a MP3; False para convertir
+                después en la etapa de conversión
+
+        Returns:
+            dict con las opciones de yt-dlp
+        """
+        ydl_opts = {
+            'outtmpl': os.path.join(job.output_dir, '%(title)s.%(ext)s'),
+            'progress_hooks': [progress_hook] if progress_hook else [],
+            'noplaylist': job.single_video,
+            'extract_flat': False,
+            'writeinfojson': False,
+            'writedescription': False,
+            'writethumbnail': False,
+            'writesubtitles': False,
+            'ignoreerrors': True,
+        }
+
+        # Fragmentos simultáneos y tamaño de bloque ajustados por host
+        if self.tuner is not None:
+            ydl_opts.update(self.tuner.options_for(job.url))
+
+        if not job.single_video:
+            ydl_opts['outtmpl'] = os.path.join(
+                job.output_dir, '%(playlist_index)02d - %(title)s.%(ext)s'
+            )
+            ydl_opts['playlistend'] = PLAYLIST_LIMIT
+        elif job.playlist_index is not None:
+            # Elemento de playlist descargado por separado: mantener el prefijo
+            ydl_opts['outtmpl'] = os.path.join(
+                job.output_dir, f'{job.playlist_index:02d} - %(title)s.%(ext)s'
+            )
+
+        if job.download_format == 'mp4':
+            # Configuración para descargar VIDEO (MP4)
+            ydl_opts['format'] = 'bestvideo[ext=mp4]+bestaudio[ext=m4a]/best[ext=mp4]/best'
+
+            # Para MP4, usar ffmpeg para combinar video y audio si es necesario
+            if self.resolve_ffmpeg():
+                ydl_opts['ffmpeg_location'] = self._ffmpeg_location
+            else:
+                # Si no hay FFmpeg, descargar el mejor formato único disponible
+                ydl_opts['format'] = 'best[ext=mp4]/best'
+        else:
+            # Configuración para descargar AUDIO (MP3)
+            ydl_opts['format'] = 'bestaudio/best'
+
+            if job.convert and self.resolve_ffmpeg():
+                ydl_opts['ffmpeg_location'] = self._ffmpeg_location
+
+                # Configurar postprocessor para MP3 ("audio rápido": ver
+                # _fast_audio_postprocessor, que decide por el códec)
+                if postprocess and not job.audio_profile:
+                    ydl_opts['postprocessors'] = [{
+                        'key': 'FFmpegExtractAudio',
+                        'preferredcodec': 'mp3',
+                        'preferredquality': MP3_QUALITY,
+                    }]
+                ydl_opts['format'] = 'bestaudio[ext=m4a]/bestaudio/best'
+                if 'opus' in DEVICE_PROFILES.get(job.audio_profile, ()):
+                    # El dispositivo reproduce Opus: el mejor audio sin preferir m4a
+                    ydl_opts['format'] = 'bestaudio/best'
+
+        return ydl_opts
+
+    def _fast_audio_postprocessor(self, ytdlp, job):
+        """
+        Postprocesador de yt-dlp para "audio rápido" dentro de la descarga.
+
+        Usa pipeline.convert_audio, igual que la etapa de conversión: decide
+        por el códec real (ffmpeg) y no por la extensión, así un WebM con
+        Vorbis no se recodifica a Opus. Si el códec no se admite, MP3.
+        """
+        ffmpeg_path = self.resolve_ffmpeg()
+
+        class FastAudio(ytdlp.postprocessor.PostProcessor):
+            def run(self, info):
+                source = info['filepath']
+                final = convert_audio(ffmpeg_path, source, os.path.splitext(source)[0] + '.mp3',
+                                      MP3_QUALITY, job.audio_profile)
+                info['filepath'] = final
+                info['ext'] = os.path.splitext(final)[1][1:]
+                return [], info
+
+        return FastAudio()
+
+    # ----------------------------------------------------------
+    # Ejecución
+    # ----------------------------------------------------------
+    def run(self, job, progress_callback=None, status_callback=None):
+        """
+        Ejecuta un trabajo de descarga.
+
+        Args:
+            job: DownloadJob
+            progress_callback: callable(job, event) con event = dict con
+                'status', 'filename', 'downloaded_bytes', 'total_bytes',
+                'percent', 'speed' y 'eta'
+            status_callback: callable(job, message: str) para mensajes de estado
+
+        Returns:
+            dict con 'success', 'url', 'title', 'duration', 'uploader',
+            'format', 'errors', 'error', 'error_kind' y 'metrics' (tiempos de
+            cada fase, bytes y reintentos; ver metrics.JobMeter). Con etapa de
+            conversión puede incluir 'transcode_future': llamar a finish()
+            para esperar el MP3. Si el video ya estaba en el archivo de
+            descargas, 'skipped' es True y 'output_path' indica el archivo
+        """
+        meter = JobMeter()
+        spans = HookSpans()
+        with tracer.span("job", url=job.url, format=job.download_format,
+                         single_video=job.single_video) as span:
+            try:
+                result = self._run(job, progress_callback, status_callback, meter, spans)
+            finally:
+                spans.close()
+            if span is not None:
+                span.set(success=result["success"], skipped=bool(result.get("skipped")),
+                         error_kind=result.get("error_kind"))
+                if not result["success"]:
+                    span.error = result.get("error")
+        # Una URL que no era playlist ya trae las medidas de su propio run()
+        result.setdefault("metrics", meter.as_dict())
+        return result
+
+    def _run(self, job, progress_callback, status_callback, meter, spans):
+        def status(message):
+            if status_callback:
+                status_callback(job, message)
+
+        def hook(d):
+            meter.on_progress(d)
+            spans.on_progress(d)
+            if self.tuner is not None and d.get('status') == 'finished':
+                self.tuner.record(
+                    job.url,
+                    d.get('total_bytes') or d.get('downloaded_bytes'),
+                    d.get('elapsed'),
+                    (d.get('info_dict') or {}).get('extractor_key'),
+                )
+            if progress_callback:
+                progress_callback(job, self._progress_event(d))
+
+        result = {
+            "success": False,
+            "url": job.url,
+            "format": job.download_format,
+            "output_dir": job.output_dir,
+        }
+
+        if self.archive is not None and job.single_video:
+            with tracer.span("archive.lookup"):
+                entry = self.archive.lookup(job.url, self._archive_format(job))
+            if entry:
+                status(f"⏭️ Ya descargado: {entry['title'] or job.url}")
+                result.update({
+                    "success": True,
+                    "skipped": True,
+                    "title": entry["title"] or 'Desconocido',
+                    "output_path": entry["output_path"],
+                    "errors": [],
+                })
+                return result
+
+        if job.download_format == 'mp3' and job.convert and not self.resolve_ffmpeg():
+            result["error"] = "FFmpeg no encontrado"
+            result["error_kind"] = "ffmpeg"
+            return result
+
+        if not job.single_video:
+            status(f"⚠️ Modo playlist: Se descargarán máximo {PLAYLIST_LIMIT} videos")
+            if job.playlist_workers > 1:
+                return self.run_playlist(job, progress_callback, status_callback)
+
+        # Con etapa de conversión, el hilo de descarga solo descarga
+        deferred = (self.transcoder is not None and job.download_format == 'mp3'
+                    and job.convert and job.single_video)
+        # Con caché de medios o streaming, la conversión y la unión se hacen
+        # fuera de yt-dlp
+        staged = ((self.media_cache is not None or self.stream_transcode)
+                  and job.single_video)
+
+        try:
+            ydl_opts = self.build_options(job, hook, postprocess=not (deferred or staged))
+            ydl_opts['postprocessor_hooks'] = [meter.on_postprocess, spans.on_postprocess]
+            logger = _YdlLogger(self.verbose, on_retry=meter.count_retry)
+            ydl_opts['logger'] = logger
+
+            if self.verbose:
+                print(f"DEBUG: FFmpeg path: {self._ffmpeg_path}")
+                print(f"DEBUG: ffmpeg_location: {ydl_opts.get('ffmpeg_location', 'No configurado')}")
+
+            if staged:
+                return self._run_staged(job, ydl_opts, result, status, hook, meter, spans)
+
+            ytdlp = load_ytdlp()
+            with ytdlp.YoutubeDL(ydl_opts) as ydl:
+                if (job.audio_profile and not deferred and job.download_format == 'mp3'
+                        and job.convert and self.resolve_ffmpeg()):
+                    ydl.add_post_processor(self._fast_audio_postprocessor(ytdlp, job),
+                                           when='post_process')
+                if job.download_format == 'mp4':
+                    status("📥 Descargando video...")
+                else:
+                    status("📥 Descargando audio...")
+
+                if job.single_video:
+                    info = self._extract_info(ydl, job.url, download=True)
+                else:
+                    with tracer.span("ytdlp.extract_info", download=True, playlist=True):
+                        info = ydl.extract_info(job.url, download=True)
+
+            # Con ignoreerrors, yt-dlp devuelve None (o un resultado parcial)
+            # en lugar de lanzar excepción
+            result["errors"] = list(logger.errors)
+            if not info or (job.single_video and logger.errors):
+                self._forget_info(job.url)
+                error_msg = logger.errors[-1] if logger.errors else "No se obtuvo información del video"
+                result["error"] = error_msg
+                result["error_kind"] = classify_error(error_msg)
+                return result
+
+            self._describe(job, info, result)
+
+            if deferred:
+                downloads = info.get('requested_downloads') or [info]
+                self._submit_transcode(downloads[0].get('filepath'), result, job.audio_profile)
+            else:
+                self._archive_downloads(job, info, result)
+
+        except Exception as e:
+            result["error"] = str(e)
+            result["error_kind"] = classify_error(str(e))
+
+        return result
+
+    def _describe(self, job, info, result):
+        """Completa el resultado correcto con los datos del video"""
+        result["title"] = info.get('title', 'Desconocido')
+        result["duration"] = info.get('duration', 0)
+        result["uploader"] = info.get('uploader', 'Desconocido')
+        result["success"] = True
+
+        if job.single_video:
+            result["extractor"] = info.get('extractor_key')
+            result["video_id"] = info.get('id')
+            result["archive_format"] = self._archive_format(job)
+
+    # ----------------------------------------------------------
+    # Caché de información
+    # ----------------------------------------------------------
+    def _extract_info(self, ydl, url, download=False):
+        """
+        extract_info() de un video usando la caché de información.
+
+        Se guarda el resultado del extractor sin procesar, así la selección de
+        formato (MP3 o MP4) se vuelve a hacer en cada trabajo.
+        """
+        if self.info_cache is None:
+            with tracer.span("ytdlp.extract_info", download=download):
+                return ydl.extract_info(url, download=download)
+
+        ie_result = self.info_cache.get(url)
+        cached = ie_result is not None
+        if not cached:
+            with tracer.span("ytdlp.extract_info", download=False):
+                ie_result = ydl.extract_info(url, download=False, process=False)
+            if not ie_result:
+                return ie_result
+            # Sin claves privadas: '__post_extractor' y similares no se pueden copiar
+            ie_result = ydl.sanitize_info(ie_result, remove_private_keys=True)
+            self.info_cache.put(url, ie_result)
+        with tracer.span("ytdlp.process_ie_result", download=download, cached=cached):
+            return ydl.process_ie_result(ie_result, download=download)
+
+    def _forget_info(self, url):
+        """Descarta la información guardada (las URLs pueden no valer ya)"""
+        if self.info_cache is not None:
+            self.info_cache.invalidate(url)
+
+    # ----------------------------------------------------------
+    # Descarga por etapas (caché de medios y streaming)
+    # ----------------------------------------------------------
+    def _run_staged(self, job, ydl_opts, result, status, hook, meter, spans):
+        """
+        Descarga un video separando extracción, descarga y conversión.
+
+        Obtiene la información (sin descargar) y, según el caso, convierte a
+        MP3 en streaming, o toma cada flujo elegido de la caché (o lo
+        descarga una sola vez), lo entrega en la carpeta de destino y
+        convierte a MP3 si hace falta.
+        """
+        logger = ydl_opts['logger']
+        with load_ytdlp().YoutubeDL(ydl_opts) as ydl:
+            status("🔍 Obteniendo información...")
+            info = self._extract_info(ydl, job.url, download=False)
+            meter.extraction_done()
+            result["errors"] = list(logger.errors)
+            if not info or logger.errors:
+                self._forget_info(job.url)
+                error_msg = logger.errors[-1] if logger.errors else "No se obtuvo información del video"
+                result["error"] = error_msg
+                result["error_kind"] = classify_error(error_msg)
+                return result
+
+            target_path = ydl.prepare_filename(info)
+            shared = self._claim_output(target_path)
+            if shared is not None:
+                # El mismo archivo ya se está generando en otro hilo
+                status("⏳ Esperando la misma descarga en curso...")
+                return dict(shared.result(), coalesced=True)
+
+            try:
+                self._describe(job, info, result)
+                mp3_path = os.path.splitext(target_path)[0] + '.mp3'
+
+                if self._can_stream(job, info):
+                    with tracer.span("stream_to_mp3"):
+                        result["output_path"] = self._stream_to_mp3(ydl, info, mp3_path,
+                                                                    status, hook)
+                    self._archive_record(result, result["output_path"])
+                    return result
+
+                self._fetch_streams(ydl, info, target_path, status, hook, meter)
+
+                if job.download_format == 'mp3' and job.convert:
+                    if self.transcoder is not None:
+                        self._submit_transcode(target_path, result, job.audio_profile)
+                    else:
+                        status("🎵 Convirtiendo audio...")
+                        with meter.postprocessing(), tracer.span("convert", file=target_path):
+                            result["output_path"] = convert_audio(
+                                self.resolve_ffmpeg(), target_path, mp3_path, MP3_QUALITY,
+                                job.audio_profile,
+                            )
+                        self._archive_record(result, result["output_path"])
+                else:
+                    result["output_path"] = target_path
+                    self._archive_record(result, target_path)
+            except Exception as e:
+                self._forget_info(job.url)
+                result["success"] = False
+                result["errors"] = list(logger.errors)
+                result["error"] = str(e)
+                result["error_kind"] = classify_error(str(e))
+            finally:
+                self._release_output(target_path, result)
+        return result
+
+    def _fetch_streams(self, ydl, info, target_path, status, hook, meter):
+        """Obtiene los flujos del formato elegido y genera target_path"""
+        formats = info.get('requested_formats') or [info]
+        logger = ydl.params['logger']
+        paths = []
+        downloaded = False
+
+        for fmt in formats:
+            def download(temp_path, fmt=fmt):
+                # Misma preparación que yt-dlp hace para cada formato pedido
+                format_info = dict(info)
+                format_info.pop('requested_formats', None)
+                format_info.update(fmt)
+                success, _ = ydl.dl(temp_path, format_info)
+                if not success:
+                    raise RuntimeError(logger.errors[-1] if logger.errors
+                                       else f"Error descargando el formato {fmt.get('format_id')}")
+
+            if self.media_cache is None:
+                # Sin caché: cada flujo va directo a la carpeta de destino
+                path = target_path
+                if len(formats) > 1:
+                    base, _ = os.path.splitext(target_path)
+                    path = f"{base}.f{fmt.get('format_id')}.{fmt.get('ext')}"
+                download(path)
+                downloaded = True
+                paths.append((path, fmt))
+                continue
+
+            key = MediaCache.key(info.get('extractor_key'), info.get('id'), fmt.get('format_id'))
+            with tracer.span("media_cache.fetch", format_id=fmt.get('format_id')) as span:
+                path, from_cache = self.media_cache.fetch(key, fmt.get('ext'), download)
+                if span is not None:
+                    span.set(from_cache=from_cache)
+            if from_cache:
+                status("♻️ Usando copia en caché...")
+            downloaded = downloaded or not from_cache
+            paths.append((path, fmt))
+
+        if len(paths) == 1:
+            if paths[0][0] != target_path:
+                link_or_copy(paths[0][0], target_path)
+        else:
+            status("🔗 Uniendo video y audio...")
+            with meter.postprocessing(), tracer.span("merge", streams=len(paths)):
+                merge_streams(self.resolve_ffmpeg(), paths, target_path)
+            if self.media_cache is None:
+                for path, _ in paths:
+                    os.remove(path)
+
+        if not downloaded:
+            # Sin descarga no hubo eventos de progreso: marcar como terminado
+            hook({'status': 'finished', 'filename': target_path,
+                  'total_bytes': os.path.getsize(target_path)})
+
+    def _can_stream(self, job, info):
+        """El trabajo se puede convertir en streaming (ver stream_transcode)"""
+        if not (self.stream_transcode and job.download_format == 'mp3' and job.convert):
+            return False
+        if job.audio_profile:
+            # Con "audio rápido" no se codifica: copiar el contenedor ya es inmediato
+            return False
+        if info.get('requested_formats') or info.get('protocol') not in ('http', 'https'):
+            return False
+        if not (info.get('container') in STREAMABLE_CONTAINERS
+                or info.get('ext') in STREAMABLE_EXTS):
+            return False
+        if self.media_cache is not None:
+            # Si el flujo ya está en la caché, convertir desde ahí sin red
+            key = MediaCache.key(info.get('extractor_key'), info.get('id'), info.get('format_id'))
+            return self.media_cache.get(key) is None
+        return True
+
+    def _stream_to_mp3(self, ydl, info, target_path, status, hook):
+        """
+        Descarga el audio y lo pasa a FFmpeg por una tubería a la vez.
+
+        Solo se escribe el MP3; al llegar el último byte la conversión está
+        prácticamente terminada.
+
+        Returns:
+            str con la ruta del MP3
+        """
+        from yt_dlp.networking import Request
+
+        status("🎵 Descargando y convirtiendo a MP3...")
+        response = ydl.urlopen(Request(info['url'], headers=info.get('http_headers') or {}))
+        total = int(response.headers.get('Content-Length') or 0) or info.get('filesize') or 0
+        block_size = ydl.params.get('buffersize') or STREAM_BLOCK_SIZE
+        start = time.monotonic()
+        state = {"downloaded": 0, "reported": 0.0}
+
+        def blocks():
+            while True:
+                block = response.read(block_size)
+                if not block:
+                    break
+                state["downloaded"] += len(block)
+                now = time.monotonic()
+                if now - state["reported"] >= 0.25:
+                    state["reported"] = now
+                    elapsed = now - start
+                    speed = state["downloaded"] / elapsed if elapsed else None
+                    hook({
+                        'status': 'downloading', 'filename': target_path,
+                        'downloaded_bytes': state["downloaded"], 'total_bytes': total,
+                        'speed': speed,
+                        'eta': (total - state["downloaded"]) / speed if speed and total else None,
+                    })
+                yield block
+            if total and state["downloaded"] < total:
+                raise RuntimeError(f"Descarga incompleta: {state['downloaded']} de {total} bytes")
+
+        try:
+            stream_transcode_to_mp3(self.resolve_ffmpeg(), blocks(), target_path, MP3_QUALITY)
+        finally:
+            response.close()
+
+        hook({'status': 'finished', 'filename': target_path, 'info_dict': info,
+              'downloaded_bytes': state["downloaded"], 'total_bytes': state["downloaded"],
+              'elapsed': time.monotonic() - start})
+        return target_path
+
+    def _claim_output(self, target_path):
+        """
+        Reserva un archivo de salida para este hilo.
+
+        Returns:
+            None si se reservó; si otro hilo ya lo está generando, el Future
+            con su resultado
+        """
+        with self._lock:
+            pending = self._producing.get(target_path)
+            if pending is not None:
+                return pending
+            self._producing[target_path] = Future()
+            return None
+
+    def _release_output(self, target_path, result):
+        """
+        Libera el archivo de salida y comparte el resultado con quien espere.
+
+        Con una conversión pendiente, la reserva se mantiene hasta que
+        termine: quien espera recibe el resultado final (MP3 o error), sin
+        'transcode_future' ni medidas, así el archivo de descargas y las
+        métricas se registran una sola vez, en el trabajo que lo generó.
+        """
+        shared = {key: value for key, value in result.items() if key not in PRODUCER_ONLY_KEYS}
+        future = result.get("transcode_future")
+        if future is None:
+            self._publish_output(target_path, shared)
+            return
+
+        def on_converted(done):
+            try:
+                shared["output_path"] = done.result()
+            except Exception as e:
+                shared.update(success=False, error=str(e), error_kind=classify_error(str(e)))
+            self._publish_output(target_path, shared)
+
+        future.add_done_callback(on_converted)
+
+    def _publish_output(self, target_path, shared):
+        with self._lock:
+            pending = self._producing.pop(target_path)
+        pending.set_result(shared)
+
+    # ----------------------------------------------------------
+    # Etapa de conversión
+    # ----------------------------------------------------------
+    def _submit_transcode(self, source_path, result, profile=None):
+        """Entrega el archivo descargado a la etapa de conversión"""
+        if not source_path or not os.path.exists(source_path):
+            return
+
+        target_path = os.path.splitext(source_path)[0] + '.mp3'
+        if source_path == target_path:
+            result["output_path"] = target_path
+            return
+
+        future, blocked = self.transcoder.submit(
+            self.resolve_ffmpeg(), source_path, target_path, MP3_QUALITY, profile
+        )
+        result["transcode_future"] = future
+        result["handoff_wait"] = blocked
+        result["transcode_submitted"] = time.monotonic()
+
+    def finish(self, result):
+        """
+        Espera la conversión pendiente de un resultado (si la hay).
+
+        Returns:
+            el mismo dict, con 'output_path' o con el error de conversión
+        """
+        future = result.pop("transcode_future", None)
+        if future is None:
+            return result
+        try:
+            result["output_path"] = future.result()
+        except Exception as e:
+            self._add_transcode_time(result)
+            result["success"] = False
+            result["error"] = str(e)
+            result["error_kind"] = classify_error(str(e))
+            return result
+        self._add_transcode_time(result)
+        self._archive_record(result, result["output_path"])
+        return result
+
+    @staticmethod
+    def _add_transcode_time(result):
+        """Suma a las medidas el tiempo en la etapa de conversión (cola incluida)"""
+        submitted = result.pop("transcode_submitted", None)
+        metrics = result.get("metrics")
+        if submitted is None or metrics is None:
+            return
+        elapsed = time.monotonic() - submitted
+        metrics["postprocess_seconds"] = round(metrics["postprocess_seconds"] + elapsed, 3)
+        metrics["job_seconds"] = round(metrics["job_seconds"] + elapsed, 3)
+
+    # ----------------------------------------------------------
+    # Archivo de descargas
+    # ----------------------------------------------------------
+    @staticmethod
+    def _archive_format(job):
+        """Formato con el que se archiva ('m4a' etc. si no se convierte a MP3)"""
+        if job.download_format == 'mp3' and not job.convert:
+            return 'audio'
+        if job.download_format == 'mp3' and job.audio_profile:
+            return f'rapido-{job.audio_profile}'
+        return job.download_format
+
+    def _archive_record(self, result, output_path):
+        """Registra un resultado correcto en el archivo de descargas"""
+        if self.archive is None or not result.get("video_id"):
+            return
+        try:
+            self.archive.record(
+                result.get("extractor"), result["video_id"], result["url"],
+                result["archive_format"], output_path, result.get("title"),
+            )
+        except Exception as e:
+            print(f"Error guardando en el archivo de descargas: {e}")
+
+    def _archive_downloads(self, job, info, result):
+        """Archiva lo descargado sin etapa de conversión (video o playlist secuencial)"""
+        if self.archive is None:
+            return
+        if job.single_video:
+            downloads = info.get('requested_downloads') or [info]
+            output_path = downloads[0].get('filepath')
+            result["output_path"] = output_path
+            self._archive_record(result, output_path)
+            return
+
+        for entry in info.get('entries') or []:
+            if not entry or not entry.get('requested_downloads'):
+                continue
+            self._archive_record({
+                "extractor": entry.get('extractor_key'),
+                "video_id": entry.get('id'),
+                "url": entry.get('webpage_url') or entry.get('original_url'),
+                "archive_format": self._archive_format(job),
+                "title": entry.get('title'),
+            }, entry['requested_downloads'][0].get('filepath'))
+
+    # ----------------------------------------------------------
+    # Playlists en paralelo
+    # ----------------------------------------------------------
+    def list_playlist_entries(self, job):
+        """
+        Enumera los elementos de una playlist sin descargarlos.
+
+        Returns:
+            (info, entries) con entries = lista de (indice, url, titulo);
+            entries es None si la URL no es una playlist
+        """
+        ydl_opts = {
+            'extract_flat': 'in_playlist',
+            'playlistend': PLAYLIST_LIMIT,
+            'noplaylist': False,
+            'ignoreerrors': True,
+            'logger': _YdlLogger(self.verbose),
+        }
+        with load_ytdlp().YoutubeDL(ydl_opts) as ydl:
+            info = ydl.extract_info(job.url, download=False)
+
+        if not info or info.get('_type') not in ('playlist', 'multi_video'):
+            return info, None
+
+        entries = []
+        for position, entry in enumerate(info.get('entries') or [], start=1):
+            if not entry:
+                continue
+            url = entry.get('url') or entry.get('webpage_url')
+            if not url:
+                continue
+            index = entry.get('playlist_index') or position
+            entries.append((index, url, entry.get('title')))
+        return info, entries
+
+    def run_playlist(self, job, progress_callback=None, status_callback=None):
+        """
+        Descarga una playlist repartiendo sus elementos en un grupo de hilos.
+
+        Cada elemento es un DownloadJob independiente: si uno falla, el resto
+        continúa. El progreso se reporta como el promedio de los elementos.
+
+        Returns:
+            dict como run() con además 'entries' (resultado de cada
+            elemento con su 'index') y 'failed_entries'
+        """
+        def status(message):
+            if status_callback:
+                status_callback(job, message)
+
+        result = {
+            "success": False,
+            "url": job.url,
+            "format": job.download_format,
+            "output_dir": job.output_dir,
+        }
+
+        status("🔍 Obteniendo elementos de la playlist...")
+        try:
+            with tracer.span("playlist.list"):
+                info, entries = self.list_playlist_entries(job)
+        except Exception as e:
+            result["error"] = str(e)
+            result["error_kind"] = classify_error(str(e))
+            return result
+
+        if entries is None:
+            # No es una playlist: descargar como video individual
+            job.single_video = True
+            return self.run(job, progress_callback, status_callback)
+
+        if not entries:
+            result["error"] = "La playlist está vacía o no se pudo leer"
+            result["error_kind"] = "extraction"
+            return result
+
+        lock = threading.Lock()
+        percents = {index: 0.0 for index, _, _ in entries}
+        counters = {"done": 0}
+        total = len(entries)
+
+        def on_progress(entry_job, event):
+            with lock:
+                percents[entry_job.playlist_index] = event['percent']
+                aggregate = sum(percents.values()) / total
+            if progress_callback:
+                progress_callback(job, {
+                    'status': 'downloading',
+                    'filename': event.get('filename', ''),
+                    'downloaded_bytes': event.get('downloaded_bytes', 0),
+                    'total_bytes': event.get('total_bytes', 0),
+                    'percent': aggregate,
+                    'speed': event.get('speed'),
+                    'eta': None,
+                })
+
+        # Los elementos corren en otros hilos: colgar sus spans del de la playlist
+        parent_span = tracer.current()
+
+        def run_entry(entry):
+            index, url, _ = entry
+            entry_job = DownloadJob(url, job.output_dir, job.download_format,
+                                    job.convert, single_video=True,
+                                    playlist_index=index, audio_profile=job.audio_profile)
+            with tracer.span("playlist.entry", parent=parent_span, index=index):
+                entry_result = self.run(entry_job, progress_callback=on_progress)
+            entry_result["index"] = index
+            with lock:
+                percents[index] = 100.0
+                counters["done"] += 1
+                done = counters["done"]
+            status(f"📋 Playlist: {done}/{total} elementos procesados")
+            return entry_result
+
+        status(f"📋 Playlist: {total} elementos, {min(job.playlist_workers, total)} en paralelo")
+        with ThreadPoolExecutor(max_workers=min(job.playlist_workers, total)) as pool:
+            entry_results = list(pool.map(run_entry, entries))
+
+        # Esperar las conversiones de los elementos (se solapan con las descargas)
+        if any("transcode_future" in r for r in entry_results):
+            status("🎵 Terminando conversiones...")
+        entry_results = [self.finish(r) for r in entry_results]
+
+        failed = [r for r in entry_results if not r["success"]]
+        result["title"] = info.get('title', 'Playlist')
+        result["uploader"] = info.get('uploader', 'Desconocido')
+        result["duration"] = sum(r.get('duration') or 0 for r in entry_results)
+        result["entries"] = entry_results
+        result["failed_entries"] = len(failed)
+        result["errors"] = [f"#{r['index']:02d}: {r.get('error', '')}" for r in failed]
+        if failed:
+            result["error"] = f"{len(failed)} de {total} elementos fallaron: {failed[0].get('error', '')}"
+            result["error_kind"] = failed[0].get("error_kind", "other")
+        else:
+            result["success"] = True
+        return result
+
+    @staticmethod
+    def _progress_event(d):
+        """Convierte el diccionario de progreso de yt-dlp en un evento numérico"""
+        downloaded = d.get('downloaded_bytes') or 0
+        total = d.get('total_bytes') or d.get('total_bytes_estimate') or 0
+        percent = (downloaded * 100.0 / total) if total else 0.0
+        if d.get('status') == 'finished':
+            percent = 100.0
+        return {
+            'status': d.get('status'),
+            'filename': d.get('filename', ''),
+            'downloaded_bytes': downloaded,
+            'total_bytes': total,
+            'percent': min(100.0, percent),
+            'speed': d.get('speed'),
+            'eta': d.get('eta'),
+        }
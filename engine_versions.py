@@ -0,0 +1,484 @@
+"""
+Versiones de yt-dlp
+===================
+Varias versiones de yt-dlp instaladas una al lado de otra en la carpeta de
+datos (engines/VERSIÓN/yt_dlp), en lugar de `pip install --upgrade` sobre
+la instalada.
+
+- Preparar (stage) una versión descarga su wheel de PyPI, comprueba el
+  SHA-256 y extrae solo el paquete yt_dlp en segundo plano; no toca la que
+  está en uso.
+- Activarla es instantáneo: las descargas nuevas la usan y las que están en
+  marcha terminan con la anterior.
+- Si la nueva no se puede importar, o sus primeras descargas fallan todas
+  por errores de extracción, se vuelve sola a la anterior (sigue en disco).
+
+Python no puede tener cargadas dos versiones de yt_dlp a la vez (el paquete
+se importa a sí mismo por nombre absoluto), así que el cambio se hace en
+cuanto no queda ninguna descarga dentro de yt-dlp: las que empiezan
+mientras tanto esperan a ese momento.
+
+USO:
+  python -m engine_versions                 # Versiones instaladas y activa
+  python -m engine_versions stage [VERSIÓN] # Preparar (por defecto la última)
+  python -m engine_versions activate VERSIÓN
+  python -m engine_versions rollback
+"""
+
+import argparse
+import hashlib
+import importlib
+import os
+import shutil
+import sys
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+from app_data import get_data_dir, load_json, save_json
+
+
+ENGINES_DIR = "engines"
+STATE_FILE = "engines.json"
+
+# Versiones que se conservan en disco además de la activa y la anterior
+KEEP_VERSIONS = 2
+
+# Descargas seguidas fallidas por extracción tras activar una versión para
+# volver a la anterior
+ROLLBACK_WINDOW = 3
+
+PYPI_RELEASE_URL = "https://pypi.org/pypi/yt-dlp/{version}/json"
+
+# Versión "del sistema": la instalada con pip (o incluida en el .exe)
+SYSTEM = None
+
+
+def _version_key(version):
+    try:
+        return [int(part) for part in version.split(".")]
+    except ValueError:
+        return [0]
+
+
+def _is_ytdlp_module(name):
+    return name == "yt_dlp" or name.startswith("yt_dlp.")
+
+
+# ==============================================================
+# Cambio en caliente dentro del proceso
+# ==============================================================
+class EngineSwitch:
+    """
+    Controla qué copia de yt_dlp está importada y la cambia sin cortar
+    descargas: cada descarga se ejecuta dentro de job(), y un cambio pedido
+    con request() se aplica cuando no queda ninguna en marcha.
+    """
+
+    def __init__(self):
+        self.path = SYSTEM  # Carpeta de la versión importada (en sys.path)
+        self.version = None  # Versión importada (se anota dentro de job())
+        self.error = None  # Motivo del último cambio fallido
+        self._cond = threading.Condition()
+        self._running = 0
+        self._pending = None  # (carpeta, on_failure, probation)
+        self._probation = None  # {'path', 'failures', 'on_failure'}
+        self._installed = False
+
+    def install(self, path):
+        """
+        Fija la versión al arrancar. Si yt_dlp aún no se importó basta con
+        ponerla en sys.path; si ya se importó, se cambia como cualquier otra.
+        """
+        with self._cond:
+            if self._installed:
+                return
+            self._installed = True
+            if path is SYSTEM:
+                return
+            if "yt_dlp" not in sys.modules:
+                sys.path.insert(0, path)
+                self.path = path
+                return
+        self.request(path)
+
+    @contextmanager
+    def job(self):
+        """
+        Bloque de una descarga: espera si hay un cambio pendiente y hay
+        otras descargas terminando con la versión anterior. Todo uso de
+        load_ytdlp() debe ir dentro: fuera, un cambio puede estar vaciando
+        sys.modules a la vez.
+
+        Yields:
+            carpeta de la versión con la que corre la descarga
+        """
+        with self._cond:
+            while self._pending is not None and self._running:
+                self._cond.wait()
+            if self._pending is not None:
+                self._swap_locked()
+            self._running += 1
+            path = self.path
+        try:
+            yield path
+        finally:
+            with self._cond:
+                self.version = loaded_version() or self.version
+                self._running -= 1
+                if not self._running and self._pending is not None:
+                    self._swap_locked()
+                self._cond.notify_all()
+
+    def request(self, path, on_failure=None, probation=False):
+        """
+        Pide pasar a otra versión (se aplica ya si no hay descargas).
+
+        Args:
+            path: carpeta de la versión (SYSTEM = la instalada con pip)
+            on_failure: callable(motivo) si no se puede importar o, con
+                probation, si sus primeras descargas fallan
+            probation: vigilar las primeras descargas con la versión nueva
+
+        Returns:
+            True/False si se aplicó (o falló) ya, None si queda pendiente
+        """
+        with self._cond:
+            self._pending = (path, on_failure, probation)
+            applied = None if self._running else self._swap_locked()
+            self._cond.notify_all()
+        return applied
+
+    def record(self, path, result):
+        """Anota el resultado de una descarga hecha con la versión path"""
+        on_failure = None
+        with self._cond:
+            probation = self._probation
+            if probation is None or probation["path"] != path or result.get("skipped"):
+                return
+            if result.get("success"):
+                self._probation = None  # La versión funciona
+            elif result.get("error_kind") == "extraction":
+                probation["failures"] += 1
+                if probation["failures"] >= ROLLBACK_WINDOW:
+                    self._probation = None
+                    on_failure = probation["on_failure"]
+        if on_failure:
+            on_failure(f"{ROLLBACK_WINDOW} descargas seguidas fallaron al extraer")
+
+    def _swap_locked(self):
+        path, on_failure, probation = self._pending
+        self._pending = None
+        if path == self.path and "yt_dlp" in sys.modules:
+            return True
+
+        old_path = self.path
+        old_modules = {name: module for name, module in sys.modules.items()
+                       if _is_ytdlp_module(name)}
+        for name in old_modules:
+            del sys.modules[name]
+        if old_path in sys.path:
+            sys.path.remove(old_path)
+        if path is not SYSTEM:
+            sys.path.insert(0, path)
+        importlib.invalidate_caches()
+
+        try:
+            importlib.import_module("yt_dlp")
+            importlib.import_module("yt_dlp.extractor")
+        except Exception as e:
+            # Vuelta atrás inmediata: la versión anterior sigue en memoria
+            for name in [name for name in sys.modules if _is_ytdlp_module(name)]:
+                del sys.modules[name]
+            if path in sys.path:
+                sys.path.remove(path)
+            if old_path is not SYSTEM:
+                sys.path.insert(0, old_path)
+            sys.modules.update(old_modules)
+            self.error = f"{type(e).__name__}: {e}"
+            print(f"No se pudo cargar yt-dlp desde {path}: {self.error}")
+            if on_failure:
+                threading.Thread(target=on_failure, args=(self.error,), daemon=True).start()
+            return False
+
+        self.path = path
+        self.version = loaded_version()
+        self.error = None
+        self._probation = ({"path": path, "failures": 0, "on_failure": on_failure}
+                           if probation else None)
+        from archive import reset_extractor_classes
+        reset_extractor_classes()
+        return True
+
+
+# Un único conmutador por proceso
+engine_switch = EngineSwitch()
+
+
+def loaded_version():
+    """
+    Versión del yt_dlp ya importado, sin importarlo (None si aún no lo está).
+    Dentro de engine_switch.job() es la versión con la que corre la descarga.
+    """
+    module = sys.modules.get("yt_dlp.version")
+    return getattr(module, "__version__", None)
+
+
+def load_ytdlp():
+    """
+    Módulo yt_dlp de la versión activa (se importa la primera vez).
+    Llamar dentro de engine_switch.job().
+    """
+    if not engine_switch._installed:
+        engine_switch.install(EngineVersions().active_path())
+    import yt_dlp
+    return yt_dlp
+
+
+# ==============================================================
+# Versiones en disco
+# ==============================================================
+class EngineVersions:
+    """Versiones de yt-dlp preparadas en la carpeta de datos"""
+
+    _lock = threading.Lock()  # engines.json lo escriben varios hilos
+
+    def __init__(self, root=None, switch=engine_switch):
+        self.root = Path(root) if root else get_data_dir() / ENGINES_DIR
+        self.switch = switch
+
+    # ----------------------------------------------------------
+    # Estado
+    # ----------------------------------------------------------
+    def _state(self):
+        return load_json(str(self.root / STATE_FILE), default={}) or {}
+
+    def _save(self, state):
+        self.root.mkdir(parents=True, exist_ok=True)
+        save_json(str(self.root / STATE_FILE), state)
+
+    def installed(self):
+        """Versiones preparadas en disco, de la más nueva a la más antigua"""
+        if not self.root.is_dir():
+            return []
+        versions = [entry.name for entry in self.root.iterdir()
+                    if (entry / "yt_dlp" / "version.py").is_file()]
+        return sorted(versions, key=_version_key, reverse=True)
+
+    def active(self):
+        """Versión activa (None = la instalada con pip)"""
+        return self._state().get("active")
+
+    def active_path(self):
+        """Carpeta de la versión activa para sys.path (None = la de pip)"""
+        version = self.active()
+        if version and version in self.installed():
+            return str(self.root / version)
+        return SYSTEM
+
+    # ----------------------------------------------------------
+    # Preparar
+    # ----------------------------------------------------------
+    def stage(self, version=None, progress_callback=None):
+        """
+        Descarga y prepara una versión sin activarla.
+
+        Args:
+            version: versión de PyPI (None = la última)
+            progress_callback: callable(status_text: str)
+
+        Returns:
+            dict con 'success', 'version' y 'error'
+        """
+        from updater import YtDlpUpdater, fetch_json_cached
+
+        if version is None:
+            version = YtDlpUpdater.get_latest_version(force=True)
+            if not version:
+                return {"success": False, "version": None,
+                        "error": "No se pudo consultar la última versión en PyPI"}
+        if version in self.installed():
+            return {"success": True, "version": version}
+
+        staging = self.root / f"{version}.tmp"
+        try:
+            # Los datos de una versión publicada no cambian: no hace falta revalidar
+            wheel = fetch_json_cached(PYPI_RELEASE_URL.format(version=version),
+                                      self._reduce_release, max_age=30 * 24 * 3600)
+            if not wheel:
+                raise ValueError(f"PyPI no tiene un wheel de yt-dlp {version}")
+
+            shutil.rmtree(str(staging), ignore_errors=True)
+            staging.mkdir(parents=True)
+            if progress_callback:
+                progress_callback(f"Descargando yt-dlp {version}...")
+            wheel_path = staging / wheel["filename"]
+            self._download(wheel["url"], wheel_path, wheel["sha256"])
+
+            if progress_callback:
+                progress_callback(f"Preparando yt-dlp {version}...")
+            self._extract_package(wheel_path, staging)
+            wheel_path.unlink()
+            os.replace(str(staging), str(self.root / version))
+        except Exception as e:
+            shutil.rmtree(str(staging), ignore_errors=True)
+            return {"success": False, "version": version, "error": str(e)}
+
+        self.prune()
+        return {"success": True, "version": version}
+
+    @staticmethod
+    def _reduce_release(data):
+        for item in data.get("urls", []):
+            if item.get("packagetype") == "bdist_wheel":
+                return {"url": item["url"], "filename": item["filename"],
+                        "sha256": item["digests"]["sha256"]}
+        return None
+
+    @staticmethod
+    def _download(url, path, sha256):
+        import urllib.request
+        hasher = hashlib.sha256()
+        buffer = memoryview(bytearray(256 * 1024))
+        req = urllib.request.Request(url, headers={"User-Agent": "DescargadorMusica-Updater"})
+        with urllib.request.urlopen(req, timeout=30) as response, open(path, "wb") as f:
+            while True:
+                n = response.readinto(buffer)
+                if not n:
+                    break
+                f.write(buffer[:n])
+                hasher.update(buffer[:n])
+        if hasher.hexdigest() != sha256.lower():
+            raise ValueError("el SHA-256 del wheel no coincide con el publicado en PyPI")
+
+    @staticmethod
+    def _extract_package(wheel_path, target):
+        """Extrae solo el paquete yt_dlp/ del wheel"""
+        import zipfile
+        with zipfile.ZipFile(wheel_path) as zf:
+            members = [name for name in zf.namelist()
+                       if name.startswith("yt_dlp/") and not name.endswith("/")]
+            if "yt_dlp/version.py" not in members:
+                raise ValueError("el wheel no contiene yt_dlp")
+            for name in members:
+                destination = target / name
+                destination.parent.mkdir(parents=True, exist_ok=True)
+                with zf.open(name) as src, open(destination, "wb") as dst:
+                    shutil.copyfileobj(src, dst)
+
+    def prune(self):
+        """Borra versiones viejas (conserva activa, anterior y KEEP_VERSIONS)"""
+        state = self._state()
+        keep = {state.get("active"), state.get("previous")}
+        for version in self.installed()[KEEP_VERSIONS:]:
+            if version not in keep:
+                shutil.rmtree(str(self.root / version), ignore_errors=True)
+
+    # ----------------------------------------------------------
+    # Activar y volver atrás
+    # ----------------------------------------------------------
+    def activate(self, version):
+        """
+        Pasa a usar una versión preparada (None = la instalada con pip).
+        Las descargas en marcha terminan con la anterior.
+
+        Returns:
+            dict con 'success', 'old_version', 'new_version' y 'error'
+        """
+        if version is not SYSTEM and version not in self.installed():
+            return {"success": False, "error": f"yt-dlp {version} no está preparado"}
+        self.switch.install(self.active_path())  # Versión de partida, si aún no se cargó
+        with self._lock:
+            state = self._state()
+            old_version = state.get("active")
+            if version == old_version:
+                return {"success": True, "old_version": old_version, "new_version": version}
+            state.update(active=version, previous=old_version)
+            state["bad"] = [bad for bad in state.get("bad", []) if bad != version]
+            self._save(state)
+
+        path = SYSTEM if version is SYSTEM else str(self.root / version)
+        applied = self.switch.request(path, probation=True,
+                                      on_failure=lambda reason: self._reject(version, reason))
+        if applied is False:
+            return {"success": False, "old_version": old_version,
+                    "error": f"yt-dlp {version} no se pudo cargar: {self.switch.error}"}
+        return {"success": True, "old_version": old_version, "new_version": version}
+
+    def rollback(self):
+        """
+        Vuelve a la versión anterior (sigue en disco, el cambio es inmediato).
+
+        Returns:
+            dict con 'success', 'old_version', 'new_version' y 'error'
+        """
+        state = self._state()
+        if "previous" not in state:
+            return {"success": False, "error": "No hay una versión anterior"}
+        result = self.activate(state["previous"])
+        if result["success"]:
+            with self._lock:
+                # Tras volver atrás no se ofrece "volver" a la versión descartada
+                state = self._state()
+                state.pop("previous", None)
+                self._save(state)
+        return result
+
+    def _reject(self, version, reason):
+        """La versión activada falló: volver a la anterior y no ofrecerla más"""
+        with self._lock:
+            state = self._state()
+            if state.get("active") != version:
+                return
+            previous = state.get("previous")
+            state["active"] = previous
+            state.pop("previous", None)
+            state["bad"] = sorted(set(state.get("bad", [])) | {version})
+            self._save(state)
+        print(f"yt-dlp {version} descartado ({reason}); se vuelve a "
+              f"{previous or 'la versión instalada'}")
+        self.switch.request(SYSTEM if previous is None else str(self.root / previous))
+
+    def is_bad(self, version):
+        """True si la versión ya se descartó por fallar"""
+        return version in self._state().get("bad", [])
+
+
+# ==============================================================
+# Línea de comandos
+# ==============================================================
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="engine_versions",
+                                     description="Versiones de yt-dlp instaladas lado a lado")
+    commands = parser.add_subparsers(dest="command")
+    stage = commands.add_parser("stage", help="Descargar y preparar una versión")
+    stage.add_argument("version", nargs="?", help="Versión (por defecto: la última)")
+    activate = commands.add_parser("activate", help="Usar una versión preparada")
+    activate.add_argument("version", help="Versión ('sistema' = la instalada con pip)")
+    commands.add_parser("rollback", help="Volver a la versión anterior")
+    args = parser.parse_args(argv)
+
+    versions = EngineVersions()
+    if args.command == "stage":
+        result = versions.stage(args.version, progress_callback=print)
+    elif args.command == "activate":
+        result = versions.activate(None if args.version == "sistema" else args.version)
+    elif args.command == "rollback":
+        result = versions.rollback()
+    else:
+        active = versions.active()
+        print(f"Activa: {active or 'la instalada con pip'}")
+        for version in versions.installed():
+            bad = " (descartada)" if versions.is_bad(version) else ""
+            print(f"  {'*' if version == active else ' '} {version}{bad}")
+        return 0
+
+    if not result["success"]:
+        print(f"❌ {result.get('error')}", file=sys.stderr)
+        return 1
+    print(f"✅ yt-dlp {result.get('new_version') or result.get('version') or 'de pip'}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
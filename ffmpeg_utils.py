@@ -0,0 +1,422 @@
+"""
+Utilidades FFmpeg
+=================
+Localización de los ejecutables FFmpeg/FFprobe sin depender de la interfaz.
+
+Orden de búsqueda:
+- imageio-ffmpeg (incluido en el ejecutable)
+- Instalación portable en la carpeta de la app
+- FFmpeg en el PATH del sistema
+- Ubicaciones comunes de Windows
+
+install_portable_ffmpeg() descarga FFmpeg a la carpeta de la app (descarga
+reanudable y verificada, ver updater.download_file).
+
+El resultado (rutas, versión y códecs disponibles) se guarda en disco junto
+con el tamaño y la fecha de modificación de cada ejecutable: mientras no
+cambien, no se vuelve a lanzar ningún proceso para buscarlos.
+
+Nunca se modifica el entorno del proceso: cada descarga recibe la ubicación
+por 'ffmpeg_location' (ver get_ffmpeg_location). Si hacen falta nombres
+estándar (ffmpeg/ffprobe), link_standard_names() crea enlaces una sola vez,
+al instalar, en lugar de copiar los ejecutables.
+
+USO:
+  python -m ffmpeg_utils          # Muestra el FFmpeg encontrado
+  python -m ffmpeg_utils --link   # Crea los enlaces con nombres estándar
+  python -m ffmpeg_utils --pin    # SHA-256 de las descargas (al cambiar de versión)
+"""
+
+import os
+import shutil
+import subprocess
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from app_data import get_data_dir, load_json, save_json
+
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+CACHE_FILE = "ffmpeg_cache.json"
+LINKS_DIR = "bin"
+
+# Codificadores de audio que interesan a la app
+AUDIO_ENCODERS = ["libmp3lame", "aac", "libopus", "libvorbis"]
+
+_cache_lock = threading.Lock()
+_memory_cache = None
+
+
+def candidate_ffmpeg_paths():
+    """Retorna las ubicaciones posibles de FFmpeg (orden de prioridad)"""
+    possible_paths = []
+
+    # 1. imageio-ffmpeg (más confiable)
+    try:
+        import imageio_ffmpeg
+        imageio_path = imageio_ffmpeg.get_ffmpeg_exe()
+        if imageio_path:
+            possible_paths.append(imageio_path)
+    except (ImportError, RuntimeError):
+        pass
+
+    # 2. Instalación portable en carpeta del proyecto
+    possible_paths.extend([
+        os.path.join(APP_DIR, 'ffmpeg', 'bin', 'ffmpeg.exe'),
+        os.path.join(APP_DIR, 'ffmpeg.exe'),
+    ])
+
+    # 3. FFmpeg en PATH del sistema
+    possible_paths.append('ffmpeg')
+
+    # 4. Ubicaciones comunes de Windows
+    if os.name == 'nt':
+        possible_paths.extend([
+            r'C:\ffmpeg\bin\ffmpeg.exe',
+            r'C:\Program Files\ffmpeg\bin\ffmpeg.exe',
+            r'C:\Program Files (x86)\ffmpeg\bin\ffmpeg.exe',
+        ])
+
+    return possible_paths
+
+
+def _probe_version(path):
+    """Ejecuta '<path> -version'. Retorna la primera línea o None si no funciona"""
+    try:
+        result = subprocess.run([path, '-version'],
+                                capture_output=True, text=True, timeout=5)
+        if result.returncode == 0:
+            return (result.stdout.splitlines() or [''])[0].strip()
+    except (subprocess.TimeoutExpired, OSError, subprocess.SubprocessError):
+        pass
+    return None
+
+
+def _probe_encoders(path):
+    """Retorna qué codificadores de AUDIO_ENCODERS incluye este FFmpeg"""
+    try:
+        result = subprocess.run([path, '-hide_banner', '-encoders'],
+                                capture_output=True, text=True, timeout=5)
+        output = result.stdout if result.returncode == 0 else ''
+    except (subprocess.TimeoutExpired, OSError, subprocess.SubprocessError):
+        output = ''
+    available = set()
+    for line in output.splitlines():
+        parts = line.split()
+        if len(parts) >= 2:
+            available.add(parts[1])
+    return {name: name in available for name in AUDIO_ENCODERS}
+
+
+def _find_ffprobe(ffmpeg_path):
+    """Busca ffprobe junto a FFmpeg (nombres de imageio incluidos) o en el PATH"""
+    ffmpeg_dir = os.path.dirname(ffmpeg_path)
+    possible_ffprobe_names = [
+        'ffprobe.exe',
+        'ffprobe',
+        'ffprobe-win-x86_64-v7.1.exe',  # Nombre específico como ffmpeg
+        os.path.basename(ffmpeg_path).replace('ffmpeg', 'ffprobe'),
+    ]
+    for name in possible_ffprobe_names:
+        test_path = os.path.join(ffmpeg_dir, name)
+        if os.path.isfile(test_path):
+            return test_path
+    return shutil.which('ffprobe')
+
+
+def _file_signature(path):
+    """(tamaño, mtime) de un ejecutable, o None si no existe"""
+    try:
+        stat = os.stat(path)
+        return [stat.st_size, int(stat.st_mtime)]
+    except (OSError, TypeError):
+        return None
+
+
+def _cache_is_valid(entry):
+    """Un resultado guardado vale si los ejecutables no han cambiado"""
+    if not entry or not entry.get("ffmpeg"):
+        return False
+    if _file_signature(entry["ffmpeg"]) != entry.get("ffmpeg_signature"):
+        return False
+    if entry.get("ffprobe") and _file_signature(entry["ffprobe"]) != entry.get("ffprobe_signature"):
+        return False
+    return True
+
+
+def _discover():
+    """Prueba todas las ubicaciones en paralelo y elige la de mayor prioridad"""
+    candidates = []
+    for path in candidate_ffmpeg_paths():
+        # Rutas absolutas para poder validar por tamaño/fecha
+        full_path = path if os.path.isabs(path) else shutil.which(path)
+        if full_path and os.path.isfile(full_path) and full_path not in candidates:
+            candidates.append(full_path)
+
+    if not candidates:
+        return None
+
+    with ThreadPoolExecutor(max_workers=len(candidates)) as pool:
+        versions = list(pool.map(_probe_version, candidates))
+
+    for path, version in zip(candidates, versions):
+        if version:
+            ffprobe_path = _find_ffprobe(path)
+            return {
+                "ffmpeg": path,
+                "ffprobe": ffprobe_path,
+                "version": version,
+                "encoders": _probe_encoders(path),
+                "ffmpeg_signature": _file_signature(path),
+                "ffprobe_signature": _file_signature(ffprobe_path),
+            }
+    return None
+
+
+def get_ffmpeg_tools(refresh=False):
+    """
+    Retorna FFmpeg/FFprobe localizados, usando la caché si sigue siendo válida.
+
+    Returns:
+        dict con 'ffmpeg', 'ffprobe', 'version' y 'encoders', o None si no
+        se encontró ningún FFmpeg que funcione
+    """
+    global _memory_cache
+
+    with _cache_lock:
+        if not refresh and _cache_is_valid(_memory_cache):
+            return _memory_cache
+
+        try:
+            cache_path = str(get_data_dir() / CACHE_FILE)
+        except OSError:
+            cache_path = None
+
+        entry = None if refresh or not cache_path else load_json(cache_path)
+        if not _cache_is_valid(entry):
+            entry = _discover()
+            if entry and cache_path:
+                try:
+                    save_json(cache_path, entry)
+                except OSError as e:
+                    print(f"Error guardando caché de FFmpeg: {e}")
+
+        _memory_cache = entry
+        return entry
+
+
+def find_ffmpeg():
+    """Busca un FFmpeg que funcione. Retorna su ruta o None"""
+    tools = get_ffmpeg_tools()
+    return tools["ffmpeg"] if tools else None
+
+
+def find_ffmpeg_and_ffprobe():
+    """Obtiene las rutas de ffmpeg y ffprobe"""
+    tools = get_ffmpeg_tools()
+    if not tools:
+        return None, None
+    return tools["ffmpeg"], tools["ffprobe"]
+
+
+# ============================================================
+# Ubicación por trabajo y enlaces con nombres estándar
+# ============================================================
+def _standard_name(program):
+    return program + ('.exe' if os.name == 'nt' else '')
+
+
+def _links_dir():
+    return get_data_dir() / LINKS_DIR
+
+
+def _link(source, target):
+    """Enlace duro (mismo disco) o simbólico; nunca copia el ejecutable"""
+    if os.path.lexists(target):
+        os.remove(target)
+    try:
+        os.link(source, target)
+    except OSError:
+        os.symlink(source, target)
+
+
+def link_standard_names(tools=None):
+    """
+    Crea enlaces 'ffmpeg' y 'ffprobe' (con .exe en Windows) en la carpeta de
+    datos de la app apuntando a los ejecutables encontrados. Pensado para
+    llamarse una vez al instalar FFmpeg.
+
+    Returns:
+        str con la carpeta de enlaces o None si no se pudieron crear
+    """
+    tools = tools or get_ffmpeg_tools()
+    if not tools:
+        return None
+    try:
+        links_dir = _links_dir()
+        links_dir.mkdir(parents=True, exist_ok=True)
+        _link(tools["ffmpeg"], str(links_dir / _standard_name('ffmpeg')))
+        if tools.get("ffprobe"):
+            _link(tools["ffprobe"], str(links_dir / _standard_name('ffprobe')))
+        return str(links_dir)
+    except OSError as e:
+        print(f"No se pudieron crear los enlaces de FFmpeg: {e}")
+        return None
+
+
+def _linked_dir(tools):
+    """Carpeta de enlaces si existe y apunta a los ejecutables actuales"""
+    try:
+        links_dir = _links_dir()
+        ffmpeg_link = links_dir / _standard_name('ffmpeg')
+        if not ffmpeg_link.exists() or not os.path.samefile(ffmpeg_link, tools["ffmpeg"]):
+            return None
+        if tools.get("ffprobe"):
+            ffprobe_link = links_dir / _standard_name('ffprobe')
+            if not ffprobe_link.exists() or not os.path.samefile(ffprobe_link, tools["ffprobe"]):
+                return None
+        return str(links_dir)
+    except OSError:
+        return None
+
+
+def get_ffmpeg_location(tools=None):
+    """
+    Valor para la opción 'ffmpeg_location' de yt-dlp.
+
+    Si FFmpeg y FFprobe están en la misma carpeta con nombres que yt-dlp
+    reconoce, basta la ruta del ejecutable. Si no, se usa la carpeta de
+    enlaces (si se creó al instalar).
+
+    Returns:
+        str con la ruta o None si no hay FFmpeg
+    """
+    tools = tools or get_ffmpeg_tools()
+    if not tools:
+        return None
+
+    ffmpeg_path = tools["ffmpeg"]
+    ffprobe_path = tools.get("ffprobe")
+    same_dir = (not ffprobe_path
+                or os.path.dirname(ffprobe_path) == os.path.dirname(ffmpeg_path))
+    # yt-dlp deduce el nombre de ffprobe reemplazando 'ffmpeg' en el nombre
+    if same_dir and 'ffmpeg' in os.path.basename(ffmpeg_path):
+        return ffmpeg_path
+
+    return _linked_dir(tools) or ffmpeg_path
+
+
+# ============================================================
+# Instalación portable (Windows)
+# ============================================================
+# Compilación "essentials" con ffmpeg y ffprobe en bin/. 'sha256' se fija
+# aquí para cada versión (python -m ffmpeg_utils --pin lo calcula al cambiar
+# de URL). Un .sha256 servido junto al zip no sirve: viene del mismo sitio.
+# Mientras no esté fijado la instalación no se ofrece (ver is_verified).
+PORTABLE_BUILD = {
+    "url": "https://www.gyan.dev/ffmpeg/builds/packages/ffmpeg-4.4.1-essentials_build.zip",
+    "sha256": None,
+    "members": ("ffmpeg.exe", "ffprobe.exe"),
+}
+
+PORTABLE_DIR = os.path.join(APP_DIR, "ffmpeg", "bin")
+
+
+def is_verified(build=PORTABLE_BUILD):
+    """True si la descarga tiene un SHA-256 fijado y se puede instalar"""
+    return bool(build.get("sha256"))
+
+
+def _extract_member(zf, member, destination):
+    """Extrae un miembro del zip directo a su destino (temporal + fsync + rename)"""
+    temp_path = destination + ".new"
+    # zf.open comprueba el CRC al terminar de leer
+    with zf.open(member) as src, open(temp_path, "wb") as dst:
+        shutil.copyfileobj(src, dst, 1024 * 1024)
+        dst.flush()
+        os.fsync(dst.fileno())
+    os.chmod(temp_path, 0o755)
+    os.replace(temp_path, destination)
+
+
+def install_portable_ffmpeg(progress_callback=None, status_callback=None, build=PORTABLE_BUILD):
+    """
+    Descarga la compilación portable de FFmpeg y extrae solo ffmpeg y
+    ffprobe a PORTABLE_DIR.
+
+    La descarga se retoma si se cortó (también entre ejecuciones), se
+    comprueba con el SHA-256 esperado (ver PORTABLE_BUILD) y el progreso se
+    informa a ritmo fijo.
+
+    Args:
+        progress_callback: callable(percent, downloaded, total)
+        status_callback: callable(text) al cambiar de fase
+
+    Returns:
+        dict con 'success', 'ffmpeg' (ruta) y 'error'
+    """
+    import zipfile
+    from updater import download_file
+
+    def status(text):
+        if status_callback:
+            status_callback(text)
+
+    archive_path = str(get_data_dir() / "ffmpeg_portable.zip")
+    if not is_verified(build):
+        return {"success": False, "error": "no hay SHA-256 fijado para esta descarga de FFmpeg"}
+    try:
+        status("Descargando FFmpeg portable...")
+        download_file(build["url"], archive_path, progress_callback, sha256=build["sha256"])
+
+        status("Extrayendo FFmpeg...")
+        os.makedirs(PORTABLE_DIR, exist_ok=True)
+        with zipfile.ZipFile(archive_path) as zf:
+            members = {os.path.basename(name): name for name in zf.namelist()
+                       if os.path.basename(name) in build["members"]
+                       and os.path.basename(os.path.dirname(name)) == "bin"}
+            missing = [name for name in build["members"] if name not in members]
+            if missing:
+                raise ValueError(f"el archivo no contiene {', '.join(missing)}")
+            for name in build["members"]:
+                _extract_member(zf, members[name], os.path.join(PORTABLE_DIR, name))
+        os.remove(archive_path)
+    except Exception as e:
+        return {"success": False, "error": str(e)}
+
+    ffmpeg_path = os.path.join(PORTABLE_DIR, build["members"][0])
+    if not _probe_version(ffmpeg_path):
+        return {"success": False, "error": "FFmpeg descargado pero no funciona"}
+    return {"success": True, "ffmpeg": ffmpeg_path}
+
+
+# ============================================================
+# Ejecución directa
+# ============================================================
+if __name__ == "__main__":
+    if "--pin" in sys.argv[1:]:
+        # Al cambiar de versión: calcular el hash a fijar en PORTABLE_BUILD
+        from updater import download_file
+        temp_path = str(get_data_dir() / "ffmpeg_pin_portable")
+        try:
+            print(f'PORTABLE_BUILD["sha256"] = "{download_file(PORTABLE_BUILD["url"], temp_path)}"')
+        except Exception as e:
+            print(f"PORTABLE_BUILD: {e}")
+            sys.exit(1)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        sys.exit(0)
+
+    tools = get_ffmpeg_tools(refresh=True)
+    if not tools:
+        print("❌ FFmpeg no encontrado")
+        sys.exit(1)
+    print(f"FFmpeg:  {tools['ffmpeg']}")
+    print(f"FFprobe: {tools.get('ffprobe') or 'no encontrado'}")
+    print(f"Versión: {tools['version']}")
+    if "--link" in sys.argv[1:]:
+        links_dir = link_standard_names(tools)
+        print(f"Enlaces: {links_dir or 'no se pudieron crear'}")
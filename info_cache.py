@@ -0,0 +1,125 @@
+"""
+Caché de Información
+====================
+Guarda en memoria la información extraída de cada video (resultado de
+extract_info sin procesar, ya saneado) durante un tiempo limitado.
+
+Los reintentos, los cambios de formato (MP3 ↔ MP4) y los trabajos que se
+vuelven a encolar empiezan a descargar enseguida, sin repetir las consultas
+al sitio ni la ejecución del reproductor.
+
+Una entrada se descarta antes del TTL si las URLs de los flujos caducan
+(parámetro 'expire' de YouTube y similares).
+"""
+
+import copy
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from archive import url_archive_key
+
+
+# Tiempo de vida de una entrada (segundos)
+DEFAULT_TTL = 30 * 60
+
+# Máximo de videos recordados (se olvidan los menos usados)
+MAX_ENTRIES = 500
+
+# Margen antes de la caducidad de las URLs para no empezar una descarga
+# que se cortaría a mitad
+EXPIRY_MARGIN = 5 * 60
+
+_EXPIRE_RE = re.compile(r'[?&/](?:expire|expires|Expires)[=/](\d{9,11})')
+
+
+def stream_expiry(info):
+    """
+    Momento (epoch) en que caduca la primera URL de flujo de un video.
+
+    Returns:
+        int o None si las URLs no indican caducidad
+    """
+    expiries = []
+    for fmt in info.get('formats') or [info]:
+        for url in (fmt.get('url'), fmt.get('manifest_url')):
+            match = _EXPIRE_RE.search(url or '')
+            if match:
+                expiries.append(int(match.group(1)))
+    return min(expiries) if expiries else None
+
+
+def cache_key(url):
+    """Clave canónica de una URL: extractor e ID si se saben, si no la URL"""
+    key = url_archive_key(url)
+    return f"{key[0]}:{key[1]}" if key else url
+
+
+class InfoCache:
+    """Caché LRU en memoria de la información de videos, con TTL"""
+
+    def __init__(self, ttl=DEFAULT_TTL, max_entries=MAX_ENTRIES):
+        """
+        Args:
+            ttl: segundos que vale una entrada
+            max_entries: número máximo de videos recordados
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # clave -> (guardado, caducidad, info)
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, url):
+        """
+        Información guardada de una URL (copia que se puede modificar).
+
+        Returns:
+            dict o None si no está, pasó el TTL o sus URLs están por caducar
+        """
+        key = cache_key(url)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                stored_at, expires_at, info = entry
+                fresh = now - stored_at < self.ttl
+                if fresh and (expires_at is None or now < expires_at - EXPIRY_MARGIN):
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return copy.deepcopy(info)
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, url, info):
+        """
+        Guarda la información saneada de un video.
+
+        Se guarda bajo la URL pedida y bajo 'extractor:id' del resultado, para
+        que otra forma de la misma URL (youtu.be, con &list=...) la encuentre.
+        """
+        if not info or info.get('_type', 'video') != 'video':
+            return
+        entry = (time.time(), stream_expiry(info), copy.deepcopy(info))
+        keys = {cache_key(url)}
+        if info.get('extractor_key') and info.get('id'):
+            keys.add(f"{info['extractor_key'].lower()}:{info['id']}")
+
+        with self._lock:
+            for key in keys:
+                self._entries[key] = entry
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, url):
+        """Olvida la información de una URL (p. ej. tras un error de descarga)"""
+        with self._lock:
+            self._entries.pop(cache_key(url), None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
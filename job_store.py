@@ -0,0 +1,411 @@
+"""
+Cola Persistente de Trabajos
+============================
+Cola de descargas en SQLite que sobrevive a cierres y reinicios, con
+prioridades, importación masiva (archivos de texto/CSV o el portapapeles)
+y enlaces repetidos descartados al encolar.
+
+Cada fila guarda la URL normalizada y las opciones del trabajo. La cola de
+descargas (download_queue.py) va tomando de aquí solo los trabajos que
+puede empezar enseguida, así una lista de cientos de miles de enlaces no
+ocupa memoria ni llena la lista de la ventana.
+
+Orden: primero la prioridad más alta y, a igual prioridad, el orden de
+llegada. Encolar y sacar usan índices (B-tree): O(log n) con la cola llena.
+
+Repetidos: la clave es la URL normalizada (sin rastreadores ni fragmento,
+YouTube en su forma canónica) más el formato y el modo video/playlist, así
+'youtu.be/ID?si=...' y 'youtube.com/watch?v=ID&t=30' son el mismo trabajo.
+
+USO:
+  python -m job_store                                  # Trabajos en cola
+  python -m job_store import enlaces.txt lista.csv -o /srv/musica --format mp3
+  python -m job_store import urgentes.txt --priority 10
+  python -m job_store clear                            # Vaciar la cola
+"""
+
+import argparse
+import csv
+import json
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from app_data import get_data_dir
+from archive import PLAYLIST_PARAMS, YOUTUBE_VIDEO_URL, strip_playlist_params
+from engine import DownloadJob, PLAYLIST_WORKERS
+
+
+QUEUE_FILE = "queue.sqlite3"
+
+# Prioridades habituales (cualquier entero vale; mayor = antes)
+PRIORITY_LOW = -10
+PRIORITY_NORMAL = 0
+PRIORITY_HIGH = 10
+
+# Opciones de DownloadJob guardadas con cada trabajo
+JOB_OPTIONS = ["output_dir", "download_format", "convert", "single_video",
+               "playlist_workers", "audio_profile"]
+
+# Parámetros de rastreo que no cambian el contenido
+TRACKING_PARAMS = {"si", "feature", "fbclid", "gclid", "igshid", "ab_channel"}
+# De una URL de YouTube solo se conserva el video y, en modo playlist, la lista
+YOUTUBE_PLAYLIST_PARAMS = ("list", "index", "start_radio")
+
+YOUTUBE_HOSTS = {"youtube.com", "www.youtube.com", "m.youtube.com", "music.youtube.com"}
+YOUTUBE_SHORT_HOSTS = {"youtu.be", "www.youtu.be"}
+# Rutas con el ID del video como segundo segmento (/shorts/ID, /live/ID...)
+YOUTUBE_ID_PATHS = {"shorts", "live", "embed", "v", "e"}
+YOUTUBE_ID = re.compile(r"^[0-9A-Za-z_-]{11}$")
+
+# Enlaces dentro de texto libre (con o sin esquema)
+URL_PATTERN = re.compile(
+    r"(?:https?://|www\.|(?:m\.|music\.)?youtube\.com/|youtu\.be/)[^\s<>\"'`]+",
+    re.IGNORECASE,
+)
+TRAILING_PUNCTUATION = ".,;:!?)]}"
+
+# Caracteres leídos para adivinar el separador de un CSV
+CSV_SNIFF_BYTES = 64 * 1024
+
+
+# ============================================================
+# Normalización y lectura de listas
+# ============================================================
+def normalize_url(url, single_video=True):
+    """
+    Forma canónica de una URL para descargarla y detectar repetidos.
+
+    YouTube (youtu.be, shorts, m./music., watch) queda como
+    'https://www.youtube.com/watch?v=ID'; en el resto se pasa el dominio a
+    minúsculas y se quitan el fragmento y los parámetros de rastreo. Lo que
+    no es una URL web (p. ej. 'ytsearch:...') se deja como está.
+
+    Returns:
+        la URL normalizada, o None si está vacía
+    """
+    url = url.strip().strip("<>\"'")
+    if not url:
+        return None
+    if single_video:
+        # Atajo para el caso habitual sin analizar la URL entera
+        match = YOUTUBE_VIDEO_URL.match(url)
+        if match:
+            return f"https://www.youtube.com/watch?v={match.group(1)}"
+    if "://" not in url and URL_PATTERN.match(url):
+        url = "https://" + url
+
+    parts = urlsplit(url)
+    if parts.scheme.lower() not in ("http", "https") or not parts.hostname:
+        return url
+
+    host = parts.hostname.lower()
+    query = parse_qsl(parts.query, keep_blank_values=True)
+    if host in YOUTUBE_HOSTS or host in YOUTUBE_SHORT_HOSTS:
+        canonical = _canonical_youtube(host, parts.path, query, single_video)
+        if canonical:
+            return canonical
+
+    netloc = host if parts.port is None else f"{host}:{parts.port}"
+    if parts.username:
+        netloc = f"{parts.netloc.rsplit('@', 1)[0]}@{netloc}"
+    query = [(k, v) for k, v in query
+             if k not in TRACKING_PARAMS and not k.startswith("utm_")]
+    return urlunsplit((parts.scheme.lower(), netloc, parts.path or "/",
+                       urlencode(query), ""))
+
+
+def _canonical_youtube(host, path, query, single_video):
+    """URL canónica de un video o playlist de YouTube (None si no se reconoce)"""
+    params = dict(query)
+    segments = [s for s in path.split("/") if s]
+    if host in YOUTUBE_SHORT_HOSTS:
+        video_id = segments[0] if segments else None
+    elif segments[:1] == ["watch"]:
+        video_id = params.get("v")
+    elif len(segments) >= 2 and segments[0] in YOUTUBE_ID_PATHS:
+        video_id = segments[1]
+    elif segments == ["playlist"] and params.get("list"):
+        return "https://www.youtube.com/playlist?" + urlencode({"list": params["list"]})
+    else:
+        return None
+
+    if not video_id or not YOUTUBE_ID.match(video_id):
+        return None
+    # El ID ya está validado: no hace falta escaparlo
+    canonical = f"https://www.youtube.com/watch?v={video_id}"
+    if not single_video:
+        playlist = [(k, v) for k, v in query if k in YOUTUBE_PLAYLIST_PARAMS]
+        if playlist:
+            canonical += "&" + urlencode(playlist)
+    return canonical
+
+
+def job_key(url, download_format, single_video=True):
+    """Clave de repetidos: URL normalizada + formato + video/playlist"""
+    # Volver a analizar la URL solo si lleva parámetros de playlist
+    if single_video and any(f"{param}=" in url for param in PLAYLIST_PARAMS):
+        url = strip_playlist_params(url)
+    return f"{download_format}|{'video' if single_video else 'playlist'}|{url}"
+
+
+def extract_urls(text):
+    """Enlaces que aparecen en un texto libre (portapapeles, celdas de CSV...)"""
+    urls = []
+    for match in URL_PATTERN.finditer(text):
+        url = match.group(0).rstrip(TRAILING_PUNCTUATION)
+        if "://" not in url:
+            url = "https://" + url
+        urls.append(url)
+    return urls
+
+
+def parse_url_lines(lines):
+    """
+    URLs de un texto con una entrada por línea ('#' para comentarios).
+
+    Si la línea contiene enlaces se toman esos (admite 'Título - URL'); si
+    no, la línea entera (entradas como 'ytsearch:...').
+    """
+    urls = []
+    for line in lines:
+        line = line.strip()
+        if line and not line.startswith("#"):
+            urls.extend(extract_urls(line) or [line])
+    return urls
+
+
+def read_url_file(path):
+    """
+    Lee URLs de un archivo de texto (una por línea) o CSV (cualquier
+    columna; las celdas sin enlaces, como cabeceras o títulos, se ignoran).
+    """
+    # utf-8-sig: los CSV de Excel empiezan con BOM; los enlaces son ASCII y
+    # sobreviven aunque el archivo venga en otra codificación
+    with open(path, "r", encoding="utf-8-sig", errors="replace", newline="") as f:
+        if os.path.splitext(path)[1].lower() not in (".csv", ".tsv"):
+            return parse_url_lines(f)
+
+        sample = f.read(CSV_SNIFF_BYTES)
+        f.seek(0)
+        try:
+            dialect = csv.Sniffer().sniff(sample, delimiters=",;\t|")
+        except csv.Error:
+            dialect = csv.excel_tab if path.lower().endswith(".tsv") else csv.excel
+        urls = []
+        for row in csv.reader(f, dialect):
+            for cell in row:
+                urls.extend(extract_urls(cell))
+        return urls
+
+
+def unique_urls(urls, download_format, single_video=True):
+    """
+    Normaliza una lista y quita los repetidos conservando el orden.
+
+    Returns:
+        tupla (urls únicas normalizadas, número de repetidas)
+    """
+    seen = set()
+    unique = []
+    duplicates = 0
+    for url in urls:
+        url = normalize_url(url, single_video)
+        if not url:
+            continue
+        key = job_key(url, download_format, single_video)
+        if key in seen:
+            duplicates += 1
+        else:
+            seen.add(key)
+            unique.append(url)
+    return unique, duplicates
+
+
+# ============================================================
+# Cola en SQLite
+# ============================================================
+class JobStore:
+    """Cola de trabajos persistente y con prioridades (segura entre hilos)"""
+
+    def __init__(self, path=None):
+        """
+        Args:
+            path: ruta de la base de datos (por defecto en la carpeta de datos)
+        """
+        self.path = path or str(get_data_dir() / QUEUE_FILE)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # Cada importación es una sola transacción: el fsync completo sale
+        # barato y la cola sobrevive también a un corte de luz
+        self._conn.execute("PRAGMA synchronous=FULL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id        INTEGER PRIMARY KEY AUTOINCREMENT,
+                priority  INTEGER NOT NULL,
+                job_key   TEXT NOT NULL UNIQUE,
+                url       TEXT NOT NULL,
+                options   TEXT NOT NULL,
+                added_at  REAL
+            );
+            CREATE INDEX IF NOT EXISTS idx_jobs_order ON jobs (priority DESC, id);
+        """)
+        self._conn.commit()
+        # Contador en memoria: COUNT(*) recorre la tabla entera
+        self._count = self._conn.execute("SELECT COUNT(*) FROM jobs").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def __len__(self):
+        return self._count
+
+    # ----------------------------------------------------------
+    # Encolar
+    # ----------------------------------------------------------
+    def add(self, urls, priority=PRIORITY_NORMAL, output_dir=None, download_format='mp3',
+            convert=True, single_video=True, playlist_workers=PLAYLIST_WORKERS,
+            audio_profile=None):
+        """
+        Encola URLs con las mismas opciones, en una sola transacción.
+
+        Las URLs ya en cola (con el mismo formato y modo) se descartan.
+
+        Args:
+            urls: lista de URLs (se normalizan)
+            priority: entero; las de mayor prioridad salen antes
+            output_dir y el resto: opciones de DownloadJob
+
+        Returns:
+            dict con 'added', 'duplicates' e 'invalid'
+        """
+        options = json.dumps({
+            "output_dir": output_dir or str(os.path.join(os.path.expanduser("~"), "Downloads")),
+            "download_format": download_format,
+            "convert": convert,
+            "single_video": single_video,
+            "playlist_workers": playlist_workers,
+            "audio_profile": audio_profile,
+        }, ensure_ascii=False)
+        now = time.time()
+
+        rows = []
+        invalid = 0
+        for url in urls:
+            url = normalize_url(url, single_video)
+            if not url:
+                invalid += 1
+                continue
+            rows.append((int(priority), job_key(url, download_format, single_video),
+                         url, options, now))
+
+        with self._lock:
+            with self._conn:
+                cursor = self._conn.executemany(
+                    "INSERT OR IGNORE INTO jobs (priority, job_key, url, options, added_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    rows,
+                )
+            added = max(0, cursor.rowcount)
+            self._count += added
+
+        return {"added": added, "duplicates": len(rows) - added, "invalid": invalid}
+
+    # ----------------------------------------------------------
+    # Sacar
+    # ----------------------------------------------------------
+    def head(self, limit=1):
+        """
+        Próximos trabajos por prioridad y orden de llegada, sin quitarlos.
+
+        Se quitan con remove() una vez que la cola de descargas los registró
+        en su diario: tras un cierre entre ambos pasos un trabajo puede
+        repetirse, pero no perderse.
+
+        Returns:
+            lista de DownloadJob con 'store_id'
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, url, options FROM jobs ORDER BY priority DESC, id LIMIT ?",
+                (int(limit),),
+            ).fetchall()
+
+        jobs = []
+        for store_id, url, options in rows:
+            options = json.loads(options)
+            job = DownloadJob(url, **{key: options[key] for key in JOB_OPTIONS if key in options})
+            job.store_id = store_id
+            jobs.append(job)
+        return jobs
+
+    def remove(self, jobs):
+        """Quita de la cola trabajos obtenidos con head()"""
+        ids = [(job.store_id,) for job in jobs if getattr(job, "store_id", None) is not None]
+        if not ids:
+            return
+        with self._lock:
+            with self._conn:
+                cursor = self._conn.executemany("DELETE FROM jobs WHERE id=?", ids)
+            self._count = max(0, self._count - max(0, cursor.rowcount))
+
+    def clear(self):
+        """Vacía la cola"""
+        with self._lock:
+            with self._conn:
+                self._conn.execute("DELETE FROM jobs")
+            self._count = 0
+
+
+# ============================================================
+# Ejecución directa
+# ============================================================
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="job_store", description="Cola persistente de descargas")
+    commands = parser.add_subparsers(dest="command")
+    add = commands.add_parser("import", help="Encolar las URLs de archivos de texto o CSV")
+    add.add_argument("files", nargs="+", help="Archivos con URLs ('-' para stdin)")
+    add.add_argument("-o", "--output", default=str(os.path.join(os.path.expanduser("~"), "Downloads")),
+                     help="Carpeta de destino (por defecto: ~/Downloads)")
+    add.add_argument("-f", "--format", choices=["mp3", "mp4"], default="mp3",
+                     help="Formato de descarga (por defecto: mp3)")
+    add.add_argument("--no-convert", action="store_true",
+                     help="No convertir a MP3; guardar el audio en formato original")
+    add.add_argument("--playlist", action="store_true",
+                     help="Descargar la playlist completa en lugar del video individual")
+    add.add_argument("--priority", type=int, default=PRIORITY_NORMAL,
+                     help=f"Prioridad (mayor = antes, por defecto: {PRIORITY_NORMAL})")
+    commands.add_parser("clear", help="Vaciar la cola")
+    args = parser.parse_args(argv)
+
+    store = JobStore()
+    if args.command == "import":
+        urls = []
+        try:
+            for path in args.files:
+                urls.extend(parse_url_lines(sys.stdin) if path == "-" else read_url_file(path))
+        except OSError as e:
+            print(f"❌ No se pudo leer la lista de URLs: {e}", file=sys.stderr)
+            return 2
+        summary = store.add(urls, priority=args.priority, output_dir=args.output,
+                            download_format=args.format, convert=not args.no_convert,
+                            single_video=not args.playlist)
+        print(f"Agregadas: {summary['added']}  |  Repetidas: {summary['duplicates']}"
+              f"  |  Vacías: {summary['invalid']}")
+    elif args.command == "clear":
+        store.clear()
+
+    print(f"Trabajos en cola: {len(store)}")
+    for job in store.head(10):
+        print(f"  {job.download_format}  {job.url}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
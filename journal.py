@@ -0,0 +1,228 @@
+"""
+Diario de Trabajos
+==================
+Registro de solo-añadir (JSON Lines) de los trabajos de descarga y sus
+fases, para retomarlos si la app se cierra o el equipo se reinicia:
+
+  queued → resolved → downloading (bytes) → converting → done / failed
+
+Al iniciar, los trabajos sin terminar se vuelven a encolar con sus mismos
+datos: yt-dlp continúa los archivos .part ya empezados (petición por
+rangos) en lugar de empezar de cero.
+
+Cada línea es un cambio de fase; una línea cortada por un apagón se ignora.
+Los cambios de fase se escriben con fsync; el progreso de bytes solo cada
+pocos segundos. Al abrir, y cada cierto número de líneas, el diario se
+compacta: queda una sola línea por trabajo sin terminar.
+"""
+
+import json
+import os
+import threading
+import time
+import uuid
+
+from app_data import get_data_dir
+from engine import DownloadJob
+
+
+JOURNAL_FILE = "journal.jsonl"
+# Diario propio del modo por lotes, para no mezclarlo con el de la ventana
+BATCH_JOURNAL_FILE = "journal-batch.jsonl"
+
+# Fases de un trabajo
+QUEUED = "queued"
+RESOLVED = "resolved"
+DOWNLOADING = "downloading"
+CONVERTING = "converting"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+FINAL_PHASES = {DONE, FAILED, CANCELLED}
+
+# Segundos mínimos entre dos líneas de progreso del mismo trabajo
+PROGRESS_INTERVAL = 5.0
+
+# Líneas escritas desde la última compactación que disparan otra
+COMPACT_EVERY = 2000
+
+# Datos del trabajo necesarios para volver a crearlo
+JOB_FIELDS = ["url", "output_dir", "download_format", "convert", "single_video",
+              "playlist_workers", "playlist_index", "audio_profile"]
+
+
+class JobJournal:
+    """Diario de trabajos en disco, seguro entre hilos"""
+
+    def __init__(self, path=None):
+        """
+        Args:
+            path: archivo del diario (por defecto en la carpeta de datos)
+        """
+        self.path = path or str(get_data_dir() / JOURNAL_FILE)
+        self._lock = threading.Lock()
+        self._states = {}  # journal_id -> estado combinado del trabajo
+        self._last_progress = {}  # journal_id -> momento de la última línea de progreso
+        self._lines = 0
+        self._file = None
+        self._load()
+        self.compact()
+
+    # ----------------------------------------------------------
+    # Registro de fases
+    # ----------------------------------------------------------
+    def add(self, job):
+        """Registra un trabajo nuevo (o retomado) en la cola"""
+        if not getattr(job, "journal_id", None):
+            job.journal_id = uuid.uuid4().hex
+        record = {field: getattr(job, field) for field in JOB_FIELDS}
+        self._append(job.journal_id, QUEUED, sync=True, **record)
+
+    def update(self, job, phase, **fields):
+        """Registra un cambio de fase (resolved, converting, done...)"""
+        if getattr(job, "journal_id", None):
+            self._append(job.journal_id, phase, sync=True, **fields)
+
+    def progress(self, job, event):
+        """
+        Registra el avance de una descarga a partir de un evento de progreso.
+
+        La primera vez registra la fase 'resolved' con el archivo de destino;
+        después, como mucho una línea cada PROGRESS_INTERVAL segundos.
+        """
+        journal_id = getattr(job, "journal_id", None)
+        if not journal_id:
+            return
+        now = time.monotonic()
+        with self._lock:
+            state = self._states.get(journal_id)
+            if state is None:
+                return
+            first = state["phase"] == QUEUED
+            last = self._last_progress.get(journal_id, 0)
+            if not first and now - last < PROGRESS_INTERVAL:
+                return
+            self._last_progress[journal_id] = now
+
+        if first:
+            self._append(journal_id, RESOLVED, sync=True, filename=event.get('filename', ''))
+        else:
+            self._append(journal_id, DOWNLOADING, sync=False,
+                         filename=event.get('filename', ''),
+                         bytes=event.get('downloaded_bytes', 0),
+                         total_bytes=event.get('total_bytes', 0))
+
+    # ----------------------------------------------------------
+    # Recuperación
+    # ----------------------------------------------------------
+    def unfinished(self):
+        """
+        Trabajos que no llegaron a una fase final.
+
+        Returns:
+            lista de DownloadJob con su journal_id (en orden de llegada)
+        """
+        with self._lock:
+            states = [dict(s) for s in self._states.values() if s["phase"] not in FINAL_PHASES]
+
+        jobs = []
+        for state in states:
+            job = DownloadJob(**{field: state[field] for field in JOB_FIELDS if field in state})
+            job.journal_id = state["id"]
+            jobs.append(job)
+        return jobs
+
+    def discard(self, jobs):
+        """
+        Marca como cancelados trabajos que el usuario no quiere retomar y
+        borra sus descargas a medias (.part) para que no se acumulen.
+        """
+        for job in jobs:
+            with self._lock:
+                filename = self._states.get(job.journal_id, {}).get("filename")
+            if filename:
+                for leftover in (filename + ".part", filename + ".ytdl"):
+                    try:
+                        os.remove(leftover)
+                    except OSError:
+                        pass
+            self.update(job, CANCELLED)
+
+    # ----------------------------------------------------------
+    # Compactación
+    # ----------------------------------------------------------
+    def compact(self):
+        """Reescribe el diario con una línea por trabajo sin terminar"""
+        with self._lock:
+            self._states = {jid: state for jid, state in self._states.items()
+                            if state["phase"] not in FINAL_PHASES}
+            self._last_progress = {jid: t for jid, t in self._last_progress.items()
+                                   if jid in self._states}
+            if self._file:
+                self._file.close()
+                self._file = None
+
+            temp_path = f"{self.path}.tmp"
+            with open(temp_path, "w", encoding="utf-8") as f:
+                for state in self._states.values():
+                    f.write(json.dumps(state, ensure_ascii=False) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, self.path)
+            self._lines = len(self._states)
+
+    def close(self):
+        with self._lock:
+            if self._file:
+                self._file.close()
+                self._file = None
+
+    # ----------------------------------------------------------
+    # Auxiliares
+    # ----------------------------------------------------------
+    def _load(self):
+        """Reconstruye el estado de cada trabajo leyendo el diario"""
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue  # Línea cortada por un cierre inesperado
+                    self._merge(record)
+        except OSError:
+            pass
+
+    def _merge(self, record):
+        """Combina una línea con el estado del trabajo (llamar con el lock tomado)"""
+        journal_id = record.get("id")
+        if not journal_id:
+            return
+        state = self._states.setdefault(journal_id, {})
+        state.update(record)
+
+    def _append(self, journal_id, phase, sync, **fields):
+        record = {"id": journal_id, "phase": phase, "t": round(time.time(), 3)}
+        record.update(fields)
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+
+        with self._lock:
+            if phase != QUEUED and journal_id not in self._states:
+                return  # Trabajo ya compactado o desconocido
+            self._merge(record)
+            try:
+                if self._file is None:
+                    self._file = open(self.path, "a", encoding="utf-8")
+                self._file.write(line)
+                self._file.flush()
+                if sync:
+                    os.fsync(self._file.fileno())
+            except OSError as e:
+                print(f"Error escribiendo el diario de trabajos: {e}")
+                return
+            self._lines += 1
+            needs_compaction = self._lines >= COMPACT_EVERY
+
+        if needs_compaction:
+            self.compact()
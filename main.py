@@ -1,20 +1,35 @@
+from startup_timing import startup  # Primero: mide el resto del arranque
+
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
-import yt_dlp
 import threading
 import os
 import subprocess
 import sys
-import shutil
-import zipfile
-import urllib.request
+from concurrent.futures import Future
 from pathlib import Path
 
+from engine import DownloadEngine, DownloadJob, preload
+from download_queue import DownloadQueue, DEFAULT_WORKERS, MAX_WORKERS, KEEP_FINISHED, DONE, FAILED
+from pipeline import TranscodeStage
+from tuning import AdaptiveTuner
+from archive import DownloadArchive
+from media_cache import MediaCache
+from info_cache import InfoCache
+from journal import JobJournal
+from job_store import JobStore, read_url_file, extract_urls, PRIORITY_HIGH, PRIORITY_NORMAL
+from metrics import MetricsRegistry
+from tracing import TraceSession
+from progress_bus import ProgressBus
+import ffmpeg_utils
+from ffmpeg_utils import find_ffmpeg, find_ffmpeg_and_ffprobe, link_standard_names
+
 # Importar sistema de actualización
 try:
     from updater import (
         UpdateChecker, YtDlpUpdater,
         CURRENT_VERSION, REPO_OWNER, REPO_NAME,
+        startup_check_due, record_startup_check, finish_pending_source_update,
     )
     UPDATER_AVAILABLE = True
 except ImportError:
@@ -22,11 +37,14 @@ except ImportError:
     CURRENT_VERSION = "1.0.0"
     YtDlpUpdater = None
 
+# Espera tras abrir la ventana antes de consultar actualizaciones en la red
+STARTUP_CHECK_DELAY_MS = 10000
+
 class YouTubeMusicDownloader:
     def __init__(self, root):
         self.root = root
         self.root.title("Descargador de Música")
-        self.root.geometry("600x600")
+        self.root.geometry("600x860")
         self.root.resizable(False, False)  # Ventana fija para evitar confusión
         self.root.configure(bg='#f0f0f0')  # Fondo más claro
         
@@ -40,6 +58,9 @@ class YouTubeMusicDownloader:
         self.download_format = tk.StringVar()
         self.download_format.set('mp3')  # Por defecto música (MP3)
         
+        # Audio rápido: conservar el códec original si el dispositivo lo reproduce
+        self.fast_audio = tk.BooleanVar(value=False)
+        
         # Variables para progreso avanzado
         self.current_percent = tk.StringVar()
         self.download_speed = tk.StringVar()
@@ -50,8 +71,35 @@ class YouTubeMusicDownloader:
         self.allow_playlists = tk.BooleanVar()
         self.allow_playlists.set(False)
         
+        # Motor de descarga (independiente de Tk) y cola de trabajos
+        self.engine = DownloadEngine(transcoder=TranscodeStage(), tuner=AdaptiveTuner(),
+                                     archive=DownloadArchive(), media_cache=MediaCache(),
+                                     info_cache=InfoCache())
+        self.max_workers = tk.IntVar(value=DEFAULT_WORKERS)
+        self.journal = JobJournal()
+        # Cola persistente: los enlaces esperan en disco hasta que hay hilo libre
+        self.store = JobStore()
+        # Los hilos publican el progreso; Tk lo dibuja a ritmo fijo
+        self.progress_bus = ProgressBus(self.root.after, self.on_jobs_update)
+        self.queue = DownloadQueue(
+            self.engine,
+            workers=DEFAULT_WORKERS,
+            on_update=self.progress_bus.publish,
+            # Los diálogos del final se abren en el hilo de Tk
+            on_idle=lambda finished, completed: self.progress_bus.call(
+                self.on_queue_idle, finished, completed),
+            journal=self.journal,
+            metrics=MetricsRegistry(),
+            backlog=self.store,
+            keep_finished=KEEP_FINISHED,
+        )
+        
         self.setup_styles()
         self.setup_ui()
+        self.progress_bus.start()
+        
+        # Descargas que quedaron a medias en la sesión anterior
+        self.root.after(1000, self.offer_resume)
     
     def setup_styles(self):
         """Configurar estilos simples y accesibles"""
@@ -140,10 +188,21 @@ class YouTubeMusicDownloader:
                                style='Title.TLabel')
         title_label.pack(pady=(0, 30))
         
-        # Campo de URL
-        url_label = ttk.Label(main_frame, text="Enlace del video:", 
+        # Campo de URL (y listas de enlaces desde archivo o portapapeles)
+        url_header = ttk.Frame(main_frame, style='Simple.TFrame')
+        url_header.pack(fill=tk.X, pady=(0, 10))
+        
+        url_label = ttk.Label(url_header, text="Enlace(s) del video:", 
                              style='Label.TLabel')
-        url_label.pack(anchor=tk.W, pady=(0, 10))
+        url_label.pack(side=tk.LEFT)
+        
+        paste_btn = ttk.Button(url_header, text="📋 Pegar enlaces", style='Simple.TButton',
+                               command=self.paste_urls)
+        paste_btn.pack(side=tk.RIGHT)
+        
+        import_btn = ttk.Button(url_header, text="📄 Importar lista", style='Simple.TButton',
+                                command=self.import_url_file)
+        import_btn.pack(side=tk.RIGHT, padx=(0, 10))
         
         self.url_entry = ttk.Entry(main_frame, font=("Arial", 14), width=60, style='Simple.TEntry')
         self.url_entry.pack(fill=tk.X, pady=(0, 30), ipady=10)
@@ -169,7 +228,18 @@ class YouTubeMusicDownloader:
                                    cursor='hand2',
                                    padx=10,
                                    pady=10)
-        mp3_radio.pack(anchor=tk.W, pady=(0, 15))
+        mp3_radio.pack(anchor=tk.W, pady=(0, 5))
+        
+        # Audio rápido (sin recodificar a MP3)
+        fast_check = tk.Checkbutton(format_frame,
+                                    text="⚡ Rápido: sin convertir a MP3 (celulares y PC modernos)",
+                                    variable=self.fast_audio,
+                                    font=("Arial", 11),
+                                    bg='#f0f0f0',
+                                    activebackground='#f0f0f0',
+                                    cursor='hand2',
+                                    padx=40)
+        fast_check.pack(anchor=tk.W, pady=(0, 15))
         
         # Radio button para MP4 (Video)
         mp4_radio = tk.Radiobutton(format_frame, 
@@ -205,14 +275,42 @@ class YouTubeMusicDownloader:
         # Botón principal de descarga (grande y claro)
         self.download_btn = ttk.Button(main_frame, text="DESCARGAR MÚSICA", 
                                       command=self.start_download, style="Big.TButton")
-        self.download_btn.pack(pady=(0, 30), fill=tk.X, ipady=15)
+        self.download_btn.pack(pady=(0, 15), fill=tk.X, ipady=15)
+        
+        # Descargas simultáneas
+        workers_frame = ttk.Frame(main_frame, style='Simple.TFrame')
+        workers_frame.pack(fill=tk.X, pady=(0, 10))
+        
+        workers_label = ttk.Label(workers_frame, text="Descargas simultáneas:", 
+                                 style='Instruction.TLabel')
+        workers_label.pack(side=tk.LEFT)
+        
+        workers_spin = ttk.Spinbox(workers_frame, from_=1, to=MAX_WORKERS, width=4,
+                                   textvariable=self.max_workers, state='readonly',
+                                   command=self.update_workers)
+        workers_spin.pack(side=tk.LEFT, padx=(10, 0))
+        
+        clear_btn = ttk.Button(workers_frame, text="🗑 Vaciar cola", style='Simple.TButton',
+                               command=self.clear_backlog)
+        clear_btn.pack(side=tk.RIGHT)
+        
+        # Lista de descargas: una fila por trabajo con su estado y progreso
+        self.jobs_tree = ttk.Treeview(main_frame, columns=('name', 'status', 'progress'),
+                                      show='headings', height=6)
+        self.jobs_tree.heading('name', text='Descarga')
+        self.jobs_tree.heading('status', text='Estado')
+        self.jobs_tree.heading('progress', text='%')
+        self.jobs_tree.column('name', width=300)
+        self.jobs_tree.column('status', width=180)
+        self.jobs_tree.column('progress', width=50, anchor=tk.E)
+        self.jobs_tree.pack(fill=tk.X, pady=(0, 20))
         
         # Configurar opciones automáticas (sin mostrar al usuario)
         self.use_conversion = tk.BooleanVar(value=True)  # Siempre convertir a MP3
         self.allow_playlists = tk.BooleanVar(value=False)  # Nunca descargar playlists
         
         # Barra de progreso simple
-        progress_label = ttk.Label(main_frame, text="Progreso:", style='Label.TLabel')
+        progress_label = ttk.Label(main_frame, text="Progreso total:", style='Label.TLabel')
         progress_label.pack(anchor=tk.W, pady=(0, 10))
         
         self.progress = ttk.Progressbar(main_frame, mode='determinate', 
@@ -255,17 +353,45 @@ class YouTubeMusicDownloader:
                                    command=self.update_ytdlp_ui, style='Simple.TButton')
             ytdlp_btn.pack(side=tk.LEFT, padx=(10, 0))
             
-            ytdlp_ver = YtDlpUpdater.get_installed_version() if YtDlpUpdater else '?'
+            # La versión de yt-dlp se muestra cuando termina de precargarse
             self.version_label = ttk.Label(
                 update_frame,
-                text=f"App v{CURRENT_VERSION}  |  yt-dlp {ytdlp_ver}",
+                text=f"App v{CURRENT_VERSION}  |  yt-dlp …",
                 style='Instruction.TLabel',
             )
             self.version_label.pack(side=tk.RIGHT, padx=(10, 0))
             
-            # Verificar actualizaciones en segundo plano al iniciar
-            self.root.after(2000, self._startup_update_check)
+            # Verificar actualizaciones en segundo plano, con la ventana ya en uso
+            self.root.after(STARTUP_CHECK_DELAY_MS, self._startup_update_check)
+        
+    def on_first_frame(self):
+        """La ventana ya se dibujó: precargar yt-dlp y FFmpeg en segundo plano"""
+        startup.mark("primer dibujo")
+        self._preloaded = Future()
         
+        def load():
+            try:
+                self._preloaded.set_result(preload(self.engine))
+            except Exception as e:
+                self._preloaded.set_exception(e)
+        
+        threading.Thread(target=load, daemon=True).start()
+        self.root.after(100, self._poll_preload)
+    
+    def _poll_preload(self):
+        if not self._preloaded.done():
+            self.root.after(100, self._poll_preload)
+            return
+        startup.mark("yt-dlp precargado")
+        startup.finish()
+        if self._preloaded.exception() is not None:
+            print(f"Error precargando yt-dlp: {self._preloaded.exception()}")
+            return
+        if UPDATER_AVAILABLE:
+            self.version_label.config(
+                text=f"App v{CURRENT_VERSION}  |  yt-dlp {self._preloaded.result()}"
+            )
+    
     def select_download_path(self):
         folder = filedialog.askdirectory(initialdir=self.download_path.get())
         if folder:
@@ -280,80 +406,11 @@ class YouTubeMusicDownloader:
     
     def get_ffmpeg_path(self):
         """Busca FFmpeg en varias ubicaciones (orden de prioridad)"""
-        app_dir = os.path.dirname(__file__)
-        
-        # Ubicaciones posibles de FFmpeg (orden de prioridad)
-        possible_paths = []
-        
-        # 1. imageio-ffmpeg (más confiable)
-        try:
-            import imageio_ffmpeg
-            imageio_path = imageio_ffmpeg.get_ffmpeg_exe()
-            if imageio_path:
-                possible_paths.append(imageio_path)
-        except ImportError:
-            pass
-        
-        # 2. Instalación portable en carpeta del proyecto
-        possible_paths.extend([
-            os.path.join(app_dir, 'ffmpeg', 'bin', 'ffmpeg.exe'),
-            os.path.join(app_dir, 'ffmpeg.exe'),
-        ])
-        
-        # 3. FFmpeg en PATH del sistema
-        possible_paths.append('ffmpeg')
-        
-        # 4. Ubicaciones comunes de Windows
-        if os.name == 'nt':
-            possible_paths.extend([
-                r'C:\ffmpeg\bin\ffmpeg.exe',
-                r'C:\Program Files\ffmpeg\bin\ffmpeg.exe',
-                r'C:\Program Files (x86)\ffmpeg\bin\ffmpeg.exe',
-            ])
-        
-        # Probar cada ubicación
-        for path in possible_paths:
-            try:
-                result = subprocess.run([path, '-version'], 
-                                      capture_output=True, text=True, timeout=5)
-                if result.returncode == 0:
-                    return path
-            except (subprocess.TimeoutExpired, FileNotFoundError, subprocess.SubprocessError):
-                continue
-        
-        return None
+        return find_ffmpeg()
     
     def get_ffmpeg_and_ffprobe_paths(self):
         """Obtiene las rutas de ffmpeg y ffprobe"""
-        try:
-            import imageio_ffmpeg
-            
-            # Obtener la ruta base de imageio-ffmpeg
-            ffmpeg_path = imageio_ffmpeg.get_ffmpeg_exe()
-            
-            # Para imageio-ffmpeg, ffprobe generalmente está en la misma ubicación
-            if ffmpeg_path and os.path.exists(ffmpeg_path):
-                ffmpeg_dir = os.path.dirname(ffmpeg_path)
-                
-                # Buscar ffprobe en la misma carpeta
-                possible_ffprobe_names = [
-                    'ffprobe.exe',
-                    'ffprobe-win-x86_64-v7.1.exe',  # Nombre específico como ffmpeg
-                    os.path.basename(ffmpeg_path).replace('ffmpeg', 'ffprobe')
-                ]
-                
-                ffprobe_path = None
-                for name in possible_ffprobe_names:
-                    test_path = os.path.join(ffmpeg_dir, name)
-                    if os.path.exists(test_path):
-                        ffprobe_path = test_path
-                        break
-                
-                return ffmpeg_path, ffprobe_path
-        except ImportError:
-            pass
-        
-        return None, None
+        return find_ffmpeg_and_ffprobe()
 
     def run_diagnostics(self):
         """Ejecuta un diagnóstico completo del sistema"""
@@ -487,13 +544,16 @@ class YouTubeMusicDownloader:
                 except Exception as e:
                     print(f"Error instalando imageio-ffmpeg: {e}")
                 
-                # Método 2: Instalación portable para Windows
-                if not success and os.name == 'nt':
+                # Método 2: Instalación portable para Windows (solo con el
+                # SHA-256 fijado: no se instalan ejecutables sin verificar)
+                if not success and os.name == 'nt' and ffmpeg_utils.is_verified():
                     success = self.install_portable_ffmpeg()
                 
-                # Método 3: Instalación simple usando executable directo
-                if not success:
-                    success = self.install_simple_ffmpeg()
+                # Volver a buscar FFmpeg (la caché guarda la ubicación anterior)
+                # y crear una sola vez los enlaces con nombres estándar
+                if success:
+                    self.engine.resolve_ffmpeg(refresh=True)
+                    link_standard_names()
                 
                 # Si todo falló
                 if not success:
@@ -518,11 +578,9 @@ class YouTubeMusicDownloader:
         """Instala FFmpeg portable en la carpeta del proyecto"""
         try:
             self.update_status("Instalando FFmpeg portable...")
-            app_dir = os.path.dirname(__file__)
-            ffmpeg_dir = os.path.join(app_dir, 'ffmpeg')
+            ffmpeg_exe = os.path.join(ffmpeg_utils.PORTABLE_DIR, 'ffmpeg.exe')
             
             # Si ya existe, verificar que funcione
-            ffmpeg_exe = os.path.join(ffmpeg_dir, 'bin', 'ffmpeg.exe')
             if os.path.exists(ffmpeg_exe):
                 try:
                     result = subprocess.run([ffmpeg_exe, '-version'], 
@@ -534,56 +592,21 @@ class YouTubeMusicDownloader:
                 except:
                     pass
             
-            # Descargar FFmpeg portable
-            self.update_status("Descargando FFmpeg portable...")
-            
-            # URL más pequeña y confiable
-            url = "https://www.gyan.dev/ffmpeg/builds/packages/ffmpeg-4.4.1-essentials_build.zip"
-            zip_path = os.path.join(app_dir, 'ffmpeg_portable.zip')
-            
-            # Descargar con progress
-            def download_progress(block_num, block_size, total_size):
-                if total_size > 0:
-                    percent = min(100, (block_num * block_size * 100) / total_size)
-                    self.update_status(f"Descargando FFmpeg: {percent:.1f}%")
-            
-            urllib.request.urlretrieve(url, zip_path, download_progress)
-            
-            self.update_status("Extrayendo FFmpeg...")
-            
-            # Extraer
-            with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-                zip_ref.extractall(app_dir)
-            
-            # Buscar carpeta extraída y renombrarla
-            extracted_folders = [f for f in os.listdir(app_dir) 
-                               if f.startswith('ffmpeg-') and os.path.isdir(os.path.join(app_dir, f))]
-            
-            if extracted_folders:
-                old_name = os.path.join(app_dir, extracted_folders[0])
-                if os.path.exists(ffmpeg_dir):
-                    shutil.rmtree(ffmpeg_dir)
-                os.rename(old_name, ffmpeg_dir)
-            
-            # Limpiar archivo zip
-            if os.path.exists(zip_path):
-                os.remove(zip_path)
-            
-            # Verificar instalación
-            if os.path.exists(ffmpeg_exe):
-                try:
-                    result = subprocess.run([ffmpeg_exe, '-version'], 
-                                          capture_output=True, text=True, timeout=10)
-                    if result.returncode == 0:
-                        messagebox.showinfo("FFmpeg", 
-                            f"✅ FFmpeg portable instalado correctamente!\n\n" +
-                            f"Ubicación: {ffmpeg_exe}\n\n" +
-                            "Ahora puedes descargar y convertir audio a MP3.")
-                        return True
-                except Exception as e:
-                    messagebox.showerror("Error", 
-                        f"FFmpeg descargado pero no funciona: {str(e)}")
+            # Solo ffmpeg y ffprobe; la descarga se retoma si se cortó
+            result = ffmpeg_utils.install_portable_ffmpeg(
+                progress_callback=self._ffmpeg_download_progress,
+                status_callback=lambda text: self.root.after(0, self.update_status, text),
+            )
+            if result["success"]:
+                messagebox.showinfo("FFmpeg", 
+                    f"✅ FFmpeg portable instalado correctamente!\n\n" +
+                    f"Ubicación: {result['ffmpeg']}\n\n" +
+                    "Ahora puedes descargar y convertir audio a MP3.")
+                return True
             
+            messagebox.showerror("Error", 
+                f"Error instalando FFmpeg portable: {result['error']}\n\n" +
+                "Intenta descargar manualmente desde https://ffmpeg.org")
             return False
             
         except Exception as e:
@@ -592,53 +615,17 @@ class YouTubeMusicDownloader:
                 "Intenta descargar manualmente desde https://ffmpeg.org")
             return False
     
-    def install_simple_ffmpeg(self):
-        """Método simple: descargar solo el ejecutable FFmpeg"""
-        try:
-            self.update_status("Instalando FFmpeg simple...")
-            app_dir = os.path.dirname(__file__)
-            ffmpeg_exe = os.path.join(app_dir, 'ffmpeg.exe')
-            
-            if os.path.exists(ffmpeg_exe):
-                try:
-                    result = subprocess.run([ffmpeg_exe, '-version'], 
-                                          capture_output=True, text=True, timeout=5)
-                    if result.returncode == 0:
-                        messagebox.showinfo("FFmpeg", 
-                            f"✅ FFmpeg ya está instalado!\n\nUbicación: {ffmpeg_exe}")
-                        return True
-                except:
-                    pass
-            
-            # URL directa a ffmpeg.exe (más pequeño)
-            url = "https://github.com/eugeneware/ffmpeg-static/releases/download/b4.4.0/win32-x64"
-            
-            self.update_status("Descargando FFmpeg ejecutable...")
-            urllib.request.urlretrieve(url, ffmpeg_exe)
-            
-            # Verificar que funcione
-            try:
-                result = subprocess.run([ffmpeg_exe, '-version'], 
-                                      capture_output=True, text=True, timeout=10)
-                if result.returncode == 0:
-                    messagebox.showinfo("FFmpeg", 
-                        f"✅ FFmpeg instalado correctamente!\n\n" +
-                        f"Ubicación: {ffmpeg_exe}\n\n" +
-                        "Ahora puedes descargar y convertir audio a MP3.")
-                    return True
-            except Exception as e:
-                messagebox.showerror("Error", f"FFmpeg descargado pero no funciona: {str(e)}")
-                
-            return False
-            
-        except Exception as e:
-            messagebox.showerror("Error", 
-                f"Error instalando FFmpeg simple: {str(e)}")
-            return False
+    def _ffmpeg_download_progress(self, percent, downloaded, total):
+        """Progreso de la descarga de FFmpeg (llega a ritmo fijo desde otro hilo)"""
+        text = (f"Descargando FFmpeg: {downloaded / (1024 * 1024):.1f} / "
+                f"{total / (1024 * 1024):.1f} MB ({percent:.0f}%)")
+        self.root.after(0, self.update_status, text)
     
     def update_status(self, message):
         self.status_label.config(text=message)
-        self.root.update_idletasks()
+        # Forzar el redibujado solo desde el hilo de Tk (instalaciones en curso)
+        if threading.current_thread() is threading.main_thread():
+            self.root.update_idletasks()
         
     def reset_progress_info(self):
         """Reinicia la información de progreso"""
@@ -652,52 +639,13 @@ class YouTubeMusicDownloader:
         self.info_text.insert(1.0, text)
         self.info_text.config(state=tk.DISABLED)
     
-    def progress_hook(self, d):
-        if d['status'] == 'downloading':
-            # Extraer información de progreso
-            percent_str = d.get('_percent_str', '0%').strip()
-            percent_num = 0
-            
-            try:
-                # Extraer número del porcentaje
-                if '%' in percent_str:
-                    percent_num = float(percent_str.replace('%', ''))
-            except (ValueError, TypeError):
-                percent_num = 0
-            
-            # Actualizar barra de progreso
-            self.progress.configure(mode='determinate')
-            self.progress['value'] = percent_num
-            
-            # Actualizar información básica
-            self.percent_label.config(text=f"Descargando: {percent_str}")
-            
-            # Actualizar estado
-            filename = d.get('filename', 'archivo')
-            if filename:
-                short_name = os.path.basename(filename)[:30] + "..." if len(os.path.basename(filename)) > 30 else os.path.basename(filename)
-                self.update_status(f"📥 Descargando: {short_name}")
-            
-        elif d['status'] == 'finished':
-            # Completar la barra de progreso
-            self.progress['value'] = 100
-            self.percent_label.config(text="Descarga completada")
-            
-            filename = d.get('filename', '')
-            if filename:
-                short_name = os.path.basename(filename)[:30] + "..." if len(os.path.basename(filename)) > 30 else os.path.basename(filename)
-                self.update_status(f"✅ Descarga completada: {short_name}")
-            else:
-                self.update_status("✅ Descarga completada, procesando...")
-                
-        elif d['status'] == 'error':
-            self.progress.configure(mode='indeterminate')
-            self.progress.stop()
-            self.update_status("❌ Error durante la descarga")
+    def update_workers(self):
+        """Aplica el número de descargas simultáneas elegido"""
+        self.queue.set_workers(self.max_workers.get())
     
     def start_download(self):
-        url = self.url_entry.get().strip()
-        if not url:
+        urls = self.url_entry.get().split()
+        if not urls:
             messagebox.showerror("Atención", "Por favor escriba la dirección del video")
             return
         
@@ -707,7 +655,7 @@ class YouTubeMusicDownloader:
         
         # Verificar configuración de playlist
         single_video = True
-        if self.detect_playlist(url):
+        if any(self.detect_playlist(url) for url in urls):
             if not self.allow_playlists.get():
                 # Mostrar advertencia y preguntar
                 response = messagebox.askyesno(
@@ -731,255 +679,327 @@ class YouTubeMusicDownloader:
                 if not response:
                     return
         
-        # Iniciar descarga en hilo separado
-        thread = threading.Thread(target=self.download_audio, args=(url, single_video))
+        self.url_entry.delete(0, tk.END)
+        
+        # Lo escrito a mano pasa delante de las listas importadas
+        self.start_enqueue(urls, single_video, PRIORITY_HIGH)
+    
+    def import_url_file(self):
+        """Encola los enlaces de un archivo de texto o CSV"""
+        path = filedialog.askopenfilename(
+            title="Importar lista de enlaces",
+            filetypes=[("Listas de enlaces", "*.txt *.csv *.tsv"), ("Todos los archivos", "*.*")],
+        )
+        if not path:
+            return
+        
+        if not os.path.exists(self.download_path.get()):
+            messagebox.showerror("Atención", "La carpeta seleccionada no existe")
+            return
+        
+        def load():
+            # En segundo plano solo la lectura; el resto vuelve al hilo de Tk
+            try:
+                urls = read_url_file(path)
+            except OSError as e:
+                self.progress_bus.call(messagebox.showerror, "Error",
+                                       f"No se pudo leer la lista:\n\n{e}")
+                self.progress_bus.call(self.update_status, "Listo")
+                return
+            self.progress_bus.call(self.on_url_file_loaded, urls)
+        
+        self.update_status("Leyendo la lista de enlaces...")
+        threading.Thread(target=load, daemon=True).start()
+    
+    def on_url_file_loaded(self, urls):
+        """Encola la lista ya leída (en el hilo de Tk, vía progress_bus)"""
+        if not urls:
+            self.update_status("Listo")
+            messagebox.showerror("Atención", "El archivo no contiene enlaces")
+            return
+        self.start_enqueue(urls, not self.allow_playlists.get())
+    
+    def paste_urls(self):
+        """Encola todos los enlaces del texto copiado (una lista, un correo...)"""
+        try:
+            text = self.root.clipboard_get()
+        except tk.TclError:
+            text = ""
+        urls = extract_urls(text)
+        if not urls:
+            messagebox.showerror("Atención", "No hay enlaces en el texto copiado")
+            return
+        
+        if not os.path.exists(self.download_path.get()):
+            messagebox.showerror("Atención", "La carpeta seleccionada no existe")
+            return
+        
+        self.start_enqueue(urls, not self.allow_playlists.get())
+    
+    def start_enqueue(self, urls, single_video=True, priority=PRIORITY_NORMAL):
+        """
+        Lee las opciones de la interfaz (hilo de Tk) y encola en segundo
+        plano: con listas grandes guardar en la cola persistente tarda.
+        """
+        download_format = self.download_format.get()
+        
+        # Sin FFmpeg no se puede convertir a MP3: preguntar antes de descargar
+        if download_format == 'mp3' and self.use_conversion.get():
+            if not self.engine.resolve_ffmpeg():
+                self.update_status("FFmpeg no encontrado")
+                response = messagebox.askyesno("FFmpeg no encontrado", 
+                    "FFmpeg no está instalado.\n\n" +
+                    "¿Quieres descargar sin conversión a MP3?\n" +
+                    "(Se descargará en formato original)")
+                
+                if response:
+                    self.use_conversion.set(False)
+                else:
+                    self.update_status("Descarga cancelada")
+                    return
+        
+        options = {
+            'output_dir': self.download_path.get(),
+            'download_format': download_format,
+            'convert': self.use_conversion.get(),
+            'single_video': single_video,
+            'audio_profile': 'moderno' if self.fast_audio.get() else None,
+        }
+        thread = threading.Thread(target=self.enqueue_downloads,
+                                  args=(urls, options, priority))
         thread.daemon = True
         thread.start()
     
-    def download_audio(self, url, single_video=True):
+    def enqueue_downloads(self, urls, options, priority=PRIORITY_NORMAL):
+        """
+        Guarda los trabajos en la cola persistente y arranca los que quepan.
+        Se ejecuta fuera del hilo de Tk: el estado y los errores vuelven por
+        progress_bus.
+        """
         try:
-            self.download_btn.config(state=tk.DISABLED)
-            self.reset_progress_info()
-            self.progress.start()
-            
-            # Obtener formato seleccionado
-            download_format = self.download_format.get()
-            
-            if download_format == 'mp4':
-                self.update_status("🔍 Obteniendo información del video...")
-            else:
-                self.update_status("🔍 Obteniendo información del audio...")
-            
-            # Configuración base de yt-dlp
-            ydl_opts = {
-                'outtmpl': os.path.join(self.download_path.get(), '%(title)s.%(ext)s'),
-                'progress_hooks': [self.progress_hook],
-                'noplaylist': single_video,
-                'extract_flat': False,
-                'writeinfojson': False,
-                'writedescription': False,
-                'writethumbnail': False,
-                'writesubtitles': False,
-                'ignoreerrors': True,
-            }
+            summary = self.store.add(urls, priority=priority, **options)
+            self.queue.refill()
             
-            if not single_video:
-                ydl_opts['outtmpl'] = os.path.join(self.download_path.get(), '%(playlist_index)02d - %(title)s.%(ext)s')
-                ydl_opts['playlistend'] = 50
-                self.update_status("⚠️ Modo playlist: Se descargarán máximo 50 videos")
-            else:
-                if download_format == 'mp4':
-                    self.update_status("🎯 Modo video individual: Descarga rápida")
-                else:
-                    self.update_status("🎯 Modo audio individual: Descarga rápida")
+            status = f"📥 {summary['added']} descarga(s) agregada(s) a la cola"
+            if summary['duplicates']:
+                status += f" ({summary['duplicates']} repetida(s) omitida(s))"
+            self.progress_bus.call(self.update_status, status)
+        except Exception as e:
+            self.progress_bus.call(messagebox.showerror, "Error",
+                                   f"Error agregando descargas: {str(e)}")
+    
+    def on_jobs_update(self, jobs):
+        """Dibuja los trabajos que cambiaron (en el hilo de Tk, vía progress_bus)"""
+        for job in jobs:
+            self.on_job_update(job)
+        # La cola solo conserva los últimos terminados: quitar sus filas
+        rows = self.jobs_tree.get_children()
+        if len(rows) > len(self.queue.jobs):
+            live = {str(job.id) for job in list(self.queue.jobs)}
+            self.jobs_tree.delete(*[iid for iid in rows if iid not in live])
+        self.update_overall_progress()
+    
+    def on_job_update(self, job):
+        """Actualiza la fila del trabajo"""
+        iid = str(job.id)
+        name = job.url
+        if job.result and job.result.get('title'):
+            name = job.result['title']
+        message = job.message
+        speed = self.progress_bus.speed(job)
+        if job.status == 'running' and speed:
+            message += f" · {self.format_speed(speed)}"
+            eta = self.progress_bus.eta(job)
+            if eta is not None:
+                message += f" · {self.format_duration(max(1, round(eta)))}"
+        values = (name, message[:60], f"{job.percent:.0f}")
+        
+        if self.jobs_tree.exists(iid):
+            self.jobs_tree.item(iid, values=values)
+        else:
+            self.jobs_tree.insert('', tk.END, iid=iid, values=values)
+            self.jobs_tree.see(iid)
+        
+        if job.status == DONE and job.result.get('title'):
+            result = job.result
+            info_text = f"Título: {result['title']}\n"
+            info_text += f"Duración: {self.format_duration(result.get('duration'))}\n"
+            info_text += f"Canal: {result.get('uploader', 'Desconocido')}\n"
             
-            # Configurar según formato seleccionado
-            if download_format == 'mp4':
-                # Configuración para descargar VIDEO (MP4)
-                ydl_opts['format'] = 'bestvideo[ext=mp4]+bestaudio[ext=m4a]/best[ext=mp4]/best'
-                self.update_status("📹 Preparando descarga de video MP4...")
-                
-                # Para MP4, usar ffmpeg para combinar video y audio si es necesario
-                ffmpeg_path = self.get_ffmpeg_path()
-                if ffmpeg_path:
-                    ffmpeg_full_path, ffprobe_full_path = self.get_ffmpeg_and_ffprobe_paths()
-                    if ffmpeg_full_path and 'imageio_ffmpeg' in ffmpeg_full_path:
-                        ydl_opts['ffmpeg_location'] = os.path.dirname(ffmpeg_full_path)
-                        os.environ['FFMPEG_BINARY'] = ffmpeg_full_path
-                        if ffprobe_full_path:
-                            os.environ['FFPROBE_BINARY'] = ffprobe_full_path
-                    elif ffmpeg_path != 'ffmpeg':
-                        ffmpeg_dir = os.path.dirname(ffmpeg_path)
-                        ydl_opts['ffmpeg_location'] = ffmpeg_dir
-                else:
-                    # Si no hay FFmpeg, descargar el mejor formato único disponible
-                    ydl_opts['format'] = 'best[ext=mp4]/best'
-                    
+            if job.download_format == 'mp4':
+                info_text += f"Formato: Video MP4"
+            elif job.audio_profile and result.get('output_path'):
+                extension = os.path.splitext(result['output_path'])[1].lstrip('.').upper()
+                info_text += f"Formato: Audio {extension} (sin recodificar)"
             else:
-                # Configuración para descargar AUDIO (MP3)
-                ydl_opts['format'] = 'bestaudio/best'
-                
-                if self.use_conversion.get():
-                    ffmpeg_path = self.get_ffmpeg_path()
-                    
-                    if ffmpeg_path:
-                        self.update_status(f"Usando FFmpeg: {os.path.basename(ffmpeg_path)}")
-                        
-                        ffmpeg_full_path, ffprobe_full_path = self.get_ffmpeg_and_ffprobe_paths()
-                        
-                        if ffmpeg_full_path and 'imageio_ffmpeg' in ffmpeg_full_path:
-                            self.update_status("Configurando imageio-ffmpeg...")
-                            ydl_opts['ffmpeg_location'] = os.path.dirname(ffmpeg_full_path)
-                            os.environ['FFMPEG_BINARY'] = ffmpeg_full_path
-                            if ffprobe_full_path:
-                                os.environ['FFPROBE_BINARY'] = ffprobe_full_path
-                                
-                        elif ffmpeg_path != 'ffmpeg':
-                            ffmpeg_dir = os.path.dirname(ffmpeg_path)
-                            ydl_opts['ffmpeg_location'] = ffmpeg_dir
-                        
-                        # Configurar postprocessor para MP3
-                        ydl_opts['postprocessors'] = [{
-                            'key': 'FFmpegExtractAudio',
-                            'preferredcodec': 'mp3',
-                            'preferredquality': '192',
-                        }]
-                        
-                        ydl_opts['format'] = 'bestaudio[ext=m4a]/bestaudio/best'
-                        
-                        print(f"DEBUG: FFmpeg path: {ffmpeg_path}")
-                        print(f"DEBUG: FFmpeg full path: {ffmpeg_full_path}")
-                        print(f"DEBUG: FFprobe full path: {ffprobe_full_path}")
-                        print(f"DEBUG: ffmpeg_location: {ydl_opts.get('ffmpeg_location', 'No configurado')}")
-                        print(f"DEBUG: FFMPEG_BINARY env: {os.environ.get('FFMPEG_BINARY', 'No configurado')}")
-                        
-                    else:
-                        self.update_status("FFmpeg no encontrado")
-                        response = messagebox.askyesno("FFmpeg no encontrado", 
-                            "FFmpeg no está instalado.\n\n" +
-                            "¿Quieres descargar sin conversión a MP3?\n" +
-                            "(Se descargará en formato original)")
-                        
-                        if response:
-                            self.use_conversion.set(False)
-                        else:
-                            self.update_status("Descarga cancelada")
-                            return
-            
-            # Configurar FFmpeg en variables de entorno si es necesario
-            ffmpeg_full_path, ffprobe_full_path = self.get_ffmpeg_and_ffprobe_paths()
-            original_env = {}
-            
-            if ffmpeg_full_path and 'imageio_ffmpeg' in ffmpeg_full_path:
-                # Guardar variables originales
-                original_env['PATH'] = os.environ.get('PATH', '')
-                
-                # Agregar directorio de imageio-ffmpeg al PATH temporalmente
-                ffmpeg_dir = os.path.dirname(ffmpeg_full_path)
-                os.environ['PATH'] = ffmpeg_dir + os.pathsep + os.environ.get('PATH', '')
-                
-                # Crear enlaces simbólicos temporales con nombres estándar
-                standard_ffmpeg = os.path.join(ffmpeg_dir, 'ffmpeg.exe')
-                standard_ffprobe = os.path.join(ffmpeg_dir, 'ffprobe.exe')
-                
-                try:
-                    if not os.path.exists(standard_ffmpeg):
-                        shutil.copy2(ffmpeg_full_path, standard_ffmpeg)
-                    
-                    if ffprobe_full_path and not os.path.exists(standard_ffprobe):
-                        if os.path.exists(ffprobe_full_path):
-                            shutil.copy2(ffprobe_full_path, standard_ffprobe)
-                except Exception as e:
-                    print(f"Error creando copias de FFmpeg: {e}")
-            
-            # Descargar el video/audio con yt-dlp
-            try:
-                with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                    if download_format == 'mp4':
-                        self.update_status("📥 Descargando video...")
-                    else:
-                        self.update_status("📥 Descargando audio...")
-                    
-                    info = ydl.extract_info(url, download=True)
-                    
-                    # Obtener información del archivo descargado
-                    if info:
-                        title = info.get('title', 'Desconocido')
-                        duration = info.get('duration', 0)
-                        uploader = info.get('uploader', 'Desconocido')
-                        
-                        info_text = f"Título: {title}\n"
-                        info_text += f"Duración: {self.format_duration(duration)}\n"
-                        info_text += f"Canal: {uploader}\n"
-                        
-                        if download_format == 'mp4':
-                            info_text += f"Formato: Video MP4"
-                        else:
-                            info_text += f"Formato: Audio MP3"
-                        
-                        self.update_info(info_text)
-            finally:
-                # Restaurar variables de entorno
-                if original_env:
-                    if 'PATH' in original_env:
-                        os.environ['PATH'] = original_env['PATH']
-            
-            self.progress['value'] = 100
-            self.percent_label.config(text="¡Completado!")
-            
-            self.update_status("¡Descarga completada!")
+                info_text += f"Formato: Audio MP3"
             
+            self.update_info(info_text)
+    
+    def update_overall_progress(self):
+        """Progreso total: terminadas (contadores de la cola) y en curso"""
+        active = [job for job in list(self.queue.jobs)
+                  if job.status not in (DONE, FAILED, 'cancelled')]
+        finished = self.queue.done_count + self.queue.failed_count
+        total = finished + len(active)
+        if not total:
+            return
+        total_percent = 100.0 * finished + sum(job.percent for job in active)
+        self.progress.configure(mode='determinate')
+        self.progress['value'] = total_percent / total
+        
+        speed = self.progress_bus.total_speed()
+        self.download_speed.set(self.format_speed(speed) if speed else "")
+        remaining = [self.progress_bus.eta(job) for job in active if job.status == 'running']
+        remaining = [eta for eta in remaining if eta is not None]
+        self.eta.set(self.format_duration(max(1, round(max(remaining)))) if remaining else "")
+        
+        text = f"{finished} de {total} completadas"
+        if len(self.store):
+            text += f" · {len(self.store)} en espera"
+        if self.download_speed.get():
+            text += f" · {self.download_speed.get()}"
+        if self.eta.get():
+            text += f" · quedan {self.eta.get()}"
+        self.percent_label.config(text=text)
+    
+    def on_queue_idle(self, finished_jobs, completed):
+        """Se llama (en el hilo de Tk) cuando la cola termina los trabajos pendientes"""
+        ok = [job for job in finished_jobs if job.status == DONE]
+        failed = [job for job in finished_jobs if job.status == FAILED]
+        
+        if failed:
+            self.update_status(f"Terminado con errores: {len(failed)} fallida(s)")
+            self.handle_failed_jobs(failed)
+            return
+        
+        self.update_status("¡Descarga completada!")
+        folder = self.download_path.get()
+        if completed == 1 and ok:
             # Mensaje personalizado según el formato
-            if download_format == 'mp4':
-                messagebox.showinfo("¡Listo!", f"Su video se descargó correctamente.\n\nLo puede encontrar en:\n{self.download_path.get()}")
+            if ok[0].download_format == 'mp4':
+                messagebox.showinfo("¡Listo!", f"Su video se descargó correctamente.\n\nLo puede encontrar en:\n{folder}")
             else:
-                messagebox.showinfo("¡Listo!", f"Su música se descargó correctamente.\n\nLa puede encontrar en:\n{self.download_path.get()}")
-            
-        except Exception as e:
-            error_msg = str(e)
-
-            # Manejo específico de errores de FFmpeg
-            if "ffmpeg" in error_msg.lower() or "ffprobe" in error_msg.lower():
-                self.update_status("Error: FFmpeg no encontrado")
-                response = messagebox.askyesno("Error FFmpeg",
-                    "FFmpeg no está instalado o no se encuentra.\n\n"
-                    "¿Quieres descargar sin conversión a MP3?\n"
-                    "(Se descargará en formato original)")
+                messagebox.showinfo("¡Listo!", f"Su música se descargó correctamente.\n\nLa puede encontrar en:\n{folder}")
+        else:
+            messagebox.showinfo("¡Listo!", f"Se completaron {completed} descargas.\n\nLas puede encontrar en:\n{folder}")
+    
+    def offer_resume(self):
+        """Ofrece retomar las descargas que no terminaron la última vez"""
+        jobs = self.journal.unfinished()
+        if not jobs:
+            self.offer_backlog()
+            return
+        
+        response = messagebox.askyesno("Descargas sin terminar",
+            f"Hay {len(jobs)} descarga(s) que no terminaron la última vez.\n\n" +
+            "¿Quieres continuarlas?\n" +
+            "(Se retoman desde donde quedaron)")
+        
+        if response:
+            for job in jobs:
+                self.queue.add(job)
+            self.update_status(f"↻ {len(jobs)} descarga(s) retomada(s)")
+        else:
+            # Borrar los archivos a medias para que no se acumulen
+            self.journal.discard(jobs)
+        self.offer_backlog()
+    
+    def offer_backlog(self):
+        """Ofrece seguir con los enlaces que quedaron en la cola persistente"""
+        waiting = len(self.store)
+        if not waiting:
+            return
+        
+        response = messagebox.askyesno("Descargas en cola",
+            f"Quedan {waiting} enlace(s) en la cola de la última vez.\n\n" +
+            "¿Quieres descargarlos ahora?\n" +
+            "(Si responde No, se guardan y siguen con la próxima descarga)")
+        
+        if response:
+            self.queue.refill()
+            self.update_status(f"↻ {waiting} descarga(s) en cola")
+        else:
+            self.update_status(f"{waiting} enlace(s) guardado(s) en la cola")
+    
+    def clear_backlog(self):
+        """Vacía la cola guardada (los enlaces que aún no empezaron)"""
+        waiting = len(self.store)
+        if not waiting:
+            messagebox.showinfo("Cola vacía", "No hay enlaces esperando en la cola")
+            return
+        
+        response = messagebox.askyesno("Vaciar cola",
+            f"Se quitarán {waiting} enlace(s) que aún no empezaron.\n\n" +
+            "Las descargas en curso continúan.\n\n" +
+            "¿Vaciar la cola?",
+            icon='warning', default='no')
+        if response:
+            self.store.clear()
+            self.update_status(f"Cola vaciada ({waiting} enlace(s) quitado(s))")
+            self.update_overall_progress()
+    
+    def requeue(self, jobs, convert=None):
+        """Vuelve a poner en la cola trabajos fallidos"""
+        for old_job in jobs:
+            job = DownloadJob(
+                old_job.url,
+                old_job.output_dir,
+                download_format=old_job.download_format,
+                convert=old_job.convert if convert is None else convert,
+                single_video=old_job.single_video,
+                audio_profile=old_job.audio_profile,
+            )
+            self.queue.add(job)
+    
+    def handle_failed_jobs(self, failed):
+        """Muestra los errores de las descargas y ofrece la solución adecuada"""
+        ffmpeg_failed = [job for job in failed if job.result.get("error_kind") == "ffmpeg"]
+        extraction_failed = [job for job in failed if job.result.get("error_kind") == "extraction"]
+        other_failed = [job for job in failed
+                        if job not in ffmpeg_failed and job not in extraction_failed]
 
-                if response:
-                    self.use_conversion.set(False)
-                    self.download_audio(url)
-                    return
-                else:
-                    messagebox.showinfo("Instalación FFmpeg",
-                        "Para instalar FFmpeg:\n\n"
-                        "1. Haz clic en 'Instalar FFmpeg'\n"
-                        "2. O descarga desde: https://ffmpeg.org/download.html\n"
-                        "3. Agrega FFmpeg al PATH del sistema")
+        # Manejo específico de errores de FFmpeg
+        if ffmpeg_failed:
+            response = messagebox.askyesno("Error FFmpeg",
+                "FFmpeg no está instalado o no se encuentra.\n\n"
+                "¿Quieres descargar sin conversión a MP3?\n"
+                "(Se descargará en formato original)")
 
-            # Errores comunes de yt-dlp (video no disponible, extractor roto, etc.)
-            elif any(kw in error_msg.lower() for kw in [
-                "unable to extract", "video unavailable", "sign in",
-                "http error", "urlopen error", "blocked",
-                "no video formats", "unsupported url",
-                "this video is not available", "private video",
-            ]):
-                self.update_status("Error de extracción")
-                should_update = messagebox.askyesno(
-                    "Error de descarga",
-                    f"No se pudo descargar el video.\n\n"
-                    f"Error: {error_msg[:200]}\n\n"
-                    f"Esto suele ocurrir cuando yt-dlp necesita actualizarse\n"
-                    f"porque YouTube cambió su sistema.\n\n"
-                    f"¿Actualizar yt-dlp e intentar de nuevo?"
-                )
-                if should_update and YtDlpUpdater:
-                    self.update_status("⬆ Actualizando yt-dlp...")
-                    result = YtDlpUpdater.update(
-                        progress_callback=lambda msg: self.update_status(msg)
-                    )
-                    if result["success"]:
-                        messagebox.showinfo(
-                            "yt-dlp Actualizado",
-                            f"yt-dlp actualizado a {result['new_version']}.\n"
-                            f"Reintentando descarga...",
-                        )
-                        self.version_label.config(
-                            text=f"App v{CURRENT_VERSION}  |  yt-dlp {result['new_version']}"
-                        )
-                        # Reintentar descarga
-                        self.download_audio(url, single_video)
-                        return
-                    else:
-                        messagebox.showerror("Error",
-                            f"No se pudo actualizar yt-dlp:\n{result.get('error', '')}")
+            if response:
+                self.use_conversion.set(False)
+                self.requeue(ffmpeg_failed, convert=False)
             else:
-                self.update_status("Error en la descarga")
-                messagebox.showerror("Error", f"Error durante la descarga: {error_msg}")
+                messagebox.showinfo("Instalación FFmpeg",
+                    "Para instalar FFmpeg:\n\n"
+                    "1. Haz clic en 'Instalar FFmpeg'\n"
+                    "2. O descarga desde: https://ffmpeg.org/download.html\n"
+                    "3. Agrega FFmpeg al PATH del sistema")
 
-        finally:
-            self.progress.stop()
-            self.download_btn.config(state=tk.NORMAL)
+        # Errores comunes de yt-dlp (video no disponible, extractor roto, etc.)
+        if extraction_failed:
+            error_msg = extraction_failed[0].result.get("error", "")
+            should_update = messagebox.askyesno(
+                "Error de descarga",
+                f"No se pudieron descargar {len(extraction_failed)} video(s).\n\n"
+                f"Error: {error_msg[:200]}\n\n"
+                f"Esto suele ocurrir cuando yt-dlp necesita actualizarse\n"
+                f"porque YouTube cambió su sistema.\n\n"
+                f"¿Actualizar yt-dlp e intentar de nuevo?"
+            )
+            if should_update and YtDlpUpdater:
+                # En segundo plano; al activarse la nueva versión se reintenta
+                self.update_ytdlp_ui(retry_jobs=extraction_failed)
+
+        if other_failed:
+            errors = "\n".join(f"- {job.url}: {job.result.get('error', '')[:120]}"
+                               for job in other_failed[:5])
+            messagebox.showerror("Error", f"Error durante la descarga:\n\n{errors}")
+    
+    def format_speed(self, bytes_per_second):
+        if bytes_per_second >= 1024 * 1024:
+            return f"{bytes_per_second / (1024 * 1024):.1f} MB/s"
+        return f"{bytes_per_second / 1024:.0f} KB/s"
     
     def format_duration(self, seconds):
         if not seconds:
@@ -1026,8 +1046,16 @@ class YouTubeMusicDownloader:
     # ----------------------------------------------------------
     # Auto-update yt-dlp
     # ----------------------------------------------------------
-    def update_ytdlp_ui(self):
-        """Actualiza yt-dlp desde la interfaz"""
+    def update_ytdlp_ui(self, retry_jobs=None):
+        """
+        Actualiza yt-dlp desde la interfaz (en segundo plano).
+
+        La nueva versión se prepara junto a la actual y se activa al
+        terminar: las descargas en marcha siguen con la anterior.
+
+        Args:
+            retry_jobs: trabajos fallidos que se reintentan con la nueva versión
+        """
         if not YtDlpUpdater:
             messagebox.showinfo("No disponible", "El módulo de actualización no está configurado")
             return
@@ -1039,10 +1067,13 @@ class YouTubeMusicDownloader:
                     progress_callback=lambda msg: self.update_status(msg)
                 )
                 if result["success"]:
+                    if retry_jobs:
+                        self.requeue(retry_jobs)
                     msg = (
                         f"✅ yt-dlp actualizado\n\n"
                         f"Anterior: {result['old_version']}\n"
                         f"Nueva:    {result['new_version']}"
+                        + (f"\n\nReintentando {len(retry_jobs)} descarga(s)..." if retry_jobs else "")
                     )
                     messagebox.showinfo("yt-dlp Actualizado", msg)
                     # Actualizar label
@@ -1063,17 +1094,21 @@ class YouTubeMusicDownloader:
     # ----------------------------------------------------------
     def _startup_update_check(self):
         """Ejecuta verificaciones de actualización en segundo plano al iniciar la app"""
+        if not startup_check_due():
+            return  # Ya se verificó hace poco (el botón manual sigue disponible)
+        record_startup_check()
+        
         def check():
             try:
-                # 1. Verificar si yt-dlp necesita actualización
-                if YtDlpUpdater and YtDlpUpdater.needs_update():
-                    installed = YtDlpUpdater.get_installed_version()
-                    latest = YtDlpUpdater.get_latest_version()
+                # 1. Verificar si yt-dlp necesita actualización (una sola consulta)
+                #    y dejarla preparada antes de preguntar: activarla es inmediato
+                ytdlp = YtDlpUpdater.check() if YtDlpUpdater else {}
+                if ytdlp.get("available") and YtDlpUpdater.stage(ytdlp["latest"])["success"]:
                     response = messagebox.askyesno(
                         "⬆ Actualización de yt-dlp",
-                        f"Hay una nueva versión de yt-dlp disponible.\n\n"
-                        f"Instalada: {installed}\n"
-                        f"Disponible: {latest}\n\n"
+                        f"Hay una nueva versión de yt-dlp lista para usar.\n\n"
+                        f"Instalada: {ytdlp['installed']}\n"
+                        f"Disponible: {ytdlp['latest']}\n\n"
                         f"yt-dlp es el motor de descarga. Actualizarlo\n"
                         f"corrige problemas de descarga de YouTube.\n\n"
                         f"¿Actualizar ahora?"
@@ -1113,8 +1148,9 @@ class YouTubeMusicDownloader:
             try:
                 self.update_status("🔍 Verificando actualizaciones...")
 
+                # Botón manual: revalidar siempre (un 304 no descarga nada)
                 checker = UpdateChecker(REPO_OWNER, REPO_NAME, CURRENT_VERSION)
-                update_info = checker.check_for_updates()
+                update_info = checker.check_for_updates(force=True)
 
                 if update_info.get('error'):
                     messagebox.showerror("Error",
@@ -1167,8 +1203,8 @@ class YouTubeMusicDownloader:
                 self.update_status(f"📥 Descargando: {size_mb:.1f} / {total_mb:.1f} MB ({percent:.0f}%)")
                 self.root.update_idletasks()
             
-            # Descargar actualización
-            update_file = checker.download_update(download_url, progress_callback)
+            # Descargar actualización (parche si lo hay; retoma una descarga a medias)
+            update_file = checker.fetch_update(update_info, progress_callback)
             
             if update_file:
                 self.progress['value'] = 100
@@ -1215,10 +1251,11 @@ class YouTubeMusicDownloader:
             self.progress.configure(mode='indeterminate')
 
 def main():
-    # Limpiar exe antiguo de una actualización previa
+    # Limpiar exe antiguo y terminar una actualización interrumpida
     if UPDATER_AVAILABLE:
         try:
             UpdateChecker.cleanup_old_exe()
+            finish_pending_source_update()
         except Exception:
             pass
 
@@ -1230,8 +1267,13 @@ def main():
     except:
         pass  # Si no existe el icono, continuar sin él
     
-    app = YouTubeMusicDownloader(root)
-    root.mainloop()
+    # DESCARGADOR_TRACE=traza.json (y DESCARGADOR_PROFILE=1) para medir la sesión
+    with TraceSession.from_env():
+        app = YouTubeMusicDownloader(root)
+        startup.mark("interfaz construida")
+        # Se ejecuta cuando Tk terminó de dibujar la ventana por primera vez
+        root.after_idle(app.on_first_frame)
+        root.mainloop()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
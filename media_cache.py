@@ -0,0 +1,235 @@
+"""
+Caché de Medios
+===============
+Guarda los flujos descargados (sin convertir) por extractor + ID del video +
+ID del formato, para no volver a bajarlos:
+
+- Pedir un video como MP3 y luego como MP4 reutiliza el audio ya bajado
+- Dos pedidos iguales a la vez hacen una sola descarga (el segundo espera
+  al primero)
+
+El tamaño total está limitado; al superarlo se borran los flujos usados
+hace más tiempo (LRU). Los archivos se entregan con un enlace duro cuando
+es posible, así el archivo de salida no ocupa espacio adicional.
+"""
+
+import atexit
+import hashlib
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import Future
+
+from app_data import get_data_dir, load_json, save_json
+
+
+CACHE_DIR = "media_cache"
+INDEX_FILE = "index.json"
+
+DEFAULT_MAX_BYTES = 2 * 1024 * 1024 * 1024  # 2 GB
+
+# Temporales de descargas interrumpidas que se pueden borrar al iniciar
+STALE_TEMP_SECONDS = 24 * 3600
+
+# Los aciertos solo cambian 'last_used': el índice se reescribe como mucho
+# cada tantos segundos por ellos (y siempre al guardar o borrar flujos)
+INDEX_SAVE_INTERVAL = 30
+
+
+def link_or_copy(source, target):
+    """Enlace duro si es posible (mismo disco); si no, copia el archivo"""
+    if os.path.lexists(target):
+        os.remove(target)
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copyfile(source, target)
+
+
+class MediaCache:
+    """Caché LRU de flujos descargados con descargas únicas en curso"""
+
+    def __init__(self, path=None, max_bytes=DEFAULT_MAX_BYTES):
+        """
+        Args:
+            path: carpeta de la caché (por defecto en la carpeta de datos)
+            max_bytes: tamaño máximo total antes de borrar los más antiguos
+        """
+        self.path = path or str(get_data_dir() / CACHE_DIR)
+        self.max_bytes = max_bytes
+        self._index_path = os.path.join(self.path, INDEX_FILE)
+        self._lock = threading.Lock()
+        self._inflight = {}  # clave -> Future con la ruta en caché
+        self._dirty = False  # Hay 'last_used' sin guardar
+        self._saved_at = time.monotonic()
+        os.makedirs(self.path, exist_ok=True)
+        self._entries = self._load_index()
+        atexit.register(self.flush)
+
+    # ----------------------------------------------------------
+    # API pública
+    # ----------------------------------------------------------
+    @staticmethod
+    def key(extractor, video_id, format_id):
+        """Clave de un flujo: hash de extractor, ID del video y ID del formato"""
+        raw = f"{(extractor or 'generic').lower()}:{video_id}:{format_id}"
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """Ruta del flujo en caché (y lo marca como usado) o None"""
+        with self._lock:
+            return self._lookup(key)
+
+    def fetch(self, key, ext, download):
+        """
+        Retorna el flujo de la caché o lo descarga una sola vez.
+
+        Si otro hilo ya está descargando la misma clave, espera a que termine
+        en lugar de repetir la descarga.
+
+        Args:
+            key: clave de MediaCache.key()
+            ext: extensión del flujo ('m4a', 'webm'...)
+            download: callable(temp_path) que descarga el flujo en temp_path
+                (lanza una excepción si falla)
+
+        Returns:
+            (path, from_cache) con from_cache False solo para quien descargó
+        """
+        with self._lock:
+            path = self._lookup(key)
+            if path:
+                return path, True
+            pending = self._inflight.get(key)
+            leader = pending is None
+            if leader:
+                pending = Future()
+                self._inflight[key] = pending
+
+        if not leader:
+            return pending.result(), True
+
+        # Nombre fijo: si la app se cierra a mitad, la próxima vez yt-dlp
+        # continúa el .part en lugar de empezar de cero
+        temp_path = os.path.join(self.path, f"{key}.tmp.{ext or 'bin'}")
+        try:
+            download(temp_path)
+            path = self._store(key, temp_path, ext)
+        except BaseException as e:
+            for leftover in (temp_path, temp_path + '.part'):
+                try:
+                    os.remove(leftover)
+                except OSError:
+                    pass
+            pending.set_exception(e)
+            raise
+        else:
+            pending.set_result(path)
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+        return path, False
+
+    def size(self):
+        """Bytes ocupados por la caché"""
+        with self._lock:
+            return sum(entry["size"] for entry in self._entries.values())
+
+    def flush(self):
+        """Guarda los usos pendientes en el índice (también al salir)"""
+        with self._lock:
+            if self._dirty:
+                self._save_index()
+
+    def clear(self):
+        """Borra todos los flujos guardados"""
+        with self._lock:
+            for key in list(self._entries):
+                self._remove(key)
+            self._save_index()
+
+    # ----------------------------------------------------------
+    # Índice y expulsión (LRU)
+    # ----------------------------------------------------------
+    def _lookup(self, key):
+        """Busca una clave (llamar con el lock tomado)"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        path = os.path.join(self.path, entry["name"])
+        if not os.path.isfile(path):
+            # Borrado por otro proceso o a mano
+            del self._entries[key]
+            self._save_index()
+            return None
+        entry["last_used"] = time.time()
+        self._dirty = True
+        if time.monotonic() - self._saved_at >= INDEX_SAVE_INTERVAL:
+            self._save_index()
+        return path
+
+    def _store(self, key, temp_path, ext):
+        """Mueve una descarga terminada a la caché y aplica el límite de tamaño"""
+        name = f"{key}.{ext or 'bin'}"
+        path = os.path.join(self.path, name)
+        os.replace(temp_path, path)
+        with self._lock:
+            self._entries[key] = {
+                "name": name,
+                "size": os.path.getsize(path),
+                "last_used": time.time(),
+            }
+            self._evict(keep=key)
+            self._save_index()
+        return path
+
+    def _evict(self, keep=None):
+        """Borra los flujos menos usados hasta quedar bajo el límite"""
+        total = sum(entry["size"] for entry in self._entries.values())
+        for key in sorted(self._entries, key=lambda k: self._entries[k]["last_used"]):
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            total -= self._entries[key]["size"]
+            self._remove(key)
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        try:
+            os.remove(os.path.join(self.path, entry["name"]))
+        except OSError:
+            pass
+
+    def _load_index(self):
+        """Lee el índice y lo reconcilia con los archivos de la carpeta"""
+        index = load_json(self._index_path, default={}) or {}
+        entries = {}
+        now = time.time()
+        for name in os.listdir(self.path):
+            full_path = os.path.join(self.path, name)
+            if name.startswith(INDEX_FILE) or not os.path.isfile(full_path):
+                continue
+            stat = os.stat(full_path)
+            if ".tmp." in name:
+                if now - stat.st_mtime > STALE_TEMP_SECONDS:
+                    os.remove(full_path)
+                continue
+            key = name.split(".")[0]
+            known = index.get(key) or {}
+            entries[key] = {
+                "name": name,
+                "size": stat.st_size,
+                "last_used": known.get("last_used", stat.st_mtime),
+            }
+        return entries
+
+    def _save_index(self):
+        """Guarda el índice (llamar con el lock tomado)"""
+        self._dirty = False
+        self._saved_at = time.monotonic()
+        try:
+            save_json(self._index_path, self._entries)
+        except OSError as e:
+            print(f"Error guardando índice de la caché: {e}")
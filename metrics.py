@@ -0,0 +1,421 @@
+"""
+Métricas de Descarga
+====================
+Mide cada trabajo (extracción, transferencia, conversión, reintentos y tipo
+de error) y acumula contadores e histogramas para detectar regresiones tras
+actualizar yt-dlp y dimensionar los equipos.
+
+Se guardan en la carpeta de datos:
+- metrics.jsonl: una línea JSON por trabajo terminado (con la versión de yt-dlp)
+- metrics.prom:  contadores e histogramas en formato de texto de Prometheus
+                 (sirve para el "textfile collector" de node_exporter)
+
+USO:
+  python -m metrics              # Resumen por versión de yt-dlp y formato
+  python -m metrics --last 200   # Solo los últimos 200 trabajos
+"""
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from app_data import get_data_dir
+
+
+LOG_FILE = "metrics.jsonl"
+PROMETHEUS_FILE = "metrics.prom"
+
+# Tamaño a partir del cual el registro se rota (se conserva un .1)
+MAX_LOG_BYTES = 5 * 1024 * 1024
+
+# Prefijo de los nombres de Prometheus
+PREFIX = "descargador"
+
+MB = 1024 * 1024
+
+# Límites superiores de los histogramas
+SECONDS_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+BYTES_BUCKETS = (1 * MB, 5 * MB, 10 * MB, 25 * MB, 50 * MB, 100 * MB, 250 * MB, 500 * MB)
+THROUGHPUT_BUCKETS = (64 * 1024, 256 * 1024, 512 * 1024, 1 * MB, 2 * MB, 5 * MB,
+                      10 * MB, 25 * MB, 50 * MB, 100 * MB)
+
+# Medida del trabajo -> (histograma de Prometheus, límites, descripción)
+HISTOGRAMS = {
+    "extract_seconds": ("extract_seconds", SECONDS_BUCKETS,
+                        "Segundos hasta tener la información del video"),
+    "download_seconds": ("download_seconds", SECONDS_BUCKETS,
+                         "Segundos transfiriendo datos"),
+    "postprocess_seconds": ("postprocess_seconds", SECONDS_BUCKETS,
+                            "Segundos de conversión y unión con FFmpeg"),
+    "job_seconds": ("job_seconds", SECONDS_BUCKETS,
+                    "Duración total del trabajo"),
+    "bytes": ("download_bytes", BYTES_BUCKETS,
+              "Bytes descargados por trabajo"),
+    "throughput": ("throughput_bytes_per_second", THROUGHPUT_BUCKETS,
+                   "Velocidad media de la transferencia"),
+}
+
+
+def ytdlp_version():
+    """
+    Versión de yt-dlp en uso (o 'desconocida'). La anota el conmutador en
+    cada descarga: aquí no se importa yt_dlp, que puede estar cambiándose.
+    """
+    from engine_versions import engine_switch
+    return engine_switch.version or "desconocida"
+
+
+class JobMeter:
+    """
+    Mide las fases de un trabajo a partir de los eventos de yt-dlp.
+
+    La extracción termina con el primer evento de progreso (o al llamar a
+    extraction_done); los bytes y el tiempo de transferencia salen de los
+    eventos 'finished' que traen 'elapsed' (los archivos ya presentes en
+    disco o en la caché no cuentan como transferencia).
+    """
+
+    def __init__(self):
+        self.start = time.monotonic()
+        self.extract_seconds = None
+        self.download_seconds = 0.0
+        self.postprocess_seconds = 0.0
+        self.bytes = 0
+        self.retries = 0
+        self._pp_started = {}
+
+    def extraction_done(self):
+        if self.extract_seconds is None:
+            self.extract_seconds = time.monotonic() - self.start
+
+    def on_progress(self, d):
+        """Hook de progreso de yt-dlp (o evento con el mismo formato)"""
+        self.extraction_done()
+        if d.get('status') == 'finished' and d.get('elapsed') is not None:
+            self.download_seconds += d['elapsed']
+            self.bytes += d.get('total_bytes') or d.get('downloaded_bytes') or 0
+
+    def on_postprocess(self, d):
+        """Hook de postprocesadores de yt-dlp ('postprocessor_hooks')"""
+        name = d.get('postprocessor')
+        if d.get('status') == 'started':
+            self._pp_started[name] = time.monotonic()
+        elif d.get('status') == 'finished' and name in self._pp_started:
+            self.postprocess_seconds += time.monotonic() - self._pp_started.pop(name)
+
+    def count_retry(self):
+        self.retries += 1
+
+    @contextmanager
+    def postprocessing(self):
+        """Suma al tiempo de conversión lo que tarde el bloque"""
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.postprocess_seconds += time.monotonic() - start
+
+    def as_dict(self):
+        return {
+            "extract_seconds": (round(self.extract_seconds, 3)
+                                if self.extract_seconds is not None else None),
+            "download_seconds": round(self.download_seconds, 3),
+            "postprocess_seconds": round(self.postprocess_seconds, 3),
+            "job_seconds": round(time.monotonic() - self.start, 3),
+            "bytes": self.bytes,
+            "throughput": (round(self.bytes / self.download_seconds)
+                           if self.bytes and self.download_seconds > 0 else None),
+            "retries": self.retries,
+        }
+
+
+class Histogram:
+    """Histograma acumulativo con límites fijos (como los de Prometheus)"""
+
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+
+    def cumulative(self):
+        """Lista de (límite, observaciones <= límite) terminada en '+Inf'"""
+        total = 0
+        rows = []
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            rows.append((bound, total))
+        rows.append(("+Inf", self.count))
+        return rows
+
+
+class MetricsRegistry:
+    """Contadores e histogramas de los trabajos terminados (seguro entre hilos)"""
+
+    def __init__(self, directory=None):
+        """
+        Args:
+            directory: carpeta de metrics.jsonl y metrics.prom (por defecto
+                la carpeta de datos)
+        """
+        directory = directory or str(get_data_dir())
+        self.log_path = os.path.join(directory, LOG_FILE)
+        self.prometheus_path = os.path.join(directory, PROMETHEUS_FILE)
+        self._lock = threading.Lock()
+        self._jobs = {}  # (formato, resultado) -> trabajos
+        self._retries = 0
+        self._bytes = 0
+        self._histograms = {}  # (medida, formato) -> Histogram
+
+    @property
+    def version(self):
+        # Se consulta en cada registro (no al crearlo, para no retrasar el
+        # arranque) y sigue a la versión activa si yt-dlp se cambia en caliente
+        return ytdlp_version()
+
+    def record(self, result):
+        """
+        Registra el resultado de un trabajo (run() o finish() del motor).
+
+        Las playlists descargadas en paralelo se registran elemento por
+        elemento.
+        """
+        entries = result.get("entries")
+        records = [self._record_for(dict(entry, format=result.get("format"),
+                                         ytdlp_version=result.get("ytdlp_version")))
+                   for entry in entries] if entries else [self._record_for(result)]
+
+        with self._lock:
+            for record in records:
+                self._add(record)
+            self._append_log(records)
+            self._write_prometheus()
+
+    def summary(self):
+        """Resumen legible de lo registrado en esta sesión"""
+        with self._lock:
+            jobs = sum(self._jobs.values())
+            failed = sum(count for (_, outcome), count in self._jobs.items()
+                         if outcome not in ("ok", "skipped"))
+            lines = [f"Trabajos: {jobs}  |  Fallidos: {failed}  |  Reintentos: {self._retries}"
+                     f"  |  Descargado: {self._bytes / MB:.1f} MB"]
+            for (measure, fmt), hist in sorted(self._histograms.items()):
+                if hist.count and measure.endswith("seconds"):
+                    lines.append(f"  {fmt} {measure}: media {hist.sum / hist.count:.2f}s "
+                                 f"({hist.count} medidas)")
+        return "\n".join(lines)
+
+    # ----------------------------------------------------------
+    # Auxiliares
+    # ----------------------------------------------------------
+    def _record_for(self, result):
+        """Línea del registro para un resultado"""
+        if result.get("skipped"):
+            outcome = "skipped"
+        elif result.get("success"):
+            outcome = "ok"
+        else:
+            outcome = result.get("error_kind") or "other"
+        record = {
+            "t": round(time.time(), 3),
+            "url": result.get("url"),
+            "format": result.get("format"),
+            "outcome": outcome,
+            "ytdlp": result.get("ytdlp_version") or self.version,
+        }
+        record.update(result.get("metrics") or {})
+        return record
+
+    def _add(self, record):
+        """Suma un trabajo a los contadores (llamar con el lock tomado)"""
+        key = (record["format"], record["outcome"])
+        self._jobs[key] = self._jobs.get(key, 0) + 1
+        self._retries += record.get("retries") or 0
+        self._bytes += record.get("bytes") or 0
+        if record["outcome"] == "skipped":
+            return
+        for measure, (_, buckets, _) in HISTOGRAMS.items():
+            value = record.get(measure)
+            if not value and measure in ("bytes", "throughput"):
+                continue  # Sin transferencia (caché o error antes de descargar)
+            if value is None:
+                continue
+            hist = self._histograms.get((measure, record["format"]))
+            if hist is None:
+                hist = self._histograms[(measure, record["format"])] = Histogram(buckets)
+            hist.observe(value)
+
+    def _append_log(self, records):
+        try:
+            if os.path.exists(self.log_path) and os.path.getsize(self.log_path) > MAX_LOG_BYTES:
+                os.replace(self.log_path, self.log_path + ".1")
+            with open(self.log_path, "a", encoding="utf-8") as f:
+                for record in records:
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        except OSError as e:
+            print(f"Error guardando métricas: {e}")
+
+    def _write_prometheus(self):
+        """Escribe metrics.prom de forma atómica (temporal + rename)"""
+        try:
+            temp_path = f"{self.prometheus_path}.tmp"
+            with open(temp_path, "w", encoding="utf-8") as f:
+                f.write(self.prometheus_text())
+            os.replace(temp_path, self.prometheus_path)
+        except OSError as e:
+            print(f"Error guardando métricas: {e}")
+
+    def prometheus_text(self):
+        """Contadores e histogramas en formato de texto de Prometheus"""
+        out = [
+            f"# HELP {PREFIX}_ytdlp_info Versión de yt-dlp en uso",
+            f"# TYPE {PREFIX}_ytdlp_info gauge",
+            f'{PREFIX}_ytdlp_info{{version="{self.version}"}} 1',
+            f"# HELP {PREFIX}_jobs_total Trabajos terminados por formato y resultado",
+            f"# TYPE {PREFIX}_jobs_total counter",
+        ]
+        for (fmt, outcome), count in sorted(self._jobs.items()):
+            out.append(f'{PREFIX}_jobs_total{{format="{fmt}",outcome="{outcome}"}} {count}')
+        out += [
+            f"# HELP {PREFIX}_retries_total Reintentos de yt-dlp",
+            f"# TYPE {PREFIX}_retries_total counter",
+            f"{PREFIX}_retries_total {self._retries}",
+            f"# HELP {PREFIX}_bytes_total Bytes transferidos",
+            f"# TYPE {PREFIX}_bytes_total counter",
+            f"{PREFIX}_bytes_total {self._bytes}",
+        ]
+        for measure, (name, _, description) in HISTOGRAMS.items():
+            series = sorted((fmt, hist) for (m, fmt), hist in self._histograms.items()
+                            if m == measure)
+            if not series:
+                continue
+            out.append(f"# HELP {PREFIX}_{name} {description}")
+            out.append(f"# TYPE {PREFIX}_{name} histogram")
+            for fmt, hist in series:
+                for bound, count in hist.cumulative():
+                    out.append(f'{PREFIX}_{name}_bucket{{format="{fmt}",le="{bound}"}} {count}')
+                out.append(f'{PREFIX}_{name}_sum{{format="{fmt}"}} {hist.sum:.3f}')
+                out.append(f'{PREFIX}_{name}_count{{format="{fmt}"}} {hist.count}')
+        return "\n".join(out) + "\n"
+
+
+# ==============================================================
+# Resumen del registro
+# ==============================================================
+def load_records(path=None, last=None):
+    """Lee metrics.jsonl (ignorando líneas dañadas)"""
+    path = path or str(get_data_dir() / LOG_FILE)
+    records = []
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    continue
+    except OSError:
+        pass
+    return records[-last:] if last else records
+
+
+def percentile(values, fraction):
+    """Percentil por el método del rango más cercano (None si no hay datos)"""
+    values = sorted(v for v in values if v is not None)
+    if not values:
+        return None
+    index = min(len(values) - 1, max(0, int(round(fraction * len(values) + 0.5)) - 1))
+    return values[index]
+
+
+def summarize(records):
+    """
+    Agrupa los trabajos por versión de yt-dlp y formato.
+
+    Returns:
+        lista de dicts con 'ytdlp', 'format', 'jobs', 'errors', 'error_rate',
+        'error_kinds', 'retries' y los percentiles p50/p90 de cada medida
+    """
+    groups = {}
+    for record in records:
+        groups.setdefault((record.get("ytdlp"), record.get("format")), []).append(record)
+
+    rows = []
+    for (version, fmt), group in sorted(groups.items(), key=lambda item: str(item[0])):
+        measured = [r for r in group if r.get("outcome") != "skipped"]
+        errors = [r for r in measured if r.get("outcome") != "ok"]
+        kinds = {}
+        for r in errors:
+            kinds[r["outcome"]] = kinds.get(r["outcome"], 0) + 1
+        row = {
+            "ytdlp": version,
+            "format": fmt,
+            "jobs": len(group),
+            "skipped": len(group) - len(measured),
+            "errors": len(errors),
+            "error_rate": len(errors) / len(measured) if measured else 0.0,
+            "error_kinds": kinds,
+            "retries": sum(r.get("retries") or 0 for r in group),
+        }
+        ok = [r for r in measured if r.get("outcome") == "ok"]
+        for measure in HISTOGRAMS:
+            values = [r.get(measure) for r in ok]
+            if measure in ("bytes", "throughput"):
+                values = [v for v in values if v]
+            row[f"{measure}_p50"] = percentile(values, 0.5)
+            row[f"{measure}_p90"] = percentile(values, 0.9)
+        rows.append(row)
+    return rows
+
+
+def _seconds(value):
+    return "-" if value is None else f"{value:.2f}s"
+
+
+def print_summary(rows):
+    if not rows:
+        print("No hay métricas registradas todavía")
+        return
+    for row in rows:
+        throughput = row["throughput_p50"]
+        print(f"yt-dlp {row['ytdlp']} · {row['format']}: {row['jobs']} trabajos "
+              f"({row['skipped']} omitidos), errores {row['errors']} "
+              f"({row['error_rate']:.0%}), reintentos {row['retries']}")
+        if row["error_kinds"]:
+            kinds = ", ".join(f"{kind}: {count}" for kind, count in sorted(row["error_kinds"].items()))
+            print(f"    tipos de error: {kinds}")
+        print(f"    extracción p50 {_seconds(row['extract_seconds_p50'])} "
+              f"p90 {_seconds(row['extract_seconds_p90'])} | "
+              f"conversión p50 {_seconds(row['postprocess_seconds_p50'])} "
+              f"p90 {_seconds(row['postprocess_seconds_p90'])} | "
+              f"total p50 {_seconds(row['job_seconds_p50'])} "
+              f"p90 {_seconds(row['job_seconds_p90'])}")
+        if throughput:
+            print(f"    velocidad p50 {throughput / MB:.2f} MB/s")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(prog="metrics",
+                                     description="Resumen de las métricas de descarga")
+    parser.add_argument("--last", type=int, default=None,
+                        help="Solo los últimos N trabajos")
+    parser.add_argument("--json", action="store_true",
+                        help="Mostrar el resumen como JSON")
+    args = parser.parse_args()
+
+    summary = summarize(load_records(last=args.last))
+    if args.json:
+        print(json.dumps(summary, indent=2, ensure_ascii=False))
+    else:
+        print_summary(summary)
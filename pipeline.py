@@ -0,0 +1,337 @@
+"""
+Pipeline Descarga → Conversión
+==============================
+Separa la conversión a MP3 de la descarga para que red y CPU trabajen a la vez.
+
+Los hilos de descarga entregan el archivo original a una cola limitada; un
+grupo de procesos FFmpeg (uno por núcleo) lo convierte. Si la cola está
+llena, la descarga espera (contrapresión) en lugar de acumular archivos.
+
+Cada etapa lleva sus tiempos:
+- busy: tiempo trabajando
+- starved: tiempo esperando trabajo
+- blocked: tiempo esperando a que la etapa siguiente tenga sitio
+"""
+
+import os
+import queue
+import re
+import subprocess
+import threading
+import time
+from concurrent.futures import Future
+
+from tracing import tracer
+
+
+# Códecs que cada tipo de dispositivo reproduce sin recodificar ("audio rápido")
+DEVICE_PROFILES = {
+    'universal': {'mp3'},
+    'apple': {'mp3', 'aac'},
+    'moderno': {'mp3', 'aac', 'opus', 'vorbis', 'flac'},
+}
+
+# Códec de audio -> (extensión, formato de salida de FFmpeg) al remultiplexar
+REMUX_TARGETS = {
+    'aac': ('m4a', 'ipod'),
+    'opus': ('opus', 'opus'),
+    'vorbis': ('ogg', 'ogg'),
+    'mp3': ('mp3', 'mp3'),
+    'flac': ('flac', 'flac'),
+}
+
+_AUDIO_STREAM_RE = re.compile(r'Stream #\S+.*?: Audio: (\w+)')
+
+
+class StageStats:
+    """Tiempos acumulados de una etapa del pipeline (seguro entre hilos)"""
+
+    def __init__(self, name):
+        self.name = name
+        self._lock = threading.Lock()
+        self.busy = 0.0
+        self.starved = 0.0
+        self.blocked = 0.0
+        self.items = 0
+
+    def add(self, busy=0.0, starved=0.0, blocked=0.0, items=0):
+        with self._lock:
+            self.busy += busy
+            self.starved += starved
+            self.blocked += blocked
+            self.items += items
+
+    def as_dict(self):
+        with self._lock:
+            return {
+                "stage": self.name,
+                "items": self.items,
+                "busy": round(self.busy, 3),
+                "starved": round(self.starved, 3),
+                "blocked": round(self.blocked, 3),
+            }
+
+    def __str__(self):
+        d = self.as_dict()
+        return (f"{d['stage']}: {d['items']} elementos, ocupado {d['busy']:.1f}s, "
+                f"sin trabajo {d['starved']:.1f}s, bloqueado {d['blocked']:.1f}s")
+
+
+def transcode_to_mp3(ffmpeg_path, source_path, target_path, bitrate='192'):
+    """
+    Convierte un archivo de audio a MP3 con un proceso FFmpeg de un hilo.
+
+    Escribe en un archivo temporal y lo renombra al terminar; borra el
+    archivo original si la conversión fue correcta.
+
+    Raises:
+        RuntimeError si FFmpeg falla
+    """
+    temp_path = target_path + '.part'
+    cmd = [
+        ffmpeg_path, '-hide_banner', '-loglevel', 'error', '-nostdin', '-y',
+        '-i', source_path,
+        '-vn', '-map_metadata', '0',
+        '-c:a', 'libmp3lame', '-b:a', f'{bitrate}k',
+        '-threads', '1',
+        '-f', 'mp3', temp_path,
+    ]
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    if result.returncode != 0:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise RuntimeError(f"Error de FFmpeg convirtiendo a MP3: {result.stderr.strip()[:300]}")
+
+    os.replace(temp_path, target_path)
+    if os.path.abspath(source_path) != os.path.abspath(target_path):
+        try:
+            os.remove(source_path)
+        except OSError:
+            pass
+    return target_path
+
+
+def stream_transcode_to_mp3(ffmpeg_path, blocks, target_path, bitrate='192'):
+    """
+    Convierte a MP3 un audio que llega por partes, pasándolo a FFmpeg por
+    una tubería mientras se descarga. No se escribe el archivo original.
+
+    Args:
+        ffmpeg_path: ruta de FFmpeg
+        blocks: iterable de bytes con el audio (p. ej. leído de la red)
+        target_path: archivo MP3 final
+        bitrate: kbps del MP3
+
+    Raises:
+        RuntimeError si FFmpeg falla; las excepciones de blocks se propagan
+    """
+    temp_path = target_path + '.part'
+    cmd = [
+        ffmpeg_path, '-hide_banner', '-loglevel', 'error', '-nostdin', '-y',
+        '-i', 'pipe:0',
+        '-vn', '-map_metadata', '0',
+        '-c:a', 'libmp3lame', '-b:a', f'{bitrate}k',
+        '-threads', '1',
+        '-f', 'mp3', temp_path,
+    ]
+    process = subprocess.Popen(cmd, stdin=subprocess.PIPE,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    # Leer stderr aparte para que FFmpeg nunca se bloquee escribiendo en él
+    stderr = []
+    reader = threading.Thread(target=lambda: stderr.append(process.stderr.read()), daemon=True)
+    reader.start()
+
+    try:
+        for block in blocks:
+            process.stdin.write(block)
+    except BrokenPipeError:
+        pass  # FFmpeg terminó antes (error): se informa abajo
+    except BaseException:
+        process.kill()
+        process.wait()
+        _remove_quietly(temp_path)
+        raise
+    finally:
+        try:
+            process.stdin.close()
+        except OSError:
+            pass
+
+    returncode = process.wait()
+    reader.join()
+    if returncode != 0:
+        _remove_quietly(temp_path)
+        message = b''.join(stderr).decode('utf-8', 'replace').strip()[:300]
+        raise RuntimeError(f"Error de FFmpeg convirtiendo a MP3: {message}")
+
+    os.replace(temp_path, target_path)
+    return target_path
+
+
+def _remove_quietly(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def merge_streams(ffmpeg_path, streams, target_path):
+    """
+    Une flujos de video y audio en un solo archivo sin recodificar.
+
+    Args:
+        ffmpeg_path: ruta de FFmpeg
+        streams: lista de (ruta, formato) con el dict de formato de yt-dlp
+            ('vcodec'/'acodec' indican qué pista aporta cada archivo)
+        target_path: archivo final (el contenedor se deduce de la extensión)
+
+    Raises:
+        RuntimeError si FFmpeg falla
+    """
+    base, ext = os.path.splitext(target_path)
+    temp_path = f"{base}.temp{ext}"
+    cmd = [ffmpeg_path, '-hide_banner', '-loglevel', 'error', '-nostdin', '-y']
+    for path, _ in streams:
+        cmd += ['-i', path]
+    for i, (_, fmt) in enumerate(streams):
+        if fmt.get('vcodec') != 'none':
+            cmd += ['-map', f'{i}:v:0?']
+        if fmt.get('acodec') != 'none':
+            cmd += ['-map', f'{i}:a:0?']
+    cmd += ['-c', 'copy', temp_path]
+
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    if result.returncode != 0:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise RuntimeError(f"Error de FFmpeg uniendo video y audio: {result.stderr.strip()[:300]}")
+
+    os.replace(temp_path, target_path)
+    return target_path
+
+
+def probe_audio_codec(ffmpeg_path, source_path):
+    """
+    Códec de la primera pista de audio de un archivo ('aac', 'opus'...).
+
+    Returns:
+        str o None si no se pudo leer
+    """
+    try:
+        result = subprocess.run([ffmpeg_path, '-hide_banner', '-nostdin', '-i', source_path],
+                                capture_output=True, text=True, timeout=30)
+    except (subprocess.TimeoutExpired, OSError):
+        return None
+    match = _AUDIO_STREAM_RE.search(result.stderr)
+    return match.group(1) if match else None
+
+
+def remux_audio(ffmpeg_path, source_path, target_path, output_format):
+    """
+    Copia la pista de audio a otro contenedor sin recodificar.
+
+    Raises:
+        RuntimeError si FFmpeg falla
+    """
+    temp_path = target_path + '.part'
+    cmd = [
+        ffmpeg_path, '-hide_banner', '-loglevel', 'error', '-nostdin', '-y',
+        '-i', source_path,
+        '-vn', '-map', '0:a:0', '-map_metadata', '0',
+        '-c:a', 'copy',
+        '-f', output_format, temp_path,
+    ]
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    if result.returncode != 0:
+        _remove_quietly(temp_path)
+        raise RuntimeError(f"Error de FFmpeg copiando el audio: {result.stderr.strip()[:300]}")
+
+    os.replace(temp_path, target_path)
+    if os.path.abspath(source_path) != os.path.abspath(target_path):
+        _remove_quietly(source_path)
+    return target_path
+
+
+def convert_audio(ffmpeg_path, source_path, target_path, bitrate='192', profile=None):
+    """
+    Convierte un audio descargado al formato final.
+
+    Sin perfil siempre se codifica a MP3. Con un perfil de DEVICE_PROFILES
+    ("audio rápido"), si el dispositivo reproduce el códec original solo se
+    cambia de contenedor (milisegundos en lugar de segundos).
+
+    Args:
+        target_path: ruta del MP3; con remultiplexado cambia la extensión
+
+    Returns:
+        str con la ruta final
+    """
+    if profile:
+        codec = probe_audio_codec(ffmpeg_path, source_path)
+        if codec in DEVICE_PROFILES.get(profile, ()) and codec in REMUX_TARGETS:
+            ext, output_format = REMUX_TARGETS[codec]
+            remux_path = f"{os.path.splitext(target_path)[0]}.{ext}"
+            return remux_audio(ffmpeg_path, source_path, remux_path, output_format)
+    return transcode_to_mp3(ffmpeg_path, source_path, target_path, bitrate)
+
+
+class TranscodeStage:
+    """Etapa de conversión: cola limitada + un proceso FFmpeg por núcleo"""
+
+    def __init__(self, workers=None, queue_size=None):
+        self.workers = workers or os.cpu_count() or 2
+        self._queue = queue.Queue(maxsize=queue_size or self.workers * 2)
+        self._lock = threading.Lock()
+        self._started = False
+        self.stats = StageStats("conversión")
+
+    def submit(self, ffmpeg_path, source_path, target_path, bitrate='192', profile=None):
+        """
+        Encola una conversión. Bloquea si la cola está llena.
+
+        Args:
+            profile: perfil de "audio rápido" (ver convert_audio) o None
+
+        Returns:
+            (future, blocked) con un concurrent.futures.Future que resuelve
+            la ruta final del MP3 y los segundos esperados por la cola llena
+        """
+        self._ensure_started()
+        future = Future()
+        start = time.monotonic()
+        # El span de la conversión cuelga del trabajo que la pidió
+        parent = tracer.current()
+        self._queue.put((future, ffmpeg_path, source_path, target_path, bitrate, profile, parent))
+        return future, time.monotonic() - start
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        for _ in range(self.workers):
+            threading.Thread(target=self._worker, daemon=True).start()
+
+    def _worker(self):
+        while True:
+            wait_start = time.monotonic()
+            (future, ffmpeg_path, source_path, target_path, bitrate, profile,
+             parent) = self._queue.get()
+            work_start = time.monotonic()
+            try:
+                if future.set_running_or_notify_cancel():
+                    try:
+                        with tracer.span("transcode", parent=parent, file=source_path):
+                            future.set_result(convert_audio(
+                                ffmpeg_path, source_path, target_path, bitrate, profile
+                            ))
+                    except Exception as e:
+                        future.set_exception(e)
+            finally:
+                self.stats.add(busy=time.monotonic() - work_start,
+                               starved=work_start - wait_start, items=1)
+                self._queue.task_done()
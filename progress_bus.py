@@ -0,0 +1,146 @@
+"""
+Bus de Progreso
+===============
+Lleva el progreso de los hilos de descarga a la interfaz sin tocar Tk
+desde otros hilos.
+
+Los hilos solo publican el trabajo en una cola (operación barata y segura
+entre hilos). El hilo de Tk vacía la cola a ritmo fijo con root.after(),
+une los eventos del mismo trabajo en uno solo y calcula la velocidad
+(media móvil exponencial) y el tiempo restante a partir de los bytes.
+
+Otros avisos de los hilos (p. ej. la cola terminó) se encargan con call():
+corren en el hilo de Tk después de dibujar el último progreso.
+"""
+
+import queue
+import time
+
+from tracing import tracer
+
+
+# Milisegundos entre dos actualizaciones de la interfaz
+DEFAULT_INTERVAL_MS = 100
+
+# Peso de la última medida en la media móvil de velocidad (0-1)
+DEFAULT_ALPHA = 0.3
+
+
+class ProgressBus:
+    """Cola de progreso con vaciado periódico en el hilo de la interfaz"""
+
+    def __init__(self, schedule, callback, interval_ms=DEFAULT_INTERVAL_MS, alpha=DEFAULT_ALPHA):
+        """
+        Args:
+            schedule: callable(ms, func) que ejecuta func en el hilo de la
+                interfaz (root.after)
+            callback: callable(jobs) con los trabajos que cambiaron desde la
+                última vuelta (se llama en el hilo de la interfaz)
+            interval_ms: ritmo de actualización
+            alpha: suavizado de la velocidad (más alto = reacciona antes)
+        """
+        self.schedule = schedule
+        self.callback = callback
+        self.interval_ms = interval_ms
+        self.alpha = alpha
+        self._queue = queue.SimpleQueue()
+        self._calls = queue.SimpleQueue()
+        self._rates = {}  # id del trabajo -> {"bytes", "time", "speed"}
+        self._running = False
+
+    # ----------------------------------------------------------
+    # Desde cualquier hilo
+    # ----------------------------------------------------------
+    def publish(self, job):
+        """Avisa que un trabajo cambió (estado, porcentaje o bytes)"""
+        self._queue.put(job)
+
+    def call(self, func, *args):
+        """Ejecuta func(*args) en el hilo de la interfaz en la próxima vuelta"""
+        self._calls.put((func, args))
+
+    # ----------------------------------------------------------
+    # Hilo de la interfaz
+    # ----------------------------------------------------------
+    def start(self):
+        if not self._running:
+            self._running = True
+            self.schedule(self.interval_ms, self._drain)
+
+    def stop(self):
+        self._running = False
+
+    def speed(self, job):
+        """Velocidad suavizada del trabajo en bytes/s (0 si no descarga)"""
+        rate = self._rates.get(job.id)
+        return rate["speed"] if rate else 0.0
+
+    def eta(self, job):
+        """Segundos restantes estimados o None si no se pueden calcular"""
+        speed = self.speed(job)
+        total = getattr(job, "total_bytes", 0)
+        if not speed or not total:
+            return None
+        return max(0.0, (total - job.downloaded_bytes) / speed)
+
+    def total_speed(self):
+        return sum(rate["speed"] for rate in self._rates.values())
+
+    def _drain(self):
+        if not self._running:
+            return
+        changed = {}
+        while True:
+            try:
+                job = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            changed[job.id] = job  # Solo el último estado de cada trabajo
+
+        try:
+            now = time.monotonic()
+            for job in changed.values():
+                self._update_rate(job, now)
+            if changed:
+                with tracer.span("gui.progress", jobs=len(changed)):
+                    self.callback(list(changed.values()))
+        except Exception as e:
+            print(f"Error actualizando el progreso: {e}")
+        # Programar la próxima vuelta antes: un aviso puede abrir un diálogo
+        # modal y el progreso debe seguir dibujándose detrás
+        self.schedule(self.interval_ms, self._drain)
+        self._run_calls()
+
+    def _run_calls(self):
+        while True:
+            try:
+                func, args = self._calls.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                func(*args)
+            except Exception as e:
+                print(f"Error en aviso a la interfaz: {e}")
+
+    def _update_rate(self, job, now):
+        """Actualiza la media móvil de velocidad con los bytes del trabajo"""
+        downloaded = getattr(job, "downloaded_bytes", 0)
+        if job.status != "running" or not downloaded:
+            self._rates.pop(job.id, None)
+            return
+
+        rate = self._rates.get(job.id)
+        if rate is None or downloaded < rate["bytes"]:
+            # Primer dato o empezó otro archivo (p. ej. el audio tras el video)
+            self._rates[job.id] = {"bytes": downloaded, "time": now, "speed": 0.0}
+            return
+
+        elapsed = now - rate["time"]
+        if elapsed < self.interval_ms / 2000.0:
+            return
+        sample = (downloaded - rate["bytes"]) / elapsed
+        rate["speed"] = sample if not rate["speed"] else (
+            self.alpha * sample + (1 - self.alpha) * rate["speed"]
+        )
+        rate["bytes"] = downloaded
+        rate["time"] = now
@@ -0,0 +1,106 @@
+"""
+Tiempos de Arranque
+===================
+Mide cuánto tarda la ventana en aparecer y qué importaciones se llevan el
+tiempo, para que el arranque siga siendo rápido.
+
+Se importa antes que nada en main.py. Cada arranque guarda en la carpeta de
+datos (startup.json, últimos arranques) el tiempo hasta el primer dibujo y
+hasta tener yt-dlp precargado. Con DESCARGADOR_STARTUP_REPORT=1 además se
+mide cada importación y se imprime un informe:
+
+  DESCARGADOR_STARTUP_REPORT=1 python main.py
+"""
+
+import builtins
+import os
+import sys
+import threading
+import time
+
+from app_data import get_data_dir, load_json, save_json
+
+
+STARTUP_FILE = "startup.json"
+
+# Arranques que se conservan en startup.json
+HISTORY_SIZE = 20
+
+# Importaciones que se muestran en el informe
+REPORT_TOP = 25
+
+
+class StartupTimer:
+    """Marca los hitos del arranque y, si se pide, mide las importaciones"""
+
+    def __init__(self, detailed=False):
+        self.start = time.perf_counter()
+        self.detailed = detailed
+        self.marks = []  # (hito, segundos desde el inicio)
+        self.imports = []  # (módulo, segundos, profundidad, hilo principal)
+        self._original_import = None
+        self._local = threading.local()
+        if detailed:
+            self._install()
+
+    # ----------------------------------------------------------
+    # Hitos
+    # ----------------------------------------------------------
+    def mark(self, name):
+        self.marks.append((name, round(time.perf_counter() - self.start, 4)))
+
+    def finish(self):
+        """Guarda el arranque en startup.json e imprime el informe si se pidió"""
+        self._uninstall()
+        entry = {"t": round(time.time()), "marks": dict(self.marks)}
+        try:
+            path = str(get_data_dir() / STARTUP_FILE)
+            history = load_json(path, default=[]) or []
+            save_json(path, (history + [entry])[-HISTORY_SIZE:])
+        except OSError:
+            pass
+        if self.detailed:
+            print(self.report())
+
+    def report(self):
+        lines = ["Arranque:"]
+        for name, seconds in self.marks:
+            lines.append(f"  {seconds * 1000:8.1f} ms  {name}")
+        if self.imports:
+            lines.append("Importaciones más lentas (incluyen sus dependencias):")
+            top = sorted(self.imports, key=lambda item: -item[1])[:REPORT_TOP]
+            for name, seconds, depth, main_thread in top:
+                where = "" if main_thread else "  (segundo plano)"
+                lines.append(f"  {seconds * 1000:8.1f} ms  {'  ' * min(depth, 4)}{name}{where}")
+        return "\n".join(lines)
+
+    # ----------------------------------------------------------
+    # Medición de importaciones
+    # ----------------------------------------------------------
+    def _install(self):
+        self._original_import = builtins.__import__
+        builtins.__import__ = self._timed_import
+
+    def _uninstall(self):
+        if self._original_import is not None:
+            builtins.__import__ = self._original_import
+            self._original_import = None
+
+    def _timed_import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        original = self._original_import or builtins.__import__
+        if level or name in sys.modules:
+            return original(name, globals, locals, fromlist, level)
+
+        depth = getattr(self._local, "depth", 0)
+        self._local.depth = depth + 1
+        start = time.perf_counter()
+        try:
+            return original(name, globals, locals, fromlist, level)
+        finally:
+            self._local.depth = depth
+            self.imports.append((name, time.perf_counter() - start, depth,
+                                 threading.current_thread() is threading.main_thread()))
+
+
+# Un único temporizador por proceso, creado al importar este módulo
+startup = StartupTimer(detailed=os.environ.get("DESCARGADOR_STARTUP_REPORT") == "1")
@@ -0,0 +1,330 @@
+"""
+Trazas de Ejecución
+===================
+Spans por fase de cada descarga (localizar FFmpeg, extracción, transferencia,
+postprocesado, conversión), de las llamadas del actualizador y del dibujado
+del progreso en Tk, para saber en qué se fue el tiempo de una descarga lenta.
+
+Desactivado no cuesta nada: tracer.span() solo mide si se activó con
+TraceSession (batch_download --trace, o DESCARGADOR_TRACE=archivo.json en la
+ventana). Al terminar se escribe un JSON compatible con OpenTelemetry (OTLP
+JSON) que se puede abrir con Jaeger, Grafana Tempo u otel-cli.
+
+Con el perfilador (--profile o DESCARGADOR_PROFILE=1) se muestrean además las
+pilas de todos los hilos y junto a la traza quedan:
+- ARCHIVO.profile.txt: funciones con más muestras (propias y acumuladas)
+- ARCHIVO.folded:      pilas en formato "collapsed" (flamegraph.pl, speedscope)
+"""
+
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+
+# Máximo de spans guardados en memoria (los siguientes se descartan)
+MAX_SPANS = 50000
+
+# Segundos entre dos muestras del perfilador
+SAMPLE_INTERVAL = 0.005
+
+SERVICE_NAME = "descargador-musica"
+
+
+class Span:
+    """Una fase medida: nombre, padre, atributos e instantes en nanosegundos"""
+
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "start", "end",
+                 "attributes", "error")
+
+    def __init__(self, name, parent=None, attributes=None):
+        self.trace_id = parent.trace_id if parent else os.urandom(16).hex()
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent.span_id if parent else None
+        self.name = name
+        self.start = time.time_ns()
+        self.end = None
+        self.attributes = dict(attributes or {})
+        self.error = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def as_otlp(self):
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": 1,  # SPAN_KIND_INTERNAL
+            "startTimeUnixNano": str(self.start),
+            "endTimeUnixNano": str(self.end or time.time_ns()),
+            "attributes": [_otlp_attribute(k, v) for k, v in self.attributes.items()
+                           if v is not None],
+            "status": {"code": 2, "message": self.error} if self.error else {"code": 1},
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+
+def _otlp_attribute(key, value):
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+
+class Tracer:
+    """Registro de spans con una pila por hilo para anidarlos (seguro entre hilos)"""
+
+    def __init__(self):
+        self.enabled = False
+        self.dropped = 0
+        self._spans = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def current(self):
+        """Span abierto más interno del hilo actual (o None)"""
+        stack = getattr(self._local, "stack", None)
+        return stack[-1] if stack else None
+
+    @contextmanager
+    def span(self, name, parent=None, **attributes):
+        """
+        Mide un bloque como span hijo del span actual del hilo.
+
+        Args:
+            parent: span padre explícito (para continuar en otro hilo)
+        """
+        if not self.enabled:
+            yield None
+            return
+        span = self.start(name, parent, **attributes)
+        stack = self._local.__dict__.setdefault("stack", [])
+        stack.append(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.error = str(e) or type(e).__name__
+            raise
+        finally:
+            stack.pop()
+            self.finish(span)
+
+    def start(self, name, parent=None, **attributes):
+        """Abre un span sin apilarlo (se cierra con finish(); p. ej. desde hooks)"""
+        if not self.enabled:
+            return None
+        return Span(name, parent or self.current(), attributes)
+
+    def finish(self, span, error=None):
+        if span is None or span.end is not None:
+            return
+        span.end = time.time_ns()
+        if error:
+            span.error = error
+        with self._lock:
+            if len(self._spans) < MAX_SPANS:
+                self._spans.append(span)
+            else:
+                self.dropped += 1
+
+    def export(self):
+        """Spans terminados en formato OTLP JSON (resourceSpans)"""
+        with self._lock:
+            spans = [span.as_otlp() for span in self._spans]
+        return {"resourceSpans": [{
+            "resource": {"attributes": [
+                _otlp_attribute("service.name", SERVICE_NAME),
+                _otlp_attribute("process.pid", os.getpid()),
+            ]},
+            "scopeSpans": [{"scope": {"name": __name__}, "spans": spans}],
+        }]}
+
+    def write(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.export(), f, ensure_ascii=False)
+
+    def clear(self):
+        with self._lock:
+            self._spans = []
+            self.dropped = 0
+
+
+# Registro global: los módulos lo importan y lo usan sin pasarlo de mano en mano
+tracer = Tracer()
+
+
+def traced(name):
+    """Decorador: mide cada llamada a la función como un span"""
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not tracer.enabled:
+                return func(*args, **kwargs)
+            with tracer.span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+class HookSpans:
+    """
+    Spans hijos a partir de los hooks de yt-dlp: uno por archivo transferido
+    (progress_hooks) y uno por postprocesador (postprocessor_hooks). Se
+    anidan bajo el span abierto en el hilo cuando llega el primer evento.
+    """
+
+    def __init__(self):
+        self._downloads = {}  # archivo -> span
+        self._postprocessors = {}  # nombre -> span
+
+    def on_progress(self, d):
+        if not tracer.enabled:
+            return
+        filename = d.get('filename', '')
+        span = self._downloads.get(filename)
+        if span is None and d.get('status') in ('downloading', 'finished'):
+            span = self._downloads[filename] = tracer.start("ytdlp.download", file=filename)
+        if d.get('status') == 'finished':
+            span.set(bytes=d.get('total_bytes') or d.get('downloaded_bytes'))
+            tracer.finish(self._downloads.pop(filename))
+        elif d.get('status') == 'error' and span is not None:
+            tracer.finish(self._downloads.pop(filename), error="error de descarga")
+
+    def on_postprocess(self, d):
+        if not tracer.enabled:
+            return
+        name = d.get('postprocessor')
+        if d.get('status') == 'started':
+            self._postprocessors[name] = tracer.start("ytdlp.postprocess", postprocessor=name)
+        elif d.get('status') == 'finished' and name in self._postprocessors:
+            tracer.finish(self._postprocessors.pop(name))
+
+    def close(self):
+        """Cierra los spans que quedaron abiertos (descarga interrumpida)"""
+        for span in list(self._downloads.values()) + list(self._postprocessors.values()):
+            tracer.finish(span, error="interrumpido")
+        self._downloads.clear()
+        self._postprocessors.clear()
+
+
+# ==============================================================
+# Perfilador por muestreo
+# ==============================================================
+class SamplingProfiler:
+    """
+    Toma cada SAMPLE_INTERVAL segundos la pila de todos los hilos.
+
+    A diferencia de cProfile (que solo ve el hilo donde se activa), cubre los
+    hilos de descarga, de conversión y el de Tk, con un costo casi fijo.
+    """
+
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        self.interval = interval
+        self.samples = 0
+        self._stacks = {}  # tupla de marcos (exterior → interior) -> muestras
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="perfilador", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}"
+                                 f":{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                key = tuple(reversed(stack))
+                self._stacks[key] = self._stacks.get(key, 0) + 1
+            self.samples += 1
+
+    def write(self, base_path, top=40):
+        """Escribe BASE.folded y BASE.profile.txt"""
+        with open(f"{base_path}.folded", "w", encoding="utf-8") as f:
+            for stack, count in sorted(self._stacks.items(), key=lambda item: -item[1]):
+                f.write(";".join(stack) + f" {count}\n")
+
+        own_counts = {}
+        total_counts = {}
+        for stack, count in self._stacks.items():
+            own_counts[stack[-1]] = own_counts.get(stack[-1], 0) + count
+            for frame in set(stack[1:]):
+                total_counts[frame] = total_counts.get(frame, 0) + count
+
+        samples = max(1, sum(self._stacks.values()))
+        with open(f"{base_path}.profile.txt", "w", encoding="utf-8") as f:
+            f.write(f"Muestras: {self.samples} (cada {self.interval * 1000:.0f} ms), "
+                    f"{samples} pilas de todos los hilos\n\n")
+            for title, counts in (("Tiempo propio", own_counts),
+                                  ("Tiempo acumulado", total_counts)):
+                f.write(f"{title}:\n")
+                for frame, count in sorted(counts.items(), key=lambda item: -item[1])[:top]:
+                    f.write(f"  {count * 100.0 / samples:6.2f}%  {count:7d}  {frame}\n")
+                f.write("\n")
+
+
+class TraceSession:
+    """
+    Activa las trazas (y opcionalmente el perfilador) durante un bloque y
+    escribe los resultados al salir. Con path=None no hace nada.
+
+    USO:
+        with TraceSession("traza.json", profile=True):
+            ...
+    """
+
+    def __init__(self, path, profile=False):
+        self.path = path
+        self.profiler = SamplingProfiler() if path and profile else None
+
+    @classmethod
+    def from_env(cls):
+        """Sesión según DESCARGADOR_TRACE / DESCARGADOR_PROFILE"""
+        return cls(os.environ.get("DESCARGADOR_TRACE"),
+                   profile=os.environ.get("DESCARGADOR_PROFILE") == "1")
+
+    def __enter__(self):
+        if self.path:
+            tracer.enabled = True
+        if self.profiler is not None:
+            self.profiler.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        if not self.path:
+            return False
+        tracer.enabled = False
+        base_path = os.path.splitext(self.path)[0]
+        try:
+            tracer.write(self.path)
+            if self.profiler is not None:
+                self.profiler.stop()
+                self.profiler.write(base_path)
+            print(f"Traza guardada en {self.path}"
+                  + (f" (se descartaron {tracer.dropped} spans)" if tracer.dropped else ""))
+        except OSError as e:
+            print(f"Error guardando la traza: {e}")
+        return False
@@ -0,0 +1,168 @@
+"""
+Ajuste Automático de Descarga
+=============================
+Ajusta los fragmentos simultáneos y el tamaño de bloque de yt-dlp según el
+rendimiento medido de cada descarga (control AIMD).
+
+- Si la velocidad se mantiene o mejora: subir de a poco (aumento aditivo)
+- Si la velocidad cae: reducir a la mitad (disminución multiplicativa)
+
+Los valores se guardan por servidor (host) entre ejecuciones, de modo que
+una línea de fibra y una línea lenta acaban con ajustes distintos.
+"""
+
+import threading
+import time
+from urllib.parse import urlparse
+
+from app_data import get_data_dir, load_json, save_json
+
+
+MB = 1024 * 1024
+
+DEFAULT_FRAGMENTS = 1
+DEFAULT_CHUNK_SIZE = 10 * MB
+
+# Descargas menores no dan una medida fiable de velocidad
+MIN_SAMPLE_BYTES = 1 * MB
+
+# Margen de ruido: una caída menor a esto no cuenta como empeoramiento
+TOLERANCE = 0.10
+
+
+def host_key(url):
+    """Clave de ajuste para una URL: el host sin 'www.' ni 'm.'"""
+    host = (urlparse(url).hostname or "").lower()
+    for prefix in ("www.", "m.", "music."):
+        if host.startswith(prefix):
+            host = host[len(prefix):]
+    if host == "youtu.be":
+        host = "youtube.com"
+    return host or "desconocido"
+
+
+class AdaptiveTuner:
+    """Controlador AIMD de concurrent_fragment_downloads / http_chunk_size"""
+
+    def __init__(self, path=None, min_fragments=1, max_fragments=16,
+                 min_chunk_size=1 * MB, max_chunk_size=64 * MB, chunk_step=2 * MB):
+        self.path = path or str(get_data_dir() / "tuning.json")
+        self.min_fragments = min_fragments
+        self.max_fragments = max(min_fragments, max_fragments)
+        self.min_chunk_size = min_chunk_size
+        self.max_chunk_size = max(min_chunk_size, max_chunk_size)
+        self.chunk_step = chunk_step
+        self._lock = threading.Lock()
+        self._profiles = load_json(self.path, default={}) or {}
+
+    # ----------------------------------------------------------
+    # Opciones para yt-dlp
+    # ----------------------------------------------------------
+    def options_for(self, url):
+        """
+        Retorna las opciones de yt-dlp para la próxima descarga de este host.
+
+        Returns:
+            dict con 'concurrent_fragment_downloads', 'http_chunk_size' y 'buffersize'
+        """
+        with self._lock:
+            profile = self._profile(host_key(url))
+            fragments = profile["fragments"]
+            chunk_size = profile["chunk_size"]
+
+        return {
+            'concurrent_fragment_downloads': fragments,
+            'http_chunk_size': chunk_size,
+            # Búfer de lectura proporcional al bloque (16 KB - 1 MB)
+            'buffersize': max(16 * 1024, min(MB, chunk_size // 16)),
+        }
+
+    # ----------------------------------------------------------
+    # Medición
+    # ----------------------------------------------------------
+    def record(self, url, downloaded_bytes, elapsed, extractor=None):
+        """
+        Registra el rendimiento de una descarga y ajusta el host (AIMD).
+
+        Args:
+            url: URL de la página (define el host)
+            downloaded_bytes: bytes descargados
+            elapsed: segundos de la transferencia
+            extractor: nombre del extractor de yt-dlp (informativo)
+        """
+        if not downloaded_bytes or downloaded_bytes < MIN_SAMPLE_BYTES or not elapsed:
+            return
+
+        throughput = downloaded_bytes / elapsed
+        with self._lock:
+            key = host_key(url)
+            profile = self._profile(key)
+            if extractor:
+                profile["extractor"] = extractor
+
+            previous = profile.get("last_throughput") or 0
+            if throughput >= previous * (1 - TOLERANCE):
+                # Aumento aditivo
+                profile["fragments"] = min(self.max_fragments, profile["fragments"] + 1)
+                profile["chunk_size"] = min(self.max_chunk_size,
+                                            profile["chunk_size"] + self.chunk_step)
+            else:
+                # Disminución multiplicativa
+                profile["fragments"] = max(self.min_fragments, profile["fragments"] // 2)
+                profile["chunk_size"] = max(self.min_chunk_size, profile["chunk_size"] // 2)
+
+            profile["last_throughput"] = throughput
+            profile["samples"] = profile.get("samples", 0) + 1
+            profile["updated"] = time.time()
+
+            # Recordar los mejores ajustes vistos para este host
+            if throughput > profile.get("best_throughput", 0):
+                profile["best_throughput"] = throughput
+                profile["best_fragments"] = profile["fragments"]
+                profile["best_chunk_size"] = profile["chunk_size"]
+
+            self._save()
+
+    def reset(self, url=None):
+        """Olvida los ajustes de un host (o de todos)"""
+        with self._lock:
+            if url is None:
+                self._profiles = {}
+            else:
+                self._profiles.pop(host_key(url), None)
+            self._save()
+
+    # ----------------------------------------------------------
+    # Persistencia
+    # ----------------------------------------------------------
+    def _profile(self, key):
+        """Perfil del host (llamar con el lock tomado)"""
+        profile = self._profiles.get(key)
+        if profile is None:
+            profile = {
+                "fragments": DEFAULT_FRAGMENTS,
+                "chunk_size": DEFAULT_CHUNK_SIZE,
+            }
+            self._profiles[key] = profile
+        elif "best_fragments" in profile and "session" not in profile:
+            # Primera descarga de esta sesión: partir de los mejores ajustes
+            profile["fragments"] = profile["best_fragments"]
+            profile["chunk_size"] = profile["best_chunk_size"]
+            profile["last_throughput"] = 0
+
+        # Respetar los límites configurados aunque el archivo tenga otros
+        profile["fragments"] = max(self.min_fragments, min(self.max_fragments, profile["fragments"]))
+        profile["chunk_size"] = max(self.min_chunk_size, min(self.max_chunk_size, profile["chunk_size"]))
+        profile["session"] = True
+        return profile
+
+    def _save(self):
+        """Guarda los perfiles (llamar con el lock tomado)"""
+        data = {
+            key: {k: v for k, v in profile.items() if k != "session"}
+            for key, profile in self._profiles.items()
+        }
+        try:
+            save_json(self.path, data)
+        except OSError as e:
+            print(f"Error guardando ajustes de descarga: {e}")
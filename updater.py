@@ -6,18 +6,26 @@ Módulo para verificar y descargar actualizaciones desde GitHub Releases.
 Soporta:
 - Verificación automática al inicio de la app
 - Actualización de la app (.exe o código fuente)
-- Actualización automática de yt-dlp
+- Descarga reanudable, en varios rangos a la vez y verificada con SHA-256
+- Parches binarios del .exe (delta.py) con descarga completa como respaldo
+- Actualización automática de yt-dlp (versiones lado a lado, ver engine_versions)
 """
 
 import os
 import sys
 import json
-import urllib.request
-import urllib.error
+import hashlib
 import subprocess
 import shutil
+import socket
+import threading
 import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait
 from pathlib import Path
+from urllib.parse import urlsplit
+
+from app_data import get_data_dir, load_json, save_json
+from tracing import traced, tracer
 
 
 # ============================================================
@@ -27,6 +35,476 @@ REPO_OWNER = "AdrianMP-02"
 REPO_NAME = "DescargaMusica"
 CURRENT_VERSION = "1.0"  # Versión semántica de la app
 
+# Archivos fuente que se reemplazan en una actualización en modo script
+SOURCE_FILES = [
+    "main.py",
+    "updater.py",
+    "engine.py",
+    "download_queue.py",
+    "pipeline.py",
+    "tuning.py",
+    "app_data.py",
+    "archive.py",
+    "media_cache.py",
+    "info_cache.py",
+    "journal.py",
+    "job_store.py",
+    "metrics.py",
+    "tracing.py",
+    "startup_timing.py",
+    "progress_bus.py",
+    "ffmpeg_utils.py",
+    "batch_download.py",
+    "benchmark.py",
+    "delta.py",
+    "engine_versions.py",
+    "requirements.txt",
+]
+
+
+# Mínimo entre dos verificaciones automáticas al iniciar la app (segundos)
+STARTUP_CHECK_INTERVAL = 12 * 3600
+
+UPDATE_STATE_FILE = "updates.json"
+
+
+def startup_check_due(interval=STARTUP_CHECK_INTERVAL):
+    """True si pasó el intervalo desde la última verificación automática"""
+    state = load_json(str(get_data_dir() / UPDATE_STATE_FILE), default={}) or {}
+    return time.time() - state.get("last_startup_check", 0) >= interval
+
+
+def record_startup_check():
+    """Anota la verificación automática para no repetirla en cada arranque"""
+    with _state_lock:
+        path = str(get_data_dir() / UPDATE_STATE_FILE)
+        state = load_json(path, default={}) or {}
+        state["last_startup_check"] = time.time()
+        try:
+            save_json(path, state)
+        except OSError as e:
+            print(f"Error guardando el estado de actualizaciones: {e}")
+
+
+# ============================================================
+# Consultas HTTP con caché
+# ============================================================
+# Una respuesta más reciente que esto se usa sin volver a preguntar (segundos)
+MIN_RECHECK_INTERVAL = 3600
+
+# Tiempo para conectar con el servidor antes de darlo por inalcanzable
+OFFLINE_PROBE_TIMEOUT = 1.5
+
+# Tras detectar que no hay red, no volver a intentarlo durante este tiempo
+OFFLINE_BACKOFF = 60
+
+REQUEST_TIMEOUT = 10
+
+
+# ============================================================
+# Descarga de archivos grandes (actualizaciones, FFmpeg)
+# ============================================================
+# A partir de este tamaño el archivo se pide en varios rangos en paralelo
+PARALLEL_MIN_SIZE = 8 * 1024 * 1024
+SEGMENTS = 4
+
+# Búfer de lectura de cada conexión (se reutiliza en todo el segmento)
+BLOCK_SIZE = 256 * 1024
+
+# Sin datos durante este tiempo se da la conexión por cortada y se retoma
+SEGMENT_TIMEOUT = 30
+
+# Reintentos seguidos sin recibir nada antes de abandonar un segmento
+RETRIES = 3
+
+# Cada cuánto se informa del progreso y se guarda el estado (segundos)
+PROGRESS_INTERVAL = 0.25
+
+_state_lock = threading.Lock()  # updates.json lo escriben varios hilos
+_inflight_lock = threading.Lock()
+_inflight = {}  # URL -> Future con el resultado de la consulta en curso
+_offline_until = {}  # servidor -> instante hasta el que se da por inalcanzable
+
+
+class OfflineError(ConnectionError):
+    """No hay conexión con el servidor de actualizaciones"""
+
+
+def _reachable(host, port):
+    """
+    Comprueba en OFFLINE_PROBE_TIMEOUT si el servidor acepta conexiones, para
+    no esperar el timeout completo de la petición sin red. Con proxy no se
+    comprueba (la conexión directa puede estar bloqueada a propósito).
+    """
+    import urllib.request
+    if time.time() < _offline_until.get(host, 0):
+        return False
+    if urllib.request.getproxies().get("https"):
+        return True
+    try:
+        socket.create_connection((host, port), timeout=OFFLINE_PROBE_TIMEOUT).close()
+        return True
+    except OSError:
+        _offline_until[host] = time.time() + OFFLINE_BACKOFF
+        return False
+
+
+def fetch_json_cached(url, reduce, max_age=MIN_RECHECK_INTERVAL, force=False):
+    """
+    GET de un JSON con caché en disco (updates.json) y revalidación condicional.
+
+    - Si la copia guardada tiene menos de max_age segundos se usa sin red
+      (salvo force=True).
+    - Si no, se pregunta con If-None-Match / If-Modified-Since; un 304 no
+      descarga nada y renueva la copia.
+    - Sin red se devuelve la copia guardada aunque sea vieja, tras una
+      comprobación de conexión de OFFLINE_PROBE_TIMEOUT segundos.
+    - Varias consultas simultáneas de la misma URL hacen una sola petición.
+
+    Args:
+        url: dirección del JSON
+        reduce: callable(data) -> dict con solo lo que se necesita guardar
+        max_age: segundos que vale la copia guardada
+        force: revalidar aunque la copia sea reciente (botón manual)
+
+    Returns:
+        dict devuelto por reduce
+
+    Raises:
+        OfflineError sin red y sin copia guardada; urllib.error.HTTPError
+        y otros errores de red tal cual
+    """
+    with _inflight_lock:
+        pending = _inflight.get(url)
+        leader = pending is None
+        if leader:
+            pending = Future()
+            _inflight[url] = pending
+
+    if not leader:
+        return pending.result()
+
+    try:
+        result = _fetch_json_cached(url, reduce, max_age, force)
+    except BaseException as e:
+        pending.set_exception(e)
+        raise
+    else:
+        pending.set_result(result)
+    finally:
+        with _inflight_lock:
+            _inflight.pop(url, None)
+    return result
+
+
+def _fetch_json_cached(url, reduce, max_age, force):
+    import urllib.error
+    import urllib.request
+
+    path = str(get_data_dir() / UPDATE_STATE_FILE)
+    with _state_lock:
+        state = load_json(path, default={}) or {}
+    entry = state.get("http_cache", {}).get(url)
+    if entry and not force and time.time() - entry.get("checked", 0) < max_age:
+        return entry["data"]
+
+    parts = urlsplit(url)
+    if not _reachable(parts.hostname, parts.port or 443):
+        if entry:
+            return entry["data"]
+        raise OfflineError("Sin conexión a internet")
+
+    headers = {"User-Agent": "DescargadorMusica-Updater", "Accept": "application/json"}
+    if entry and entry.get("etag"):
+        headers["If-None-Match"] = entry["etag"]
+    if entry and entry.get("last_modified"):
+        headers["If-Modified-Since"] = entry["last_modified"]
+
+    try:
+        req = urllib.request.Request(url, headers=headers)
+        with urllib.request.urlopen(req, timeout=REQUEST_TIMEOUT) as resp:
+            data = reduce(json.loads(resp.read().decode("utf-8")))
+            entry = {
+                "etag": resp.headers.get("ETag"),
+                "last_modified": resp.headers.get("Last-Modified"),
+                "data": data,
+            }
+    except urllib.error.HTTPError as e:
+        if e.code != 304 or not entry:
+            raise
+        # 304 Not Modified: la copia guardada sigue valiendo
+    except OSError:  # URLError, timeout, conexión cortada
+        _offline_until[parts.hostname] = time.time() + OFFLINE_BACKOFF
+        if entry:
+            return entry["data"]
+        raise
+
+    entry["checked"] = time.time()
+    with _state_lock:
+        state = load_json(path, default={}) or {}
+        state.setdefault("http_cache", {})[url] = entry
+        try:
+            save_json(path, state)
+        except OSError as e:
+            print(f"Error guardando el estado de actualizaciones: {e}")
+    return entry["data"]
+
+
+# ============================================================
+# Descarga reanudable y verificada
+# ============================================================
+def download_file(url, destination, progress_callback=None, sha256=None, size=None):
+    """
+    Descarga un archivo de forma reanudable y verificada.
+
+    Se descarga a DESTINO.part con su estado al lado (.part.json): si la
+    conexión se corta, se reintenta desde donde iba y una nueva llamada
+    continúa la descarga en lugar de empezar de cero. Los archivos grandes
+    se piden en SEGMENTS rangos en paralelo. El SHA-256 se calcula mientras
+    llegan los datos y se compara con el esperado.
+
+    Args:
+        url: dirección del archivo
+        destination: ruta final (se escribe solo si todo está bien)
+        progress_callback: callable(percent, downloaded, total), cada
+            PROGRESS_INTERVAL segundos desde el hilo que llama
+        sha256: hash hexadecimal esperado (None = no comprobar)
+        size: tamaño publicado, si el servidor no lo indica
+
+    Returns:
+        str con el SHA-256 del archivo descargado
+
+    Raises:
+        ValueError si el hash no coincide; OSError si falla la descarga
+    """
+    destination = Path(destination)
+    part_file = destination.with_name(destination.name + ".part")
+    state_file = part_file.with_name(part_file.name + ".json")
+
+    final_url, total, resumable = _probe_download(url)
+    total = total or size
+    segments = _plan_segments(url, total, resumable, part_file, state_file)
+
+    hasher = hashlib.sha256()
+    if len(segments) == 1:
+        # Un solo flujo en orden: hash al vuelo (antes, lo ya descargado)
+        _hash_file(part_file, hasher, segments[0]["done"])
+        stream_hasher = hasher
+    else:
+        stream_hasher = None
+
+    failed = threading.Event()
+    with ThreadPoolExecutor(max_workers=len(segments)) as pool:
+        futures = [pool.submit(_fetch_segment, final_url, part_file, segment,
+                               stream_hasher, failed)
+                   for segment in segments]
+        pending = set(futures)
+        try:
+            while pending:
+                _, pending = wait(pending, timeout=PROGRESS_INTERVAL)
+                downloaded = sum(segment["done"] for segment in segments)
+                if progress_callback and total:
+                    progress_callback(min(100, downloaded * 100 / total), downloaded, total)
+                if resumable:
+                    save_json(str(state_file), {"url": url, "total": total,
+                                                "segments": segments})
+        except BaseException:
+            failed.set()  # Detener los segmentos; el estado guardado permite retomar
+            raise
+        for future in futures:
+            future.result()  # Propaga el error del segmento que falló
+
+    # Verificar descarga completa por lo que llegó a cada segmento: el
+    # .part ya tiene el tamaño final desde _plan_segments
+    downloaded = sum(segment["done"] for segment in segments)
+    if total and downloaded != total:
+        raise ConnectionError(f"descarga incompleta ({downloaded}/{total} bytes)")
+
+    if stream_hasher is None:
+        _hash_file(part_file, hasher, downloaded)
+    if sha256 and hasher.hexdigest() != sha256.lower():
+        part_file.unlink(missing_ok=True)
+        state_file.unlink(missing_ok=True)
+        raise ValueError(f"el SHA-256 no coincide ({hasher.hexdigest()} != {sha256})")
+
+    os.replace(str(part_file), str(destination))
+    state_file.unlink(missing_ok=True)
+    return hasher.hexdigest()
+
+
+def _probe_download(download_url):
+    """
+    Pide el primer byte para saber el tamaño y si el servidor admite rangos.
+
+    Returns:
+        (url final tras redirecciones, tamaño o None, admite rangos)
+    """
+    import urllib.request
+    req = urllib.request.Request(
+        download_url,
+        headers={"User-Agent": "DescargadorMusica-AutoUpdater", "Range": "bytes=0-0"},
+    )
+    with urllib.request.urlopen(req, timeout=REQUEST_TIMEOUT) as response:
+        if response.status == 206:
+            # Content-Range: bytes 0-0/TOTAL
+            total = response.headers.get("Content-Range", "").rpartition("/")[2]
+            return response.geturl(), int(total) if total.isdigit() else None, True
+        length = response.headers.get("Content-Length")
+        return response.geturl(), int(length) if length else None, False
+
+
+def _plan_segments(download_url, total, resumable, part_file, state_file):
+    """
+    Rangos a descargar: los pendientes de una descarga anterior de la
+    misma URL y tamaño, o un reparto nuevo (varios si el archivo es grande).
+
+    Returns:
+        list de dicts {'start', 'end' (incluido, None = hasta el final), 'done'}
+    """
+    state = load_json(str(state_file), default={}) or {}
+    if (resumable and part_file.exists() and state.get("url") == download_url
+            and state.get("total") == total and state.get("segments")):
+        print(f"Retomando descarga ({sum(s['done'] for s in state['segments'])} bytes previos)")
+        return state["segments"]
+
+    with open(part_file, "wb") as f:
+        if total:
+            f.truncate(total)  # Reserva el tamaño: cada segmento escribe en su zona
+    if not resumable or not total:
+        return [{"start": 0, "end": None, "done": 0}]
+
+    count = SEGMENTS if total >= PARALLEL_MIN_SIZE else 1
+    step = -(-total // count)
+    return [{"start": start, "end": min(start + step, total) - 1, "done": 0}
+            for start in range(0, total, step)]
+
+
+def _fetch_segment(url, part_file, segment, hasher, failed):
+    """
+    Descarga un rango en su posición del archivo, reintentando desde lo
+    que ya llegó si la conexión se corta. Lee en un búfer reutilizado.
+    """
+    import urllib.error
+    import urllib.request
+    buffer = memoryview(bytearray(BLOCK_SIZE))
+    attempts = 0
+    while True:
+        offset = segment["start"] + segment["done"]
+        end = segment["end"]
+        if end is not None and offset > end:
+            return
+        headers = {"User-Agent": "DescargadorMusica-AutoUpdater"}
+        if offset or end is not None:
+            headers["Range"] = f"bytes={offset}-{'' if end is None else end}"
+        try:
+            req = urllib.request.Request(url, headers=headers)
+            with urllib.request.urlopen(req, timeout=SEGMENT_TIMEOUT) as response, \
+                    open(part_file, "r+b", buffering=0) as f:
+                if "Range" in headers and response.status != 206:
+                    raise ValueError("el servidor no admite descargas por rangos")
+                # Sin búfer propio: lo que cuenta 'done' ya está en el archivo
+                f.seek(offset)
+                while not failed.is_set():
+                    n = response.readinto(buffer)
+                    if not n:
+                        break
+                    f.write(buffer[:n])
+                    if hasher is not None:
+                        hasher.update(buffer[:n])
+                    segment["done"] += n
+                    attempts = 0
+            if failed.is_set() or end is None or segment["start"] + segment["done"] > end:
+                return
+            raise ConnectionError("la conexión se cerró antes de tiempo")
+        except urllib.error.HTTPError:
+            failed.set()
+            raise
+        except OSError:
+            attempts += 1
+            if attempts > RETRIES:
+                failed.set()
+                raise
+            time.sleep(attempts)
+        except BaseException:
+            failed.set()
+            raise
+
+
+def _hash_file(path, hasher, length):
+    """Añade al hash los primeros length bytes de un archivo"""
+    buffer = memoryview(bytearray(BLOCK_SIZE))
+    with open(path, "rb") as f:
+        while length > 0:
+            n = f.readinto(buffer[:min(BLOCK_SIZE, length)])
+            if not n:
+                break
+            hasher.update(buffer[:n])
+            length -= n
+
+
+# ============================================================
+# Cambio atómico de archivos fuente
+# ============================================================
+# Lista de archivos ya preparados (.new) pendientes de cambiar, en la carpeta de la app
+PENDING_UPDATE_FILE = ".update_pending.json"
+
+
+def _fsync_dir(path):
+    """Hace persistentes los renombrados en una carpeta (sin efecto en Windows)"""
+    try:
+        fd = os.open(str(path), os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def _write_durable(path, data):
+    """Escribe un archivo de forma atómica y lo asegura en disco"""
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, str(path))
+    _fsync_dir(Path(path).parent)
+
+
+def _swap_staged(app_dir, staged):
+    """Pone en su sitio cada ARCHIVO.new y borra la lista de pendientes"""
+    for fname in staged:
+        staged_path = app_dir / (fname + ".new")
+        if staged_path.exists():
+            os.replace(str(staged_path), str(app_dir / fname))
+    _fsync_dir(app_dir)
+    (app_dir / PENDING_UPDATE_FILE).unlink(missing_ok=True)
+
+
+def finish_pending_source_update():
+    """
+    Termina una actualización de código fuente interrumpida (llamar al inicio).
+
+    Si la lista de pendientes existe, todos los .new estaban completos y se
+    terminan de cambiar; si no, los .new sueltos son de una extracción a
+    medias y se descartan.
+
+    Returns:
+        True si se completó una actualización pendiente
+    """
+    app_dir = Path(os.path.dirname(os.path.abspath(__file__)))
+    staged = load_json(str(app_dir / PENDING_UPDATE_FILE))
+    if staged:
+        _swap_staged(app_dir, staged)
+        print(f"Actualización completada ({len(staged)} archivos)")
+        return True
+    for fname in SOURCE_FILES:
+        (app_dir / (fname + ".new")).unlink(missing_ok=True)
+    return False
+
 
 class YtDlpUpdater:
     """Gestiona la actualización de yt-dlp"""
@@ -35,95 +513,122 @@ class YtDlpUpdater:
     def get_installed_version():
         """Retorna la versión instalada de yt-dlp"""
         try:
-            import yt_dlp
-            return yt_dlp.version.__version__
+            from engine_versions import engine_switch, load_ytdlp
+            with engine_switch.job():
+                return load_ytdlp().version.__version__
         except Exception:
             return None
 
     @staticmethod
-    def get_latest_version():
-        """Consulta PyPI para obtener la última versión de yt-dlp"""
+    @traced("updater.ytdlp.latest_version")
+    def get_latest_version(force=False):
+        """
+        Consulta PyPI para obtener la última versión de yt-dlp.
+
+        Args:
+            force: revalidar aunque la respuesta guardada sea reciente
+        """
         try:
-            req = urllib.request.Request(
+            data = fetch_json_cached(
                 "https://pypi.org/pypi/yt-dlp/json",
-                headers={"User-Agent": "DescargadorMusica-Updater"},
+                lambda data: {"version": data["info"]["version"]},
+                force=force,
             )
-            with urllib.request.urlopen(req, timeout=10) as resp:
-                data = json.loads(resp.read().decode("utf-8"))
-            return data["info"]["version"]
+            return data["version"]
         except Exception:
             return None
 
+    @staticmethod
+    @traced("updater.ytdlp.check")
+    def check(force=False):
+        """
+        Compara la versión instalada de yt-dlp con la última publicada.
+
+        Returns:
+            dict con 'available', 'installed', 'latest'
+        """
+        installed = YtDlpUpdater.get_installed_version()
+        latest = YtDlpUpdater.get_latest_version(force=force)
+        available = False
+        if installed and latest:
+            # Normalizar versiones: quitar ceros iniciales en cada parte (2026.02.04 → 2026.2.4)
+            try:
+                installed_parts = [int(x) for x in installed.split(".")]
+                latest_parts = [int(x) for x in latest.split(".")]
+                available = latest_parts > installed_parts
+            except ValueError:
+                available = latest > installed  # Fallback lexicográfico
+        if available:
+            # No volver a ofrecer una versión que ya falló y se descartó
+            from engine_versions import EngineVersions
+            available = not EngineVersions().is_bad(latest)
+        return {"available": available, "installed": installed, "latest": latest}
+
     @staticmethod
     def needs_update():
         """Retorna True si yt-dlp necesita actualización"""
-        installed = YtDlpUpdater.get_installed_version()
-        latest = YtDlpUpdater.get_latest_version()
-        if not installed or not latest:
-            return False
-        # Normalizar versiones: quitar ceros iniciales en cada parte (2026.02.04 → 2026.2.4)
-        try:
-            installed_parts = [int(x) for x in installed.split(".")]
-            latest_parts = [int(x) for x in latest.split(".")]
-            return latest_parts > installed_parts
-        except ValueError:
-            return latest > installed  # Fallback lexicográfico
+        return YtDlpUpdater.check()["available"]
+
+    @staticmethod
+    @traced("updater.ytdlp.stage")
+    def stage(version=None, progress_callback=None):
+        """
+        Descarga y prepara una versión de yt-dlp junto a la actual, sin
+        activarla (ver engine_versions). Pensado para un hilo aparte.
+
+        Returns:
+            dict con 'success', 'version' y 'error'
+        """
+        from engine_versions import EngineVersions
+        return EngineVersions().stage(version, progress_callback)
 
     @staticmethod
+    @traced("updater.ytdlp.update")
     def update(progress_callback=None):
         """
         Actualiza yt-dlp a la última versión.
 
+        La nueva se prepara en su propia carpeta y se activa al momento: las
+        descargas en marcha terminan con la anterior, que sigue en disco
+        para volver atrás (rollback) si la nueva falla.
+
         Args:
             progress_callback: callable(status_text: str) para reportar progreso
 
         Returns:
             dict con 'success', 'old_version', 'new_version', 'error'
         """
+        from engine_versions import EngineVersions
         old_version = YtDlpUpdater.get_installed_version()
-        try:
-            if progress_callback:
-                progress_callback("Actualizando yt-dlp...")
-
-            result = subprocess.run(
-                [sys.executable, "-m", "pip", "install", "--upgrade", "yt-dlp"],
-                capture_output=True,
-                text=True,
-                timeout=120,
-            )
-
-            if result.returncode == 0:
-                # Forzar reimportación para obtener nueva versión
-                if "yt_dlp" in sys.modules:
-                    del sys.modules["yt_dlp"]
-                if "yt_dlp.version" in sys.modules:
-                    del sys.modules["yt_dlp.version"]
-
-                new_version = YtDlpUpdater.get_installed_version()
-                return {
-                    "success": True,
-                    "old_version": old_version,
-                    "new_version": new_version,
-                }
-            else:
-                return {
-                    "success": False,
-                    "old_version": old_version,
-                    "error": result.stderr[:300],
-                }
-        except subprocess.TimeoutExpired:
-            return {
-                "success": False,
-                "old_version": old_version,
-                "error": "Tiempo de espera agotado al actualizar yt-dlp",
-            }
-        except Exception as e:
+        if progress_callback:
+            progress_callback("Actualizando yt-dlp...")
+
+        versions = EngineVersions()
+        staged = versions.stage(progress_callback=progress_callback)
+        if not staged["success"]:
+            return {"success": False, "old_version": old_version, "error": staged["error"]}
+        if versions.is_bad(staged["version"]):
             return {
                 "success": False,
                 "old_version": old_version,
-                "error": str(e),
+                "error": f"yt-dlp {staged['version']} ya falló antes en este equipo",
             }
 
+        result = versions.activate(staged["version"])
+        if not result["success"]:
+            return {"success": False, "old_version": old_version, "error": result["error"]}
+        return {
+            "success": True,
+            "old_version": old_version,
+            "new_version": staged["version"],
+        }
+
+    @staticmethod
+    def rollback():
+        """Vuelve a la versión de yt-dlp anterior a la última actualización"""
+        from engine_versions import EngineVersions
+        return EngineVersions().rollback()
+
 
 class UpdateChecker:
     """Verifica y descarga actualizaciones de la app desde GitHub Releases"""
@@ -139,41 +644,64 @@ class UpdateChecker:
     # ----------------------------------------------------------
     # Verificación de versión de la app
     # ----------------------------------------------------------
-    def check_for_updates(self):
+    @traced("updater.app.check")
+    def check_for_updates(self, force=False):
         """
         Verifica si hay una nueva versión de la app disponible en GitHub Releases.
 
+        La respuesta se guarda y se revalida con ETag (un 304 de GitHub no
+        cuenta para el límite de peticiones).
+
+        Args:
+            force: revalidar aunque la respuesta guardada sea reciente
+
         Returns:
             dict con información de la actualización
         """
+        import urllib.error
         try:
-            req = urllib.request.Request(
-                self.api_url,
-                headers={"User-Agent": "DescargadorMusica-AutoUpdater"},
-            )
-
-            with urllib.request.urlopen(req, timeout=10) as response:
-                data = json.loads(response.read().decode("utf-8"))
+            data = fetch_json_cached(self.api_url, self._reduce_release, force=force)
 
             latest_version = data.get("tag_name", "").lstrip("v")
             release_notes = data.get("body", "Sin notas de versión")
 
             # Buscar asset .exe
             download_url = None
+            download_asset = None
             source_zip_url = data.get("zipball_url")  # Código fuente como fallback
             for asset in data.get("assets", []):
                 name_lower = asset["name"].lower()
                 if name_lower.endswith(".exe"):
                     download_url = asset["browser_download_url"]
+                    download_asset = asset
                     break
                 elif name_lower.endswith(".zip"):
                     download_url = asset["browser_download_url"]
+                    download_asset = asset
+
+            # Hash publicado: 'digest' de GitHub o un asset SHA256SUMS / ARCHIVO.sha256
+            digest = (download_asset or {}).get("digest") or ""
+            checksum_url = None
+            delta_asset = None
+            for asset in data.get("assets", []):
+                name_lower = asset["name"].lower()
+                if name_lower in ("sha256sums", "sha256sums.txt") or (
+                        download_asset and name_lower == download_asset["name"].lower() + ".sha256"):
+                    checksum_url = asset["browser_download_url"]
+                # Parche desde la versión instalada: NOMBRE-from-VERSIÓN.delta
+                elif name_lower.endswith(f"-from-{self.current_version}.delta"):
+                    delta_asset = asset
 
             if self._is_newer_version(latest_version, self.current_version):
                 return {
                     "available": True,
                     "version": latest_version,
                     "download_url": download_url,
+                    "size": (download_asset or {}).get("size"),
+                    "sha256": digest[7:] if digest.startswith("sha256:") else None,
+                    "checksum_url": checksum_url,
+                    "delta_url": (delta_asset or {}).get("browser_download_url"),
+                    "delta_size": (delta_asset or {}).get("size"),
                     "source_zip_url": source_zip_url,
                     "release_notes": release_notes,
                     "current_version": self.current_version,
@@ -192,22 +720,89 @@ class UpdateChecker:
                     "error": "No se encontraron releases en GitHub",
                 }
             return {"available": False, "error": f"Error HTTP: {e.code}"}
+        except OfflineError:
+            return {"available": False, "offline": True, "error": "Sin conexión a internet"}
         except Exception as e:
             return {
                 "available": False,
                 "error": f"Error al verificar actualizaciones: {str(e)}",
             }
 
+    @staticmethod
+    def _reduce_release(data):
+        """Campos de la release que se usan (lo que se guarda en la caché)"""
+        return {
+            "tag_name": data.get("tag_name", ""),
+            "body": data.get("body") or "Sin notas de versión",
+            "zipball_url": data.get("zipball_url"),
+            "assets": [
+                {key: asset.get(key) for key in ("name", "browser_download_url", "size", "digest")}
+                for asset in data.get("assets", [])
+            ],
+        }
+
     # ----------------------------------------------------------
     # Descarga
     # ----------------------------------------------------------
-    def download_update(self, download_url, progress_callback=None):
+    @traced("updater.app.fetch")
+    def fetch_update(self, update_info, progress_callback=None):
+        """
+        Obtiene el archivo de la actualización por la vía más corta: con el
+        .exe en uso y un parche publicado desde esta versión, descarga solo
+        el parche y reconstruye el ejecutable; si no hay parche o falla,
+        descarga el archivo completo.
+
+        Args:
+            update_info: resultado de check_for_updates()
+            progress_callback: callable(percent, downloaded, total)
+
+        Returns:
+            str con ruta del archivo descargado o None
+        """
+        sha256 = self.expected_sha256(update_info)
+        if getattr(sys, "frozen", False) and update_info.get("delta_url"):
+            update_file = self._fetch_delta_update(update_info, sha256, progress_callback)
+            if update_file:
+                return update_file
+            print("Parche no disponible, descargando la actualización completa")
+        return self.download_update(update_info["download_url"], progress_callback,
+                                    sha256=sha256, size=update_info.get("size"))
+
+    def _fetch_delta_update(self, update_info, sha256, progress_callback=None):
+        """Descarga el parche y reconstruye el nuevo .exe a partir del actual"""
+        from delta import DeltaError, apply_delta
+        patch_file = self.download_update(update_info["delta_url"], progress_callback,
+                                          size=update_info.get("delta_size"))
+        if not patch_file:
+            return None
+        new_exe = Path(patch_file).with_name("DescargadorMusica_new.exe")
+        try:
+            with tracer.span("updater.app.apply_delta"):
+                header = apply_delta(sys.executable, patch_file, str(new_exe))
+            # El parche verifica su propio hash; además, debe ser el .exe publicado
+            if sha256 and header["target_sha256"] != sha256.lower():
+                raise DeltaError("el parche no produce el ejecutable publicado")
+            print(f"Ejecutable reconstruido con un parche de "
+                  f"{os.path.getsize(patch_file) / 1024:.0f} KB")
+            return str(new_exe)
+        except (OSError, DeltaError) as e:
+            print(f"Error aplicando el parche: {e}")
+            new_exe.unlink(missing_ok=True)
+            return None
+        finally:
+            Path(patch_file).unlink(missing_ok=True)
+
+    @traced("updater.app.download")
+    def download_update(self, download_url, progress_callback=None, sha256=None, size=None):
         """
-        Descarga la actualización con verificación de integridad.
+        Descarga la actualización con verificación de integridad (ver
+        download_file: reanudable, por rangos en paralelo y con SHA-256).
 
         Args:
             download_url: URL del ejecutable o zip
             progress_callback: callable(percent, downloaded, total)
+            sha256: hash hexadecimal esperado (ver expected_sha256)
+            size: tamaño publicado, si el servidor no lo indica
 
         Returns:
             str con ruta del archivo descargado o None
@@ -216,61 +811,78 @@ class UpdateChecker:
             temp_dir = Path.home() / "AppData" / "Local" / "Temp" / "DescargadorMusica"
             temp_dir.mkdir(parents=True, exist_ok=True)
 
-            # Limpiar descargas previas fallidas
-            for old_file in temp_dir.glob("DescargadorMusica_new.*"):
-                try:
-                    old_file.unlink()
-                except OSError:
-                    pass
-
             # Determinar extensión
             if download_url.endswith(".exe"):
                 temp_file = temp_dir / "DescargadorMusica_new.exe"
+            elif download_url.endswith(".delta"):
+                temp_file = temp_dir / "DescargadorMusica_update.delta"
             else:
                 temp_file = temp_dir / "DescargadorMusica_update.zip"
+            part_file = temp_file.with_name(temp_file.name + ".part")
+            state_file = part_file.with_name(part_file.name + ".json")
 
-            req = urllib.request.Request(
-                download_url,
-                headers={"User-Agent": "DescargadorMusica-AutoUpdater"},
-            )
-            with urllib.request.urlopen(req, timeout=120) as response:
-                total_size = int(response.headers.get("Content-Length", 0))
-                downloaded = 0
-                block_size = 8192
-                with open(temp_file, "wb") as f:
-                    while True:
-                        chunk = response.read(block_size)
-                        if not chunk:
-                            break
-                        f.write(chunk)
-                        downloaded += len(chunk)
-                        if progress_callback and total_size > 0:
-                            percent = min(100, (downloaded * 100) / total_size)
-                            progress_callback(percent, downloaded, total_size)
-
-            # Verificar descarga completa
-            actual_size = temp_file.stat().st_size
-            if total_size > 0 and actual_size != total_size:
-                print(f"Error: descarga incompleta ({actual_size}/{total_size} bytes)")
-                temp_file.unlink(missing_ok=True)
-                return None
+            # Limpiar descargas previas (salvo la parcial que se puede retomar)
+            for old_file in temp_dir.glob("DescargadorMusica_*"):
+                if old_file not in (part_file, state_file):
+                    try:
+                        old_file.unlink()
+                    except OSError:
+                        pass
+
+            digest = download_file(download_url, temp_file, progress_callback,
+                                   sha256=sha256, size=size)
 
             # Verificar tamaño mínimo para .exe (>1MB)
+            actual_size = temp_file.stat().st_size
             if download_url.endswith(".exe") and actual_size < 1_000_000:
                 print(f"Error: ejecutable descargado demasiado pequeño ({actual_size} bytes)")
                 temp_file.unlink(missing_ok=True)
                 return None
 
-            print(f"Descarga completada: {actual_size} bytes en {temp_file}")
+            print(f"Descarga completada: {actual_size} bytes en {temp_file} "
+                  f"(SHA-256 {digest}{', verificado' if sha256 else ''})")
             return str(temp_file)
 
         except Exception as e:
             print(f"Error descargando actualización: {str(e)}")
             return None
 
+    def expected_sha256(self, update_info):
+        """
+        SHA-256 publicado del archivo de la actualización: el 'digest' que
+        GitHub calcula para cada asset o, si no está, un asset SHA256SUMS /
+        ARCHIVO.sha256 de la release.
+
+        Returns:
+            str hexadecimal o None si la release no publica ninguno
+        """
+        if update_info.get("sha256"):
+            return update_info["sha256"]
+        checksum_url = update_info.get("checksum_url")
+        if not checksum_url:
+            return None
+        try:
+            import urllib.request
+            req = urllib.request.Request(
+                checksum_url, headers={"User-Agent": "DescargadorMusica-AutoUpdater"})
+            with urllib.request.urlopen(req, timeout=REQUEST_TIMEOUT) as response:
+                lines = response.read().decode("utf-8", "replace").splitlines()
+        except Exception as e:
+            print(f"No se pudo leer el SHA-256 publicado: {e}")
+            return None
+        asset_name = update_info.get("download_url", "").rsplit("/", 1)[-1]
+        for line in lines:
+            parts = line.split()
+            # "HASH  archivo" (sha256sum) o solo "HASH"
+            if parts and len(parts[0]) == 64 and (
+                    len(parts) == 1 or parts[-1].lstrip("*") == asset_name):
+                return parts[0].lower()
+        return None
+
     # ----------------------------------------------------------
     # Instalación
     # ----------------------------------------------------------
+    @traced("updater.app.install")
     def install_update(self, update_file):
         """
         Instala la actualización.
@@ -420,43 +1032,68 @@ class UpdateChecker:
                 print(f"Limpieza: error eliminando {old_file.name}: {e}")
 
     def _install_source_update(self, update_file):
-        """Instala actualización en modo script (código fuente)"""
+        """
+        Instala actualización en modo script (código fuente).
+
+        Solo se leen del zip los archivos de SOURCE_FILES, directamente a
+        ARCHIVO.new junto a cada destino (con fsync). Cuando están todos, se
+        anotan en PENDING_UPDATE_FILE y se cambian con os.replace: si la app
+        se cierra a mitad del cambio, el siguiente arranque lo termina
+        (finish_pending_source_update), así que nunca quedan mezcladas dos
+        versiones.
+        """
         if not update_file.endswith(".zip"):
             return False
 
+        app_dir = Path(os.path.dirname(os.path.abspath(__file__)))
+        staged = []
         try:
             import zipfile
 
-            app_dir = os.path.dirname(os.path.abspath(__file__))
-            temp_extract = Path(update_file).parent / "extracted"
-
-            # Extraer zip
             with zipfile.ZipFile(update_file, "r") as zf:
-                zf.extractall(temp_extract)
-
-            # Buscar la carpeta raíz dentro del zip (GitHub añade prefijo)
-            extracted_dirs = list(temp_extract.iterdir())
-            source_dir = extracted_dirs[0] if extracted_dirs else temp_extract
-
-            # Copiar archivos relevantes
-            files_to_update = ["main.py", "updater.py", "requirements.txt"]
-            for fname in files_to_update:
-                src = source_dir / fname
-                dst = Path(app_dir) / fname
-                if src.exists():
-                    shutil.copy2(str(src), str(dst))
-
-            # Limpiar
-            shutil.rmtree(str(temp_extract), ignore_errors=True)
+                for fname, member in self._source_members(zf).items():
+                    staged_path = app_dir / (fname + ".new")
+                    # zf.open comprueba el CRC al terminar de leer
+                    with zf.open(member) as src, open(staged_path, "wb") as dst:
+                        shutil.copyfileobj(src, dst)
+                        dst.flush()
+                        os.fsync(dst.fileno())
+                    staged.append(fname)
+
+            if not staged:
+                print("Error: el zip no contiene archivos de la app")
+                return False
+
+            _write_durable(app_dir / PENDING_UPDATE_FILE, json.dumps(staged).encode("utf-8"))
+            _swap_staged(app_dir, staged)
+
             if os.path.exists(update_file):
                 os.remove(update_file)
-
             return True
 
         except Exception as e:
             print(f"Error instalando actualización de fuente: {e}")
+            if not (app_dir / PENDING_UPDATE_FILE).exists():
+                for fname in staged:
+                    (app_dir / (fname + ".new")).unlink(missing_ok=True)
             return False
 
+    @staticmethod
+    def _source_members(zf):
+        """
+        Miembros del zip que corresponden a SOURCE_FILES.
+
+        Returns:
+            dict nombre de archivo -> nombre dentro del zip (GitHub añade
+            una carpeta raíz 'Usuario-Repo-commit/')
+        """
+        names = set(zf.namelist())
+        roots = {name.split("/", 1)[0] for name in names}
+        prefix = ""
+        if len(roots) == 1 and any("/" in name for name in names):
+            prefix = roots.pop() + "/"
+        return {fname: prefix + fname for fname in SOURCE_FILES if prefix + fname in names}
+
     # ----------------------------------------------------------
     # Comparador de versiones
     # ----------------------------------------------------------
@@ -513,11 +1150,10 @@ if __name__ == "__main__":
         print(f"✅ App al día ({CURRENT_VERSION})")
 
     print("\n🔍 Verificando yt-dlp...")
-    installed = YtDlpUpdater.get_installed_version()
-    latest = YtDlpUpdater.get_latest_version()
-    print(f"  Instalada: {installed}")
-    print(f"  Última:    {latest}")
-    if YtDlpUpdater.needs_update():
+    ytdlp = YtDlpUpdater.check()
+    print(f"  Instalada: {ytdlp['installed']}")
+    print(f"  Última:    {ytdlp['latest']}")
+    if ytdlp["available"]:
         print("  ⚠️ Actualización de yt-dlp disponible")
     else:
         print("  ✅ yt-dlp al día")